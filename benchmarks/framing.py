@@ -0,0 +1,67 @@
+"""
+Benchmark of reading small length-prefixed messages from a socket.
+
+Compares reading each message with `message_read` (which reads each byte of the length prefix separately) with reading
+them using a `FrameReader`. Messages are sent in batches small enough to fit in the socket's buffer, so only the time
+taken to read them is measured. Run from the root of the repository:
+
+python3 -m benchmarks.framing [batches]
+"""
+
+import json
+import socket
+import sys
+import time
+import typing
+
+from stencila.pyla.servers import FrameReader, encode_int, message_read
+
+BATCHES = 50
+
+BATCH_SIZE = 2000
+
+MESSAGE = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "manifest"}).encode("utf8")
+
+
+def messages_per_second(
+    read: typing.Callable[[socket.socket], typing.Callable[[], typing.Any]],
+    batches: int,
+) -> float:
+    """
+    Send batches of messages through a socket pair and return the number of messages per second read.
+
+    `read` is given the socket to read from and returns a function that reads one message.
+    """
+    batch = (encode_int(len(MESSAGE)) + MESSAGE) * BATCH_SIZE
+    left, right = socket.socketpair()
+    with left, right:
+        read_one_message = read(right)
+        elapsed = 0.0
+        for _ in range(batches):
+            left.sendall(batch)
+            start = time.perf_counter()
+            for _ in range(BATCH_SIZE):
+                read_one_message()
+            elapsed += time.perf_counter() - start
+    return batches * BATCH_SIZE / elapsed
+
+
+def main() -> None:
+    """
+    Run the benchmark and print the results.
+    """
+    batches = int(sys.argv[1]) if len(sys.argv) > 1 else BATCHES
+
+    def read_message(stream: socket.socket) -> typing.Callable[[], typing.Any]:
+        return lambda: message_read(stream)
+
+    def read_frame(stream: socket.socket) -> typing.Callable[[], typing.Any]:
+        reader = FrameReader(stream)
+        return lambda: str(reader.read_frame(), "utf8")
+
+    for name, read in (("message_read", read_message), ("FrameReader", read_frame)):
+        print("{}: {:,.0f} messages/s".format(name, messages_per_second(read, batches)))
+
+
+if __name__ == "__main__":
+    main()
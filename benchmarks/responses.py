@@ -0,0 +1,86 @@
+"""
+Benchmark of serializing the JSON-RPC responses for typical `CodeChunk` results.
+
+Compares the previous serialization (the standard library's `json` with `indent=2`) with each of the installed
+`serialization.JSON_BACKENDS`, reporting the time taken to serialize each response and its size. Run from the root of
+the repository:
+
+python3 -m benchmarks.responses [repeats]
+"""
+
+import base64
+import importlib.util
+import json
+import random
+import sys
+import timeit
+import typing
+
+from stencila.schema.types import CodeChunk, Datatable, DatatableColumn, ImageObject
+
+from stencila.pyla.serialization import JSON_BACKENDS, JsonSerializer
+from stencila.pyla.servers import rpc_json_object_encode
+
+REPEATS = 200
+
+
+def responses() -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    """
+    Create responses for executing chunks with a few small outputs, a table and an image.
+    """
+    rng = random.Random(0)
+    rows = 1000
+    table = Datatable(
+        [
+            DatatableColumn("id", list(range(rows))),
+            DatatableColumn("value", [rng.random() for _ in range(rows)]),
+            DatatableColumn("label", ["label {}".format(i) for i in range(rows)]),
+        ]
+    )
+    image = ImageObject(
+        "data:image/png;base64,"
+        + base64.b64encode(bytes(rng.getrandbits(8) for _ in range(50_000))).decode()
+    )
+    chunks = {
+        "small": CodeChunk("x + 1", outputs=[42, "hello\n", [1.5, 2.5, 3.5]]),
+        "table": CodeChunk("data", outputs=[table]),
+        "image": CodeChunk("plot()", outputs=[image]),
+    }
+    return {
+        name: {"jsonrpc": "2.0", "id": 1, "result": chunk, "error": None}
+        for name, chunk in chunks.items()
+    }
+
+
+def main() -> None:
+    """
+    Run the benchmark and print the results.
+    """
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else REPEATS
+
+    encoders = {
+        "json (indent=2)": lambda value: json.dumps(
+            value, default=rpc_json_object_encode, indent=2
+        ).encode("utf8")
+    }
+    for backend in JSON_BACKENDS:
+        if backend == "json" or importlib.util.find_spec(backend):
+            encoders[backend] = JsonSerializer(
+                backend, hook=rpc_json_object_encode
+            ).encode
+
+    for name, response in responses().items():
+        print("{} response:".format(name))
+        for encoder_name, encode in encoders.items():
+            seconds = min(
+                timeit.repeat(lambda: encode(response), number=repeats, repeat=3)
+            )
+            print(
+                "  {:16} {:10.1f} µs {:10,} bytes".format(
+                    encoder_name, seconds / repeats * 1e6, len(encode(response)),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
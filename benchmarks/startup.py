@@ -0,0 +1,60 @@
+"""
+Benchmark of the cold start latency of `python3 -m stencila.pyla serve`.
+
+Measures the time from starting the server process until it has responded to a `manifest` request, over a number of
+runs, and reports the best and median times. Run from the root of the repository:
+
+python3 -m benchmarks.startup [runs]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from stencila.pyla.servers import encode_int, message_read
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUNS = 10
+
+REQUEST = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "manifest"}).encode("utf8")
+
+
+def startup_seconds() -> float:
+    """
+    Start a server, wait for its response to a `manifest` request and return the time taken, in seconds.
+    """
+    start = time.perf_counter()
+    with subprocess.Popen(
+        [sys.executable, "-m", "stencila.pyla", "serve"],
+        cwd=ROOT,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    ) as server:
+        server.stdin.write(encode_int(len(REQUEST)) + REQUEST)
+        server.stdin.flush()
+        message_read(server.stdout)
+        elapsed = time.perf_counter() - start
+        server.stdin.close()
+    return elapsed
+
+
+def main() -> None:
+    """
+    Run the benchmark and print the results.
+    """
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    times = [startup_seconds() for _ in range(runs)]
+    print(
+        "serve startup over {} runs: best {:.3f}s, median {:.3f}s".format(
+            runs, min(times), statistics.median(times)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -28,10 +28,9 @@ setup(
     url="https://github.com/stencila/pyla",
     packages=["stencila.pyla"],
     install_requires=[
-        "astor==0.8.1",
         "stencila-schema==1.4.3"
     ],
-    extras_require={},
+    extras_require={"fast-json": ["orjson"]},
     include_package_data=True,
     license="Apache-2.0",
     classifiers=[
@@ -3,6 +3,25 @@ __main__.py can be executed (once this library is installed) like this:
 
 python3 -m stencila.pyla execute <inputfile> <outputfile> [parameters]
 
+or, to serve JSON-RPC requests over stdio:
+
+python3 -m stencila.pyla serve [options]
+
+with the options:
+
+--timeout=SECONDS     limit the number of seconds each code chunk can run for
+--profile             record the time and memory used by each code chunk in its `meta`
+--page-size=ROWS      only send the first rows of large data frames (with the rest available using the `fetch` method)
+--figure-format=FMT   render figures as `png` (the default), `svg` or `jpeg`
+--figure-dpi=DPI      render figures at this resolution
+--blob-dir=PATH       write images to files in this directory, and send references to them rather than their content
+--json=LIBRARY        serialize messages with `orjson`, `msgspec` or `json` (by default, the first that is installed)
+--concurrent          handle requests concurrently, so that e.g. `compile` requests are not held up by a long `execute`
+
+With `--timeout`, requests are handled by a worker process, which is terminated (and restarted) if code that has run
+out of time can not be interrupted (e.g. because it is blocked in a C extension). The worker is itself started with
+the `--worker` option, which is only for internal use.
+
 See README.md for more information.
 
 Warning: `eval` and `exec` are used to run code in the document. Don't execute documents that you haven't verified
@@ -10,10 +29,19 @@ yourself.
 """
 
 import logging
+import os
 from sys import argv, stderr
 
+from .blobs import BlobStore
+from .figures import FigureRenderer
 from .interpreter import Interpreter
-from .servers import StdioServer
+from .serialization import JsonSerializer
+from .servers import (
+    AsyncStdioServer,
+    StdioServer,
+    WorkerProcess,
+    rpc_json_object_encode,
+)
 from .system import deregister, register
 
 # Send logs to stderr so that there it does not interfere with
@@ -22,7 +50,30 @@ logging.basicConfig(stream=stderr, level=logging.DEBUG)
 
 command = argv[1] if len(argv) > 1 else ""
 if command == "serve":
-    StdioServer(Interpreter()).start()
+    # Figures are only ever rendered to images, so use a non-interactive backend (matplotlib has not been imported yet)
+    os.environ["MPLBACKEND"] = "agg"
+    options = dict(
+        arg[2:].partition("=")[::2] for arg in argv[2:] if arg.startswith("--")
+    )
+    timeout = float(options["timeout"]) if "timeout" in options else None
+    (AsyncStdioServer if "concurrent" in options else StdioServer)(
+        Interpreter(
+            timeout=timeout,
+            profile="profile" in options,
+            datatable_page_size=int(options.get("page-size", 0)),
+            figure_renderer=FigureRenderer(
+                options.get("figure-format", "png"),
+                float(options["figure-dpi"]) if "figure-dpi" in options else None,
+                blob_store=BlobStore(options["blob-dir"])
+                if "blob-dir" in options
+                else None,
+            ),
+        ),
+        JsonSerializer(options.get("json"), hook=rpc_json_object_encode),
+        WorkerProcess(argv[2:] + ["--worker"], timeout)
+        if timeout is not None and "worker" not in options
+        else None,
+    ).start()
 elif command == "register":
     register()
 elif command == "deregister":
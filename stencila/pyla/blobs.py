@@ -0,0 +1,59 @@
+"""
+A content-addressed store, on disk, for large binary outputs (e.g. images) so they can be sent by reference.
+"""
+
+import os
+import pathlib
+import tempfile
+import typing
+
+from .caches import content_hash
+
+
+class BlobStore:
+    """
+    Stores blobs of bytes as files in a directory, named by the hash of their content.
+
+    Blobs with the same content are only stored once, and a blob's file is never changed once it has been written,
+    so clients can skip fetching a file that they already have. Files are spread across sub-directories named by
+    the first two characters of their hash, to keep directories small.
+    """
+
+    directory: pathlib.Path
+
+    def __init__(self, directory: typing.Union[str, os.PathLike]) -> None:
+        self.directory = pathlib.Path(directory).resolve()
+
+    def path(self, digest: str, extension: str = "") -> pathlib.Path:
+        """
+        Get the path of the file for the blob with a hash.
+        """
+        return self.directory / digest[:2] / (digest + extension)
+
+    def put(self, data: bytes, extension: str = "") -> pathlib.Path:
+        """
+        Store a blob, if it is not already stored, and return the path of its file.
+
+        The `extension` (e.g. `.png`) is added to the file name. The file is written to a temporary file and then
+        renamed, so readers never see a partially written blob.
+        """
+        path = self.path(content_hash(data), extension)
+        if path.exists():
+            return path
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                file.write(data)
+            os.replace(temporary, str(path))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return path
+
+    def url(self, data: bytes, extension: str = "") -> str:
+        """
+        Store a blob and return a `file://` URL for it.
+        """
+        return self.put(data, extension).as_uri()
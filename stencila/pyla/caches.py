@@ -0,0 +1,110 @@
+"""
+Bounded caches used to avoid repeating work when the same code is executed many times.
+"""
+
+import collections
+import copy
+import hashlib
+import marshal
+import pickle
+import types
+import typing
+
+
+def content_hash(content: typing.Union[str, bytes]) -> str:
+    """
+    Get a hex digest that identifies `content` (e.g. the text of a `CodeChunk`).
+    """
+    if isinstance(content, str):
+        content = content.encode("utf8")
+    return hashlib.sha256(content).hexdigest()
+
+
+def fingerprint(value: typing.Any) -> typing.Optional[str]:
+    """
+    Get a hash of the content of a value, or `None` if the value can not be fingerprinted.
+
+    Modules are identified by their name and functions by their code and default argument values. Other values are
+    identified by their pickled bytes.
+    """
+    try:
+        if isinstance(value, types.ModuleType):
+            data = "module:{}".format(value.__name__).encode("utf8")
+        elif isinstance(value, types.FunctionType):
+            data = marshal.dumps((value.__code__, value.__defaults__))
+        else:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    # pylint: disable=W0703  # pickling arbitrary objects can raise almost any exception
+    except Exception:
+        return None
+    return content_hash(data)
+
+
+def snapshot(value: typing.Any) -> typing.Any:
+    """
+    Get a copy of a value that will not be affected by later changes to the original.
+
+    Modules are not copied. Raises an exception if the value can not be copied.
+    """
+    if isinstance(value, types.ModuleType):
+        return value
+    return copy.deepcopy(value)
+
+
+class LRUCache:
+    """
+    A mapping that holds at most `maxsize` items, evicting the least recently used item when full.
+
+    Counts cache `hits` and `misses` so that the effectiveness of the cache can be monitored.
+    """
+
+    maxsize: int
+    hits: int
+    misses: int
+    _items: "collections.OrderedDict[typing.Hashable, typing.Any]"
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._items = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: typing.Hashable) -> bool:
+        return key in self._items
+
+    def get(self, key: typing.Hashable) -> typing.Optional[typing.Any]:
+        """
+        Get the item stored for `key`, marking it as the most recently used, or `None` if there isn't one.
+        """
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: typing.Hashable, value: typing.Any) -> None:
+        """
+        Store `value` for `key`, evicting the least recently used item if the cache is full.
+        """
+        if self.maxsize <= 0:
+            return
+
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Remove all items and reset the hit and miss counters.
+        """
+        self._items.clear()
+        self.hits = 0
+        self.misses = 0
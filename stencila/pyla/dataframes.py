@@ -0,0 +1,245 @@
+"""
+Conversion of pandas `DataFrame`s to Stencila `Datatable`s.
+
+Each column is converted as a whole using NumPy, rather than value by value, and missing values (`NaN`, `NaT`,
+`None` and `pandas.NA`) become `None` (i.e. `null` in JSON). Boolean and numeric columns can instead be encoded as
+binary (see `encoding`).
+"""
+
+import typing
+
+from stencila.schema.types import (
+    ArrayValidator,
+    BooleanValidator,
+    Datatable,
+    DatatableColumn,
+    EnumValidator,
+    IntegerValidator,
+    NumberValidator,
+    StringValidator,
+    Validator,
+)
+
+from .encoding import BINARY_KINDS, EncodedArray, encode_array
+
+try:
+    import numpy
+    import pandas
+    from pandas.api import types as pandas_types
+
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+ColumnValues = typing.Tuple[typing.List[typing.Any], typing.Optional[Validator]]
+
+# The validators for the kinds of values found in `object` columns, as named by `pandas.api.types.infer_dtype`
+INFERRED_VALIDATORS: typing.Dict[str, typing.Callable[[], Validator]] = {
+    "string": StringValidator,
+    "boolean": BooleanValidator,
+    "integer": IntegerValidator,
+    "floating": NumberValidator,
+    "mixed-integer-float": NumberValidator,
+}
+
+
+def decode_dataframe(
+    data_frame: "pandas.DataFrame", encoding: str = "json"
+) -> Datatable:
+    """
+    Decode a pandas `DataFrame` into a `Datatable`.
+
+    If `encoding` is `base64`, boolean and numeric columns are encoded as binary (see `encode_column`).
+    """
+    columns = []
+    for column_name, column in data_frame.items():
+        encoded = encode_column(column) if encoding == "base64" else None
+        meta: typing.Optional[typing.Dict[str, typing.Any]] = None
+        if encoded is not None:
+            values: typing.List[typing.Any] = []
+            validator: typing.Optional[Validator] = binary_validator(column.dtype)
+            meta = {"encoding": encoded}
+        else:
+            values, validator = decode_column(column)
+
+        columns.append(
+            DatatableColumn(
+                column_name,
+                values,
+                validator=ArrayValidator(itemsValidator=validator),
+                meta=meta,
+            )
+        )
+    return Datatable(columns)
+
+
+# pylint: disable=R0913
+def decode_dataframe_window(
+    data_frame: "pandas.DataFrame",
+    handle: str,
+    offset: int = 0,
+    limit: typing.Optional[int] = None,
+    columns: typing.Optional[typing.List[typing.Any]] = None,
+    encoding: str = "json",
+) -> Datatable:
+    """
+    Decode a window of the rows, and optionally only some of the columns, of a `DataFrame` into a `Datatable`.
+
+    The `meta` of the `Datatable` has the `handle` with which more rows can be fetched, the total number of `rows`
+    in the `DataFrame` and the `offset` of the first row in the window. Raises a `KeyError` if any of the `columns`
+    do not exist.
+    """
+    window = data_frame.iloc[offset : None if limit is None else offset + limit]
+    if columns is not None:
+        window = window.loc[:, columns]
+
+    datatable = decode_dataframe(window, encoding)
+    datatable.meta = {"handle": handle, "rows": len(data_frame), "offset": offset}
+    return datatable
+
+
+def encode_column(column: "pandas.Series") -> typing.Optional[EncodedArray]:
+    """
+    Encode a boolean or numeric column as binary, using its own dtype (see `encoding.encode_array`).
+
+    Missing values of nullable columns (e.g. pandas' `Int64`) are given in a bitmap. Returns `None` for other
+    columns.
+    """
+    dtype = column.dtype
+    if isinstance(dtype, numpy.dtype):
+        if dtype.kind not in BINARY_KINDS:
+            return None
+        return encode_array(column.to_numpy())
+
+    # Nullable extension dtypes (e.g. `Int64`, `boolean` and `Float64`) have the dtype of the values they hold
+    numpy_dtype = getattr(dtype, "numpy_dtype", None)
+    if numpy_dtype is None or numpy_dtype.kind not in BINARY_KINDS:
+        return None
+
+    nulls = column.isna().to_numpy()
+    na_value = numpy.nan if numpy_dtype.kind == "f" else 0
+    return encode_array(column.to_numpy(dtype=numpy_dtype, na_value=na_value), nulls)
+
+
+def binary_validator(dtype: typing.Any) -> Validator:
+    """
+    Get the validator for the values of a column encoded by `encode_column`.
+    """
+    if pandas_types.is_bool_dtype(dtype):
+        return BooleanValidator()
+    if pandas_types.is_integer_dtype(dtype):
+        return IntegerValidator()
+    return NumberValidator()
+
+
+# pylint: disable=R0911
+def decode_column(column: "pandas.Series") -> ColumnValues:
+    """
+    Get the values of a pandas `Series` as a list of JSON compatible values, and a validator for them.
+
+    The validator is `None` if the values are of mixed, or unknown, types.
+    """
+    dtype = column.dtype
+
+    if isinstance(dtype, pandas.SparseDtype):
+        return decode_column(column.sparse.to_dense())
+
+    if isinstance(dtype, pandas.CategoricalDtype):
+        return decode_categorical(column)
+
+    if pandas_types.is_bool_dtype(dtype):
+        return nullable_values(column), BooleanValidator()
+
+    if pandas_types.is_integer_dtype(dtype):
+        return nullable_values(column), IntegerValidator()
+
+    if pandas_types.is_float_dtype(dtype):
+        return float_values(column), NumberValidator()
+
+    if pandas_types.is_datetime64_any_dtype(dtype):
+        return datetime_values(column), StringValidator()
+
+    if pandas_types.is_timedelta64_dtype(dtype):
+        return float_values(column.dt.total_seconds()), NumberValidator()
+
+    if isinstance(dtype, (pandas.PeriodDtype, pandas.IntervalDtype)):
+        return (
+            object_values(column.astype(str).where(column.notna())),
+            StringValidator(),
+        )
+
+    values = object_values(column)
+    inferred = pandas_types.infer_dtype(column, skipna=True)
+    validator = INFERRED_VALIDATORS.get(inferred)
+    return values, validator() if validator else None
+
+
+def nullable_values(column: "pandas.Series") -> typing.List[typing.Any]:
+    """
+    Get the values of a boolean or integer column, which may be nullable (e.g. pandas' `Int64` and `boolean`).
+    """
+    if column.hasnans:
+        return column.to_numpy(dtype=object, na_value=None).tolist()
+    return column.to_numpy().tolist()
+
+
+def float_values(column: "pandas.Series") -> typing.List[typing.Optional[float]]:
+    """
+    Get the values of a floating point column, with `NaN` as `None`.
+    """
+    values = column.to_numpy(dtype=numpy.float64, na_value=numpy.nan)
+    missing = numpy.isnan(values)
+    if not missing.any():
+        return values.tolist()
+
+    objects = values.astype(object)
+    objects[missing] = None
+    return objects.tolist()
+
+
+def datetime_values(column: "pandas.Series") -> typing.List[typing.Optional[str]]:
+    """
+    Get the values of a datetime column as ISO 8601 strings, with `NaT` as `None`.
+
+    Timezone aware values are converted to UTC (with a `Z` suffix), keeping the full precision of the column.
+    Naive values are given with the precision needed for each value (e.g. just the date if there is no time).
+    """
+    if getattr(column.dt, "tz", None) is not None:
+        values = column.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy()
+        strings = numpy.datetime_as_string(  # type: ignore
+            values, unit=numpy.datetime_data(values.dtype)[0], timezone="UTC"
+        )
+    else:
+        values = column.to_numpy()
+        strings = numpy.datetime_as_string(values, unit="auto")
+
+    objects = strings.astype(object)
+    missing = numpy.isnat(values)
+    if missing.any():
+        objects[missing] = None
+    return objects.tolist()
+
+
+def decode_categorical(column: "pandas.Series") -> ColumnValues:
+    """
+    Get the values of a categorical column, with an `EnumValidator` of its categories.
+
+    The categories are converted once, and the values are then looked up from the category codes.
+    """
+    categories, _ = decode_column(pandas.Series(column.cat.categories))
+    lookup = numpy.array(categories + [None], dtype=object)
+    # Missing values have a code of -1, which indexes the `None` at the end of `lookup`
+    values = lookup[column.cat.codes.to_numpy()].tolist()
+    return values, EnumValidator(values=categories)
+
+
+def object_values(column: "pandas.Series") -> typing.List[typing.Any]:
+    """
+    Get the values of a column of arbitrary objects, with missing values as `None`.
+    """
+    values = column.to_numpy(dtype=object)
+    missing = column.isna().to_numpy()
+    if missing.any():
+        values = values.copy()
+        values[missing] = None
+    return values.tolist()
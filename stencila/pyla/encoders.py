@@ -0,0 +1,167 @@
+"""
+A registry of encoders, keyed by type, that convert outputs of special types (e.g. pandas `DataFrame`s) to values
+that can be sent as JSON.
+
+Encoders for other types (e.g. polars `DataFrame`s or PIL images) can be added, without changing the interpreter,
+using `register_encoder`:
+
+    from stencila.pyla.encoders import register_encoder
+
+    register_encoder("polars.DataFrame", lambda data_frame: data_frame.to_dicts())
+
+Types can be given by name, so that encoders can be registered for types from packages that have not been imported
+(and may never be).
+"""
+
+import typing
+
+Encoder = typing.Callable[[typing.Any], typing.Any]
+
+
+def type_names(cls: type) -> typing.Tuple[str, str]:
+    """
+    Get the names by which a type can be registered: its full name (e.g. `pandas.core.frame.DataFrame`) and its name
+    in its top level package (e.g. `pandas.DataFrame`).
+    """
+    return (
+        "{}.{}".format(cls.__module__, cls.__qualname__),
+        "{}.{}".format(cls.__module__.partition(".")[0], cls.__qualname__),
+    )
+
+
+class EncoderRegistry:
+    """
+    Encoders keyed by type, or by type name, with encoders for a type also used for its subclasses.
+
+    A registry may have a `parent` registry (e.g. the encoders shared by all interpreters), whose encoders it also
+    uses. The encoder for a type is found by looking, in the type's method resolution order, for the first class with
+    an encoder registered in the registry or any of its parents, so that the most specific class wins. For a class,
+    encoders registered as `default`s (e.g. the interpreter's own encoders for the types it knows about) are only
+    used if none of the registries has another encoder for it, so that users can override them. Lookups are cached
+    by type, so encoding a value usually costs a single dictionary lookup.
+    """
+
+    parent: typing.Optional["EncoderRegistry"]
+
+    """
+    The encoders registered for types, and for type names.
+    """
+    encoders: typing.Dict[typing.Union[type, str], Encoder]
+
+    """
+    The default encoders registered for types, and for type names, which other encoders take precedence over.
+    """
+    defaults: typing.Dict[typing.Union[type, str], Encoder]
+
+    """
+    The encoder found for each type looked up, or `None` if there is none.
+    """
+    cache: typing.Dict[type, typing.Optional[Encoder]]
+
+    """
+    Incremented each time an encoder is registered, so that registries using this one as their `parent` know when to
+    clear their cache.
+    """
+    generation: int
+
+    _parent_generation: int
+
+    def __init__(self, parent: typing.Optional["EncoderRegistry"] = None) -> None:
+        self.parent = parent
+        self.encoders = {}
+        self.defaults = {}
+        self.cache = {}
+        self.generation = 0
+        self._parent_generation = parent.total_generation() if parent else 0
+
+    def register(
+        self, cls: typing.Union[type, str], encoder: Encoder, default: bool = False
+    ) -> None:
+        """
+        Register the encoder for a type (and its subclasses), replacing any existing encoder for it.
+
+        The type can be given by name, either its full name or its name in its top level package (see `type_names`).
+        If `default` is true, the encoder is only used if no other encoder is registered for the type, in this
+        registry or its parents.
+        """
+        (self.defaults if default else self.encoders)[cls] = encoder
+        self.cache.clear()
+        self.generation += 1
+
+    def registries(self) -> typing.List["EncoderRegistry"]:
+        """
+        Get this registry followed by its parent, its parent's parent, and so on.
+        """
+        registries = []
+        registry: typing.Optional[EncoderRegistry] = self
+        while registry is not None:
+            registries.append(registry)
+            registry = registry.parent
+        return registries
+
+    def total_generation(self) -> int:
+        """
+        Get the sum of the `generation`s of this registry and its parents, which changes when an encoder is
+        registered in any of them.
+        """
+        if self.parent is None:
+            return self.generation
+        return self.generation + self.parent.total_generation()
+
+    def lookup(self, cls: type) -> typing.Optional[Encoder]:
+        """
+        Get the encoder for a type, or `None` if there is none.
+        """
+        if self.parent is not None:
+            parent_generation = self.parent.total_generation()
+            if parent_generation != self._parent_generation:
+                self.cache.clear()
+                self._parent_generation = parent_generation
+
+        try:
+            return self.cache[cls]
+        except KeyError:
+            pass
+
+        registries = self.registries()
+        tables = [registry.encoders for registry in registries] + [
+            registry.defaults for registry in registries
+        ]
+        tables = [table for table in tables if table]
+
+        encoder = None
+        for base in cls.__mro__:
+            for table in tables:
+                encoder = table.get(base)
+                if encoder is None:
+                    for name in type_names(base):
+                        encoder = table.get(name)
+                        if encoder is not None:
+                            break
+                if encoder is not None:
+                    break
+            if encoder is not None:
+                break
+
+        self.cache[cls] = encoder
+        return encoder
+
+    def encode(self, value: typing.Any) -> typing.Any:
+        """
+        Encode a value using the encoder for its type, or return it unchanged if there is none.
+        """
+        encoder = self.lookup(type(value))
+        return value if encoder is None else encoder(value)
+
+
+"""
+The encoders used by all interpreters, for types that an interpreter does not have its own encoder for.
+"""
+ENCODERS = EncoderRegistry()
+
+
+def register_encoder(cls: typing.Union[type, str], encoder: Encoder) -> None:
+    """
+    Register an encoder, used by all interpreters, for a type (see `EncoderRegistry.register`).
+    """
+    ENCODERS.register(cls, encoder)
@@ -0,0 +1,135 @@
+"""
+Binary encoding of arrays of numbers and booleans, for sending large outputs without formatting each value as JSON.
+
+An encoded array is a dictionary with the `dtype` of the values (as a NumPy array-protocol type string, always
+little-endian, e.g. `<f8` for 64 bit floats and `|b1` for booleans), their `length` and the bytes of the values as
+base64 in `data`. If some values are missing, `nulls` has a base64 bitmap with a bit set for each missing value
+(least significant bit first). Missing floating point values are also `NaN` in `data`.
+
+NumPy is only imported when an array is encoded or decoded, so that importing the names of the encodings is fast.
+"""
+
+import base64
+import importlib
+import typing
+
+if typing.TYPE_CHECKING:
+    import numpy
+
+"""
+The names of the encodings that can be used for the values of the columns of a `Datatable`.
+
+With `json`, values are always a JSON array. With `base64`, the values of boolean and numeric columns are instead
+encoded (see `encode_array`) in the `encoding` property of the column's `meta`, and its `values` are empty.
+"""
+DATATABLE_ENCODINGS = ["json", "base64"]
+
+"""
+The names of the encodings that can be used for NumPy `ndarray` outputs.
+
+With `json`, arrays are nested JSON arrays. With `base64`, arrays of booleans and numbers are encoded (see
+`encode_array`) along with their `shape`. In both cases, arrays with more elements than a threshold are summarized
+(see `summarize_array`).
+"""
+NDARRAY_ENCODINGS = ["json", "base64"]
+
+# The number of elements from the start, and from the end, of an array that are included in its summary
+SUMMARY_EDGE_ITEMS = 5
+
+# The kinds of NumPy arrays that can be encoded: booleans, signed and unsigned integers, and floats
+BINARY_KINDS = "biuf"
+
+EncodedArray = typing.Dict[str, typing.Any]
+
+
+def encode_array(
+    values: "numpy.ndarray", nulls: typing.Optional["numpy.ndarray"] = None
+) -> EncodedArray:
+    """
+    Encode an array of booleans or numbers, optionally with a boolean mask of the missing values.
+
+    Arrays with more than one dimension are flattened, in row-major order, and have their `shape` added.
+    """
+    if values.dtype.kind not in BINARY_KINDS:
+        raise ValueError("Can not encode array of dtype {}".format(values.dtype))
+
+    numpy = importlib.import_module("numpy")
+
+    shape = values.shape
+    values = numpy.ascontiguousarray(
+        values, dtype=values.dtype.newbyteorder("<")
+    ).ravel()
+    encoded = {
+        "encoding": "base64",
+        "dtype": values.dtype.str,
+        "length": len(values),
+        "data": base64.b64encode(values.data).decode("ascii"),
+    }
+    if len(shape) != 1:
+        encoded["shape"] = list(shape)
+    if nulls is not None and nulls.any():
+        encoded["nulls"] = base64.b64encode(
+            numpy.packbits(nulls, bitorder="little").tobytes()
+        ).decode("ascii")
+    return encoded
+
+
+def decode_array(encoded: EncodedArray) -> "numpy.ndarray":
+    """
+    Decode an array encoded by `encode_array`.
+
+    Missing values are `NaN` for floating point arrays. For other arrays, use `decode_nulls` to get the mask of the
+    missing values.
+    """
+    numpy = importlib.import_module("numpy")
+    values = numpy.frombuffer(
+        base64.b64decode(encoded["data"]), dtype=numpy.dtype(encoded["dtype"])
+    )[: encoded["length"]]
+    if "shape" in encoded:
+        values = values.reshape(encoded["shape"])
+    return values
+
+
+def decode_nulls(encoded: EncodedArray) -> "numpy.ndarray":
+    """
+    Get the boolean mask of the missing values of an array encoded by `encode_array`.
+    """
+    numpy = importlib.import_module("numpy")
+    length = encoded["length"]
+    if "nulls" not in encoded:
+        return numpy.zeros(length, dtype=bool)
+
+    bits = numpy.frombuffer(base64.b64decode(encoded["nulls"]), dtype=numpy.uint8)
+    return numpy.unpackbits(bits, count=length, bitorder="little").astype(bool)
+
+
+def summarize_array(
+    array: "numpy.ndarray", edge_items: int = SUMMARY_EDGE_ITEMS
+) -> EncodedArray:
+    """
+    Summarize an array that is too large to be sent in full.
+
+    The summary has the `dtype`, `shape` and `length` (number of elements) of the array, the first and last
+    `edge_items` elements (of the flattened array) as `head` and `tail`, and for numeric arrays, the `minimum`,
+    `maximum` and `mean`, ignoring `NaN`s for the minimum and maximum. None of these make a copy of the array.
+    """
+    numpy = importlib.import_module("numpy")
+    length = array.size
+    head = array.flat[:edge_items]
+    tail = array.flat[max(length - edge_items, edge_items) :]
+    if array.dtype.kind not in BINARY_KINDS:
+        head, tail = head.astype(str), tail.astype(str)
+
+    summary = {
+        "encoding": "summary",
+        "dtype": array.dtype.str,
+        "shape": list(array.shape),
+        "length": length,
+        "head": head.tolist(),
+        "tail": tail.tolist(),
+    }
+    if length and array.dtype.kind in "iuf":
+        summary["minimum"] = numpy.nanmin(array).item()
+        summary["maximum"] = numpy.nanmax(array).item()
+        summary["mean"] = float(array.mean(dtype=numpy.float64))
+    return summary
@@ -17,3 +17,12 @@ class CapabilityError(Exception):
         super().__init__(
             'Incapable of method "{}" with params "{}"'.format(method, params)
         )
+
+
+class ExecutionTimeoutError(BaseException):
+    """
+    Custom error class to indicate that code has run for longer than its time budget.
+
+    Raised in the thread executing the code to interrupt it. Derives from `BaseException`, like `KeyboardInterrupt`,
+    so that it is not caught by `except Exception` clauses in the code being interrupted.
+    """
@@ -0,0 +1,236 @@
+"""
+Rendering of matplotlib figures to images, with a cache so that unchanged figures are not rendered again.
+
+matplotlib is slow to import, so it is only imported when a figure is rendered (by which time it has already been
+imported by the code that created the figure).
+"""
+
+import base64
+import importlib
+import io
+import pickle
+import sys
+import typing
+
+from stencila.schema.types import ImageObject
+
+from .blobs import BlobStore
+from .caches import LRUCache, content_hash
+
+if typing.TYPE_CHECKING:
+    import matplotlib.figure
+
+"""
+The formats that figures can be rendered to, and their media types.
+"""
+IMAGE_FORMATS = {"png": "image/png", "svg": "image/svg+xml", "jpeg": "image/jpeg"}
+
+# The maximum number of rendered images kept by a `FigureRenderer`
+FIGURE_CACHE_SIZE = 64
+
+
+class FigurePickler(pickle.Pickler):
+    """
+    Pickles a matplotlib figure to bytes that only depend on its content.
+
+    Leaves out the parts of the figure's state that differ between figures with the same content: the figure number,
+    and the backlinks from transforms to their parents (which are keyed by object id).
+    """
+
+    def __init__(self, file: typing.BinaryIO, protocol: int) -> None:
+        super().__init__(file, protocol)
+        self.figure_class = importlib.import_module("matplotlib.figure").Figure
+        self.transform_class = importlib.import_module(
+            "matplotlib.transforms"
+        ).TransformNode
+
+    def reducer_override(self, obj: typing.Any) -> typing.Any:
+        """
+        Get the state of figures and transforms without the parts that do not depend on their content.
+        """
+        if isinstance(obj, self.figure_class):
+            omit = "_number"
+        elif isinstance(obj, self.transform_class):
+            omit = "_parents"
+        else:
+            return NotImplemented
+
+        state = dict(obj.__getstate__())
+        state.pop(omit, None)
+        return object.__new__, (type(obj),), state
+
+
+def figure_fingerprint(figure: "matplotlib.figure.Figure") -> typing.Optional[str]:
+    """
+    Get a hash of the content of a figure, or `None` if the figure can not be fingerprinted.
+
+    Rendering a figure updates some of its internal state, so the fingerprint of a figure should be taken before it
+    is rendered. Two figures created by the same code have the same fingerprint. Before Python 3.8, `FigurePickler`
+    is not supported, so figures are never fingerprinted.
+    """
+    if sys.version_info < (3, 8):
+        return None
+
+    data = io.BytesIO()
+    try:
+        FigurePickler(data, pickle.HIGHEST_PROTOCOL).dump(figure)
+    # pylint: disable=W0703  # pickling arbitrary artists can raise almost any exception
+    except Exception:
+        return None
+    return content_hash(data.getvalue())
+
+
+class FigureRenderer:
+    """
+    Renders matplotlib figures to `ImageObject`s with a base64 `data:` URI or, if there is a `blob_store`, with a
+    `file://` URL of the image in the store.
+
+    The `format` is one of `IMAGE_FORMATS`. If `dpi` is `None`, matplotlib's `savefig.dpi` setting is used. If
+    `max_width` or `max_height` (in pixels) are set, the resolution is reduced so that the image fits within them.
+    Images are cached by the fingerprint of the figure, so re-executing code that creates the same figure does not
+    render it again.
+    """
+
+    format: str
+    dpi: typing.Optional[float]
+    max_width: typing.Optional[int]
+    max_height: typing.Optional[int]
+    blob_store: typing.Optional[BlobStore]
+
+    """
+    Recently rendered images, keyed by the fingerprint of the figure, the format and the resolution.
+    """
+    cache: LRUCache
+
+    # pylint: disable=R0913,W0622
+    def __init__(
+        self,
+        format: str = "png",
+        dpi: typing.Optional[float] = None,
+        max_width: typing.Optional[int] = None,
+        max_height: typing.Optional[int] = None,
+        cache_size: int = FIGURE_CACHE_SIZE,
+        blob_store: typing.Optional[BlobStore] = None,
+    ) -> None:
+        if format not in IMAGE_FORMATS:
+            raise ValueError('Unknown image format "{}"'.format(format))
+
+        self.format = format
+        self.dpi = dpi
+        self.max_width = max_width
+        self.max_height = max_height
+        self.cache = LRUCache(cache_size)
+        self.blob_store = blob_store
+
+    def resolution(self, figure: "matplotlib.figure.Figure") -> typing.Optional[float]:
+        """
+        Get the resolution, in dots per inch, at which to render a figure, or `None` to use matplotlib's setting.
+        """
+        if self.max_width is None and self.max_height is None:
+            return self.dpi
+
+        dpi = self.dpi
+        if dpi is None:
+            setting = importlib.import_module("matplotlib").rcParams["savefig.dpi"]
+            dpi = figure.dpi if setting == "figure" else float(setting)
+
+        width, height = figure.get_size_inches()
+        if self.max_width is not None and width * dpi > self.max_width:
+            dpi = self.max_width / width
+        if self.max_height is not None and height * dpi > self.max_height:
+            dpi = self.max_height / height
+        return dpi
+
+    def render(self, figure: "matplotlib.figure.Figure") -> ImageObject:
+        """
+        Render a figure to an `ImageObject`, using the cached image if the figure has been rendered before.
+        """
+        dpi = self.resolution(figure)
+        fingerprint = figure_fingerprint(figure) if self.cache.maxsize > 0 else None
+        key = None if fingerprint is None else (fingerprint, self.format, dpi)
+
+        src = self.cache.get(key) if key is not None else None
+        if src is None:
+            image = io.BytesIO()
+            figure.savefig(image, format=self.format, dpi=dpi)
+            if self.blob_store is not None:
+                src = self.blob_store.url(image.getvalue(), "." + self.format)
+            else:
+                src = "data:{};base64,{}".format(
+                    IMAGE_FORMATS[self.format],
+                    base64.b64encode(image.getvalue()).decode("ascii"),
+                )
+            if key is not None:
+                self.cache.put(key, src)
+
+        if self.blob_store is not None:
+            return ImageObject(src, format=IMAGE_FORMATS[self.format])
+        return ImageObject(src)
+
+
+def figure_managers() -> typing.List[typing.Any]:
+    """
+    Get the managers of the figures that are open in pyplot, in the order that the figures were created.
+
+    If pyplot has not been imported, no figures can be open, so it is not imported here.
+    """
+    helpers = sys.modules.get("matplotlib._pylab_helpers")
+    if helpers is None:
+        return []
+    return sorted(helpers.Gcf.get_all_fig_managers(), key=lambda manager: manager.num)
+
+
+class FigureTracker:
+    """
+    Context handler for tracking the pyplot figures created by code, use inside a `with` statement.
+
+    The figures created inside the `with` statement, and still open, are given by `new_figures`. They are all closed
+    when the statement exits (even if an exception was raised) so that they do not use memory after they have been
+    rendered. Figures that were already open are left open.
+    """
+
+    __slots__ = ("existing",)
+
+    existing: typing.Set[typing.Any]
+
+    def __init__(self) -> None:
+        self.existing = set()
+
+    def __enter__(self) -> "FigureTracker":
+        self.existing = set(figure_managers())
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        managers = [
+            manager for manager in figure_managers() if manager not in self.existing
+        ]
+        if managers:
+            helpers = sys.modules["matplotlib._pylab_helpers"]
+            for manager in managers:
+                helpers.Gcf.destroy(manager.num)
+
+    def new_figures(self) -> typing.List["matplotlib.figure.Figure"]:
+        """
+        Get the figures created since the `with` statement was entered, that are still open.
+        """
+        return [
+            manager.canvas.figure
+            for manager in figure_managers()
+            if manager not in self.existing
+        ]
+
+
+def artist_figure(value: typing.Any) -> typing.Optional["matplotlib.figure.Figure"]:
+    """
+    Get the figure of a matplotlib artist (or a list of one artist, as returned by e.g. `pyplot.plot`).
+
+    A figure is its own figure. Returns `None` if the artist has not been added to a figure.
+    """
+    if isinstance(value, list):
+        value = value[0]
+
+    figure_class = importlib.import_module("matplotlib.figure").Figure
+    if isinstance(value, figure_class):
+        return value
+    figure = getattr(value, "figure", None)
+    return figure if isinstance(figure, figure_class) else None
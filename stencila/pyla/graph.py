@@ -0,0 +1,325 @@
+"""
+Dependency graph of the code in a compiled document, used to only re-execute the code affected by a change.
+"""
+
+import ast
+import logging
+import typing
+
+from stencila.schema.types import CodeError, CodeExpression
+
+from .caches import fingerprint
+from .errors import ExecutionTimeoutError
+from .interpreter import DocumentCompilationResult, ExecutableCode, Interpreter
+from .parser import CodeChunkExecution, set_code_error
+from .timing import clock_ns, ns_to_seconds, seconds_to_ns
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+
+def expression_names(expression: CodeExpression) -> typing.List[str]:
+    """
+    Get the names of the variables read by a `CodeExpression`.
+
+    Returns an empty list if the expression is not valid Python.
+    """
+    try:
+        expression_ast = ast.parse(expression.text, mode="eval")
+    except SyntaxError:
+        return []
+
+    names: typing.List[str] = []
+    for node in ast.walk(expression_ast):
+        if isinstance(node, ast.Name) and node.id not in names:
+            names.append(node.id)
+    return names
+
+
+class DependencyGraph:
+    """
+    The data dependencies between the code nodes of a `DocumentCompilationResult`.
+
+    Nodes are identified by their index in `DocumentCompilationResult.code`, and the graph is built from the
+    `uses`, `alters`, `assigns` and `declares` (and imports) found by the `CodeChunkParser`. Code that reads a
+    variable depends on the last code before it that wrote the variable (its reaching definition). Code that writes a
+    variable also depends on the last code before it that wrote the same variable so that, when both are re-executed,
+    the variable ends up with the same value as after executing the whole document.
+
+    Calling a method of a variable defined by earlier code (e.g. `xs.append(a)`) is treated as writing it, since the
+    method may change it in place, unless the variable is a module (i.e. it was last written by an `import`). This
+    means that re-executing the call also re-executes the code that defines the variable first, at the cost of
+    sometimes re-executing code for methods that do not change their object. Other changes made in place that the
+    parser can not see, such as those made by a function the variable is passed to (e.g. `add(xs, a)`) or through
+    another name for the same object, are not tracked, and the code that makes them should be re-executed along
+    with the code that defines the variable (e.g. by putting them in the same `CodeChunk`).
+    """
+
+    """
+    The names of the variables read and written by each code node.
+    """
+    reads: typing.List[typing.Set[str]]
+    writes: typing.List[typing.Set[str]]
+
+    """
+    For each code node, the index of the code node that defines each of the variables that it reads, or `None` if
+    the variable is not defined by any earlier code (i.e. it is a parameter or is already in the namespace).
+    """
+    definitions: typing.List[typing.Dict[str, typing.Optional[int]]]
+
+    """
+    For each code node, the indexes of the code nodes that directly depend on it.
+    """
+    dependents: typing.List[typing.Set[int]]
+
+    """
+    The index of the last code node in the document that writes each variable.
+    """
+    last_writers: typing.Dict[str, int]
+
+    """
+    The names of the variables that were last written by an `import`, so calling their methods is not a write.
+    """
+    module_names: typing.Set[str]
+
+    def __init__(self, compilation_result: DocumentCompilationResult) -> None:
+        self.reads = []
+        self.writes = []
+        self.definitions = []
+        self.dependents = []
+        self.last_writers = {}
+        self.module_names = set()
+
+        for index, code in enumerate(compilation_result.code):
+            reads, writes = self.code_names(code)
+            if isinstance(code, CodeChunkExecution):
+                writes |= {
+                    name
+                    for name in code.parse_result.method_call_names()
+                    if name in self.last_writers and name not in self.module_names
+                }
+            self.reads.append(reads)
+            self.writes.append(writes)
+            self.dependents.append(set())
+
+            definitions = {name: self.last_writers.get(name) for name in reads}
+            self.definitions.append(definitions)
+            for name in writes:
+                if name in self.last_writers:
+                    definitions.setdefault(name, self.last_writers[name])
+
+            for definition in definitions.values():
+                if definition is not None:
+                    self.dependents[definition].add(index)
+
+            for name in writes:
+                self.last_writers[name] = index
+            self.module_names -= writes
+            if isinstance(code, CodeChunkExecution):
+                self.module_names.update(code.parse_result.imported_names())
+
+    @staticmethod
+    def code_names(
+        code: ExecutableCode,
+    ) -> typing.Tuple[typing.Set[str], typing.Set[str]]:
+        """
+        Get the names of the variables read, and written, by a code node.
+        """
+        if isinstance(code, CodeChunkExecution):
+            parse_result = code.parse_result
+            return set(parse_result.read_names()), set(parse_result.written_names())
+        return set(expression_names(code)), set()
+
+    def readers(self, names: typing.Iterable[str]) -> typing.Set[int]:
+        """
+        Get the indexes of the code nodes that read any of `names` without them being defined by earlier code.
+
+        These are the code nodes that are directly affected by a change in the value of a parameter.
+        """
+        names = set(names)
+        return {
+            index
+            for index, definitions in enumerate(self.definitions)
+            if any(
+                definitions.get(name, -1) is None and name in self.reads[index]
+                for name in names
+            )
+        }
+
+    def downstream(self, indexes: typing.Iterable[int]) -> typing.List[int]:
+        """
+        Get the indexes, in document order, of the code nodes that need to be executed after `indexes` change.
+
+        As well as the code nodes that depend, directly or indirectly, on the changed ones this includes any code
+        that defines a variable which they read, where the variable has since been overwritten by later code.
+        Otherwise, re-executed code would read the later value from the namespace rather than the value it would
+        have seen when executing the whole document.
+        """
+        selected: typing.Set[int] = set()
+        pending = set(indexes)
+        while pending:
+            stack = list(pending - selected)
+            selected |= pending
+            while stack:
+                for dependent in self.dependents[stack.pop()]:
+                    if dependent not in selected:
+                        selected.add(dependent)
+                        stack.append(dependent)
+
+            pending = {
+                definition
+                for index in selected
+                for name, definition in self.definitions[index].items()
+                if definition is not None
+                and definition not in selected
+                and name in self.reads[index]
+                and self.last_writers[name] != definition
+            }
+
+        return sorted(selected)
+
+
+class ReactiveExecutor:
+    """
+    Execute the code of a compiled document, and then only re-execute the code affected by later changes.
+
+    After an initial `execute`, use `update_parameters` when parameter values change, or `update_code` when the text of
+    a `CodeChunk` or `CodeExpression` is edited.
+
+    If `document_timeout` is set, each of these calls is given that many seconds to execute all of the code. Code
+    that is still running when the time runs out is interrupted, and code after it is not executed. Both get an
+    `ExecutionTimeoutError` as a `CodeError`.
+    """
+
+    interpreter: Interpreter
+    compilation_result: DocumentCompilationResult
+    graph: DependencyGraph
+    parameter_values: typing.Dict[str, typing.Any]
+    document_timeout: typing.Optional[float]
+
+    def __init__(
+        self,
+        interpreter: Interpreter,
+        compilation_result: DocumentCompilationResult,
+        document_timeout: typing.Optional[float] = None,
+    ) -> None:
+        self.interpreter = interpreter
+        self.compilation_result = compilation_result
+        self.graph = DependencyGraph(compilation_result)
+        self.parameter_values = {}
+        self.document_timeout = document_timeout
+
+    def execute(
+        self, parameter_values: typing.Optional[typing.Dict[str, typing.Any]] = None
+    ) -> typing.List[int]:
+        """
+        Execute all of the code in the document.
+
+        Returns the indexes of the code nodes that were executed.
+        """
+        self.parameter_values = dict(parameter_values or {})
+        self.interpreter.locals.update(self.parameter_values)
+        return self.run(range(len(self.compilation_result.code)))
+
+    def update_parameters(
+        self, parameter_values: typing.Dict[str, typing.Any]
+    ) -> typing.List[int]:
+        """
+        Set new parameter values and re-execute the code that depends on the ones that changed.
+
+        Returns the indexes of the code nodes that were executed.
+        """
+        changed = []
+        for name, value in parameter_values.items():
+            value_fingerprint = fingerprint(value)
+            if (
+                name not in self.parameter_values
+                or value_fingerprint is None
+                or value_fingerprint != fingerprint(self.parameter_values[name])
+            ):
+                changed.append(name)
+
+        self.parameter_values.update(parameter_values)
+        self.interpreter.locals.update(parameter_values)
+        return self.run(self.graph.downstream(self.graph.readers(changed)))
+
+    def update_code(self, index: int, text: str) -> typing.List[int]:
+        """
+        Change the text of a code node and re-execute it, and the code that depends on it.
+
+        Returns the indexes of the code nodes that were executed.
+        """
+        code = self.compilation_result.code[index]
+        old_writes = self.graph.writes[index]
+
+        if isinstance(code, CodeChunkExecution):
+            chunk = code.code_chunk
+            chunk.text = text
+            chunk.errors = None
+            parse_result, chunk = Interpreter.compile_code_chunk(chunk)
+            self.compilation_result.code[index] = CodeChunkExecution(
+                chunk, parse_result
+            )
+        else:
+            code.text = text
+
+        self.graph = DependencyGraph(self.compilation_result)
+
+        # Variables that the code no longer writes: code that reads them needs to be re-executed and, if nothing else
+        # writes them, they are removed from the namespace
+        removed = old_writes - self.graph.writes[index]
+        for name in removed:
+            if name not in self.graph.last_writers:
+                self.interpreter.locals.pop(name, None)
+
+        changed = {index} | {
+            reader
+            for reader in range(index + 1, len(self.compilation_result.code))
+            if self.graph.reads[reader] & removed
+        }
+        return self.run(self.graph.downstream(changed))
+
+    def run(self, indexes: typing.Iterable[int]) -> typing.List[int]:
+        """
+        Execute the code nodes at `indexes`, in order, clearing the results of any previous execution.
+        """
+        deadline = (
+            None
+            if self.document_timeout is None
+            else clock_ns() + seconds_to_ns(self.document_timeout)
+        )
+
+        executed = []
+        for index in indexes:
+            code = self.compilation_result.code[index]
+            if isinstance(code, CodeChunkExecution):
+                code.code_chunk.errors = None
+                if code.parse_result.error:
+                    set_code_error(code.code_chunk, code.parse_result.error)
+            else:
+                code.errors = None
+                code.output = None
+
+            timeout = self.interpreter.timeout
+            if deadline is not None:
+                remaining = ns_to_seconds(deadline - clock_ns())
+                if remaining <= 0:
+                    set_code_error(
+                        code.code_chunk
+                        if isinstance(code, CodeChunkExecution)
+                        else code,
+                        CodeError(
+                            errorType=ExecutionTimeoutError.__name__,
+                            errorMessage="Document time budget of {} seconds exceeded".format(
+                                self.document_timeout
+                            ),
+                        ),
+                    )
+                    continue
+                timeout = remaining if timeout is None else min(timeout, remaining)
+
+            self.interpreter.execute(code, timeout=timeout)
+            executed.append(index)
+
+        LOGGER.debug("Executed code nodes %s", executed)
+        return executed
@@ -9,131 +9,476 @@ Warning: `eval` and `exec` are used to run code in the document. Don't execute d
 yourself.
 """
 
+# pylint: disable=C0302  # too-many-lines
+
 import ast
-import base64
-import datetime
+import codecs
+import ctypes
+import enum
+import importlib
 import logging
+import os
+import queue
 import sys
+import threading
+import types
 import typing
-from contextlib import redirect_stdout
-from io import BytesIO, TextIOWrapper
+import uuid
+import weakref
+from concurrent.futures import Future, wait
+from contextlib import contextmanager
+from io import TextIOBase
 
-import astor
 from stencila.schema.types import (
-    ArrayValidator,
     Article,
-    BooleanValidator,
     CodeChunk,
     CodeExpression,
     Datatable,
-    DatatableColumn,
     Entity,
     Function,
-    ImageObject,
-    IntegerValidator,
     Node,
-    NumberValidator,
     Parameter,
-    StringValidator,
 )
 
-from .errors import CapabilityError
+from .caches import LRUCache, content_hash, fingerprint, snapshot
+from .encoders import ENCODERS, EncoderRegistry
+from .encoding import (
+    BINARY_KINDS,
+    DATATABLE_ENCODINGS,
+    NDARRAY_ENCODINGS,
+    encode_array,
+    summarize_array,
+)
+from .errors import CapabilityError, ExecutionTimeoutError
+from .figures import FigureRenderer, FigureTracker, artist_figure
+from .limits import (
+    NUMBER_SIZE_ESTIMATE,
+    OBJECT_SIZE_ESTIMATE,
+    OutputBudget,
+    OutputLimits,
+    decode_bounded,
+)
 from .parser import (
     CodeChunkExecution,
     CodeChunkParser,
     CodeChunkParseResult,
+    exception_to_code_error,
     set_code_error,
     simple_code_chunk_parse,
 )
+from .profiling import ChunkProfiler
+from .timing import CodeTimer, ns_to_seconds
 
 if sys.version_info > (3, 8):
     AstModule = ast.Module
 else:
     AstModule = lambda nodelist, type_ignores: ast.Module(nodelist)
 
-try:
-    import matplotlib.artist
+if typing.TYPE_CHECKING:
     import matplotlib.figure
-    from matplotlib.cbook import silent_list
-
-    # pylint: disable=C0103
-    MPLFigure = matplotlib.figure.Figure
-    # pylint: disable=C0103
-    MPLArtist = matplotlib.artist.Artist
-    MPL_AVAILABLE = True
-except ImportError:
-    # pylint: disable=R0903
-    class MPLFigure:  # type: ignore
-        """A fake MPLFigure to prevent ReferenceErrors later."""
-
-    # pylint: disable=R0903
-    class MLPArtist:  # type: ignore
-        """A fake MLPArtist to prevent ReferenceErrors later."""
-
-    # pylint: disable=R0903,C0103
-    class silent_list:  # type: ignore
-        """A fake silent_list to prevent ReferenceErrors later."""
-
-    MPL_AVAILABLE = False
-
-try:
     import numpy
-    from pandas import DataFrame
-
-    PANDAS_AVAILABLE = True
-except ImportError:
-    # pylint: disable=R0903
-    class DataFrame:  # type: ignore
-        """A fake DataFrame to prevent ReferenceErrors later."""
-
-    PANDAS_AVAILABLE = False
+    import pandas
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.addHandler(logging.NullHandler())
 
+
+def dataframes() -> types.ModuleType:
+    """
+    Get the `dataframes` module, which is only imported when first needed because it imports pandas.
+    """
+    return importlib.import_module(".dataframes", __package__)
+
+
 CHUNK_PREVIEW_LENGTH = 20
 
+# The maximum number of distinct `CodeChunk`s whose compiled code is kept by an `Interpreter`
+CODE_CACHE_SIZE = 512
+
 ExecutableCode = typing.Union[CodeChunkExecution, CodeExpression]
-StatementRuntime = typing.Tuple[bool, typing.Union[str], typing.Callable]
+StatementRuntime = typing.Tuple[bool, types.CodeType, typing.Callable]
 
 # Used to indicate that a particular output should not be added to outputs (c.f. a valid `None` value)
 SKIP_OUTPUT_SEMAPHORE = object()
 
+# The number of seconds to wait for code to stop after it has been interrupted because of a timeout
+INTERRUPT_GRACE_PERIOD = 1.0
+
+# The maximum number of `DataFrame`s kept by an `Interpreter` so that pages of their rows can be fetched
+DATATABLE_HANDLE_COUNT = 32
 
-class CodeTimer:
+# The number of elements above which NumPy arrays are output as a summary, rather than in full
+ARRAY_SUMMARY_THRESHOLD = 100_000
+
+# The encodings that can be requested for each type of output
+OUTPUT_ENCODINGS: typing.Dict[str, typing.List[str]] = {
+    "datatable": DATATABLE_ENCODINGS,
+    "ndarray": NDARRAY_ENCODINGS,
+}
+
+# The name under which the end of statement hook is made available to code compiled by `compile_chunk_ast`
+STATEMENT_HOOK_NAME = "__pyla_end_statement__"
+
+
+class ExecutionMode(enum.Enum):
     """
-    Context handler for timing code, use inside a `with` statement.
+    How the statements of a `CodeChunk` are executed.
     """
 
-    _start_time: datetime.datetime
-    duration: typing.Optional[datetime.timedelta] = None
+    """
+    Each top level statement is executed separately, with its own `exec` or `eval` call.
+    """
+    STATEMENTS = "statements"
 
-    def __enter__(self):
-        self.duration = None
-        self._start_time = datetime.datetime.now()
-        return self
+    """
+    The whole chunk is compiled to a single code object and executed with one `exec` call.
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.duration = datetime.datetime.now() - self._start_time
+    The value of each bare expression is captured by a call to a hook, similar to how a REPL uses
+    `sys.displayhook`, so the chunk's `outputs` are the same as for `STATEMENTS`.
+    """
+    CHUNK = "chunk"
 
-    @property
-    def duration_seconds(self) -> float:
-        """Calculate the duration (time between `__enter__` and `__exit__` in microseconds."""
-        if not self.duration:
-            raise RuntimeError("CodeTimer has not yet been run")
 
-        return self.duration.total_seconds()
+def interrupt_thread(
+    thread: threading.Thread, exception_type: typing.Optional[type]
+) -> bool:
+    """
+    Raise an exception of `exception_type` in a thread, the next time that it executes Python code.
+
+    If `exception_type` is `None`, an exception that has not been raised yet is cancelled instead. Returns `False` if
+    the thread could not be interrupted (e.g. it has already finished, or the Python implementation does not support
+    it).
+    """
+    set_async_exc = getattr(ctypes, "pythonapi", None)
+    if set_async_exc is None or thread.ident is None:
+        return False
+
+    return (
+        set_async_exc.PyThreadState_SetAsyncExc(
+            ctypes.c_ulong(thread.ident),
+            None if exception_type is None else ctypes.py_object(exception_type),
+        )
+        == 1
+    )
+
+
+Call = typing.Tuple[typing.Callable[[], typing.Any], "Future[typing.Any]"]
+
+
+class ExecutionThread:
+    """
+    A long-lived thread on which an `Interpreter` executes code, one call at a time.
+
+    Running all of an interpreter's code on the same thread means that objects that can only be used on the thread
+    that created them (e.g. SQLite connections) can be used by later code. The call that is running can be
+    interrupted (see `interrupt_thread`). An interruption that has not been raised when the call finishes is
+    cancelled, so that it can not interrupt the next call. The thread stops once the `ExecutionThread` is garbage
+    collected.
+    """
+
+    thread: threading.Thread
+
+    """
+    The calls waiting to be run, or `None` to stop the thread.
+    """
+    calls: "queue.SimpleQueue[typing.Optional[Call]]"
+
+    """
+    Held while changing, or interrupting, the call that is running, which is the `future` of `running` (if any).
+    """
+    lock: threading.Lock
+    running: typing.Dict[str, "Future[typing.Any]"]
+
+    def __init__(self) -> None:
+        self.calls = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.running = {}
+        # The thread does not refer to this object, so that it can be garbage collected, and the thread stopped
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(self.calls, self.lock, self.running),
+            name="pyla-execute",
+            daemon=True,
+        )
+        self.thread.start()
+        weakref.finalize(self, self.calls.put, None)
+
+    def submit(self, function: typing.Callable[[], typing.Any]) -> "Future[typing.Any]":
+        """
+        Queue a call to `function` on the thread and get the future of its result.
+        """
+        future: "Future[typing.Any]" = Future()
+        self.calls.put((function, future))
+        return future
+
+    def interrupt(self, future: "Future[typing.Any]", exception_type: type) -> bool:
+        """
+        Raise an exception of `exception_type` in the call of a future, if it is running.
+
+        Returns `False` if the call is not running, or could not be interrupted.
+        """
+        with self.lock:
+            if self.running.get("future") is not future:
+                return False
+            return interrupt_thread(self.thread, exception_type)
+
+    @staticmethod
+    def run(
+        calls: "queue.SimpleQueue[typing.Optional[Call]]",
+        lock: threading.Lock,
+        running: typing.Dict[str, "Future[typing.Any]"],
+    ) -> None:
+        """
+        Run the calls that are queued, setting the result (or exception) of each call's future.
+        """
+        thread = threading.current_thread()
+        while True:
+            call = calls.get()
+            if call is None:
+                return
+
+            function, future = call
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            with lock:
+                running["future"] = future
+            try:
+                try:
+                    result = function()
+                finally:
+                    with lock:
+                        running.clear()
+                        interrupt_thread(thread, None)
+            # pylint: disable=W0703  # raised in the thread waiting for the result
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+class CompiledChunk(typing.NamedTuple):
+    """
+    The ready-to-run code for a `CodeChunk`, as stored in the `Interpreter`'s code cache.
+
+    `statements` holds the `StatementRuntime` of each top level statement, in the same order as in the chunk, and
+    `chunk_code` the code for the whole chunk. Each is only compiled when first needed by the `ExecutionMode`.
+    """
+
+    parse_result: CodeChunkParseResult
+    statements: typing.Optional[typing.Tuple[StatementRuntime, ...]] = None
+    chunk_code: typing.Optional[types.CodeType] = None
+
+
+class CachedOutputs(typing.NamedTuple):
+    """
+    The results of executing a `CodeChunk`, as stored in the `Interpreter`'s output cache.
+
+    `variables` holds copies of the values of the variables that the chunk assigns, declares, alters or imports.
+    If the outputs were sent to an `OutputListener` while the chunk was executing, `notifications` holds the
+    names of the listener's methods that were called, and the values they were called with, so that they can be
+    sent again when the outputs are restored.
+    """
+
+    outputs: typing.List[typing.Any]
+    duration: float
+    variables: typing.Dict[str, typing.Any]
+    notifications: typing.Tuple[typing.Tuple[str, typing.Any], ...] = ()
+
+
+class OutputListener:
+    """
+    Notified of the outputs of a `CodeChunk` while it is being executed (see `Interpreter.output_listener`).
+
+    Methods may be called from the thread executing the code, so implementations should be thread safe and should
+    return quickly (e.g. by batching notifications).
+    """
+
+    def stdout(self, text: str) -> None:
+        """
+        Called with each string that the code writes to stdout.
+        """
+
+    def output(self, value: typing.Any) -> None:
+        """
+        Called with each output of the code (e.g. the value of a bare expression), after it has been decoded.
+        """
+
+
+class RecordingListener(OutputListener):
+    """
+    Passes the outputs of a `CodeChunk` on to another `OutputListener`, recording them so that they can be sent to
+    it again if the chunk's outputs are restored from the output cache.
+    """
+
+    listener: OutputListener
+    notifications: typing.List[typing.Tuple[str, typing.Any]]
+
+    def __init__(self, listener: OutputListener) -> None:
+        self.listener = listener
+        self.notifications = []
+
+    def stdout(self, text: str) -> None:
+        """
+        Record text written to stdout and pass it on.
+        """
+        self.notifications.append(("stdout", text))
+        self.listener.stdout(text)
+
+    def output(self, value: typing.Any) -> None:
+        """
+        Record an output and pass it on.
+        """
+        self.notifications.append(("output", value))
+        self.listener.output(value)
 
 
-class StdoutBuffer(TextIOWrapper):
+class StdoutRouter:
     """
-    Used for capturing output to stdout.
+    Passes writes to stdout on to the `StdoutCapture` of the thread writing them, if it has one.
+
+    Is `sys.stdout` while any thread is capturing its output (see `capture`). Unlike `contextlib.redirect_stdout`,
+    which is undone by whichever thread exits it, the router stays installed until no thread is capturing output,
+    however long the code of a thread runs for. Threads without a capture of their own (e.g. those started by the
+    code being executed) write to the most recently started capture, so that their output is part of that of the
+    code, and never to what `sys.stdout` was when the router was installed (e.g. the stream used by a `StdioServer`).
+    """
+
     """
+    The capture of each thread that is capturing its output, keyed by thread identifier.
+    """
+    captures: typing.Dict[int, "StdoutCapture"]
+    original: typing.Optional[typing.TextIO]
+    lock: threading.Lock
+
+    def __init__(self) -> None:
+        self.captures = {}
+        self.original = None
+        self.lock = threading.Lock()
+
+    def target(self) -> typing.Any:
+        """
+        Get the stream that the calling thread writes to.
+        """
+        capture = self.captures.get(threading.get_ident())
+        if capture is not None:
+            return capture
+        captures = list(self.captures.values())
+        if captures:
+            return captures[-1]
+        return self.original or sys.__stdout__
+
+    def write(self, string: str) -> int:
+        """
+        Write a string to the calling thread's stream.
+        """
+        return self.target().write(string)
+
+    def flush(self) -> None:
+        """
+        Flush the calling thread's stream.
+        """
+        self.target().flush()
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.target(), name)
+
+    @contextmanager
+    def capture(self, capture: "StdoutCapture") -> typing.Iterator[None]:
+        """
+        Capture the output of the calling thread, installing the router as `sys.stdout` if necessary.
+        """
+        ident = threading.get_ident()
+        with self.lock:
+            if not self.captures:
+                self.original = sys.stdout
+                sys.stdout = self  # type: ignore
+            previous = self.captures.get(ident)
+            self.captures[ident] = capture
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                if previous is None:
+                    del self.captures[ident]
+                else:
+                    self.captures[ident] = previous
+                if not self.captures:
+                    if sys.stdout is self:
+                        sys.stdout = self.original  # type: ignore
+                    self.original = None
+
+
+"""
+The router used to capture the output of code, whichever thread it is executed in.
+"""
+STDOUT_ROUTER = StdoutRouter()
+
+
+class StdoutCapture(TextIOBase):
+    """
+    Used for capturing output to stdout, for all the statements in a `CodeChunk`.
+
+    Written strings are appended to a list and only joined when the output is popped at the end of a statement.
+    Bytes (e.g. written to `sys.stdout.buffer`) are decoded as UTF-8 when they are written, by an incremental decoder
+    so that a character can be split across writes. If there is a `listener`, strings are passed on to it as they are
+    written, instead of being captured.
+    """
+
+    _parts: typing.List[str]
+    _decoder: codecs.IncrementalDecoder
+    listener: typing.Optional[OutputListener]
+
+    def __init__(self, listener: typing.Optional[OutputListener] = None) -> None:
+        super().__init__()
+        self._parts = []
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.listener = listener
+
+    @property
+    def encoding(self) -> str:  # type: ignore
+        """Get the encoding of bytes written to the capture."""
+        return "utf-8"
+
+    @property
+    def buffer(self) -> "StdoutCapture":
+        """Get the binary buffer, which is the capture itself since it also accepts bytes."""
+        return self
+
+    def writable(self) -> bool:
+        """Indicate that the capture can be written to."""
+        return True
 
-    def write(self, string: typing.Union[bytes, str]) -> int:
+    def write(self, string: typing.Union[bytes, str]) -> int:  # type: ignore
+        """Append a string (or bytes) to the captured output."""
         if isinstance(string, str):
-            return super().write(string)
-        return super().buffer.write(string)
+            text, length = string, len(string)
+        else:
+            data = bytes(string)
+            text, length = self._decoder.decode(data), len(data)
+
+        if not text:
+            return length
+        if self.listener:
+            self.listener.stdout(text)
+        else:
+            self._parts.append(text)
+        return length
+
+    def pop(self) -> str:
+        """
+        Get the output captured since the last call to `pop` and clear it.
+
+        Bytes of an incomplete character, left over from the last write of bytes, are decoded (as a replacement
+        character) first.
+        """
+        self.write(self._decoder.decode(b"", final=True))
+        if not self._parts:
+            return ""
+        output = "".join(self._parts)
+        self._parts.clear()
+        return output
 
 
 class DocumentCompilationResult(typing.NamedTuple):
@@ -161,7 +506,7 @@ class DocumentCompiler:
         These are set on a `DocumentCompilationResult` which can be passed to the `Interpreter`.
         """
         self.function_depth = 0
-        dcr = DocumentCompilationResult()
+        dcr = DocumentCompilationResult([], [])
 
         self.handle_item(source, dcr)
         return dcr
@@ -238,6 +583,7 @@ class DocumentCompiler:
             self.handle_item(child, compilation_result)
 
 
+# pylint: disable=R0902,R0904
 class Interpreter:
     """Execute a list of code blocks, maintaining its own `globals` scope for this execution run."""
 
@@ -266,6 +612,20 @@ class Interpreter:
         },
     }
 
+    """
+    JSON Schema specification of the params of the `fetch` method
+    """
+    FETCH_CAPABILITIES = {
+        "type": "object",
+        "required": ["handle"],
+        "properties": {
+            "handle": {"type": "string"},
+            "offset": {"type": "integer", "minimum": 0},
+            "limit": {"type": "integer", "minimum": 0},
+            "columns": {"type": "array", "items": {"type": "string"}},
+        },
+    }
+
     """
     The manifest of this interpreter's capabilities and addresses.
 
@@ -275,7 +635,12 @@ class Interpreter:
     """
     MANIFEST = {
         "version": 1,
-        "capabilities": {"compile": CODE_CAPABILITIES, "execute": CODE_CAPABILITIES},
+        "capabilities": {
+            "compile": CODE_CAPABILITIES,
+            "execute": CODE_CAPABILITIES,
+            "fetch": FETCH_CAPABILITIES,
+        },
+        "encodings": OUTPUT_ENCODINGS,
         "addresses": {
             "stdio": {
                 "type": "stdio",
@@ -288,9 +653,129 @@ class Interpreter:
     globals: typing.Dict[str, typing.Any]
     locals: typing.Dict[str, typing.Any]
 
-    def __init__(self) -> None:
+    """
+    Compiled code for recently executed `CodeChunk`s, keyed by a hash of their text.
+    """
+    code_cache: LRUCache
+
+    execution_mode: ExecutionMode
+
+    """
+    The results of recently executed `CodeChunk`s, keyed by their text and the values of the variables they use.
+    Only used if the interpreter is created with a non-zero `output_cache_size`.
+    """
+    output_cache: LRUCache
+
+    """
+    The maximum number of seconds that the code in a `CodeChunk` or `CodeExpression` is allowed to run for.
+    If `None`, code is executed in the calling thread without a time limit (unless the `execution_thread` has been
+    started).
+    """
+    timeout: typing.Optional[float]
+
+    """
+    The thread that code is executed on once it has first been given a time limit, so that all code after that
+    runs on the same thread.
+    """
+    execution_thread: typing.Optional[ExecutionThread]
+
+    """
+    Whether to measure the time and memory used by each `CodeChunk`, and each of its statements, and record them
+    in the `resources` property of the chunk's `meta` (see `ChunkProfiler`). Off by default because tracing memory
+    allocations slows down execution.
+    """
+    profile: bool
+
+    """
+    If set, is notified of outputs of `CodeChunk`s as they are produced. Output to stdout is then only passed to the
+    listener and is not included in the chunk's `outputs`.
+    """
+    output_listener: typing.Optional[OutputListener]
+
+    """
+    How the values of the columns of `Datatable` outputs are encoded; one of `encoding.DATATABLE_ENCODINGS`.
+    """
+    datatable_encoding: str
+
+    """
+    How NumPy `ndarray` outputs are encoded; one of `encoding.NDARRAY_ENCODINGS`.
+    """
+    ndarray_encoding: str
+
+    """
+    The number of elements above which NumPy `ndarray` outputs are summarized (see `encoding.summarize_array`).
+    """
+    array_summary_threshold: int
+
+    """
+    The limits on the number of values, nesting depth and size of outputs (see `limits.decode_bounded`).
+    """
+    output_limits: OutputLimits
+
+    """
+    What is left of the `output_limits` for the output being decoded, if any, so that encoders can fit what they
+    return in it.
+    """
+    output_budget: typing.Optional[OutputBudget]
+
+    """
+    The encoders for outputs of special data types, keyed by type (see `default_encoders`).
+    """
+    encoders: EncoderRegistry
+
+    """
+    The maximum number of rows of a `DataFrame` output that are included in a `Datatable`. Larger `DataFrame`s are
+    kept in `datatables`, and the `Datatable` has the first rows and a handle with which to `fetch` the others.
+    If zero, all rows are always included.
+    """
+    datatable_page_size: int
+
+    """
+    Recently output `DataFrame`s that had more rows than `datatable_page_size`, keyed by their handle.
+    """
+    datatables: LRUCache
+
+    """
+    The number of `DataFrame`s that have been kept in `datatables`. Outputs with handles to them are not cached, since
+    the `DataFrame`s may have been dropped by the time the outputs are restored.
+    """
+    datatables_paged: int
+
+    """
+    Renders matplotlib figures output by code, with the configured format, resolution and size limits.
+    """
+    figure_renderer: FigureRenderer
+
+    # pylint: disable=R0913
+    def __init__(
+        self,
+        code_cache_size: int = CODE_CACHE_SIZE,
+        execution_mode: ExecutionMode = ExecutionMode.STATEMENTS,
+        output_cache_size: int = 0,
+        timeout: typing.Optional[float] = None,
+        profile: bool = False,
+        datatable_page_size: int = 0,
+        figure_renderer: typing.Optional[FigureRenderer] = None,
+    ) -> None:
         self.globals = {}
         self.locals = {}
+        self.code_cache = LRUCache(code_cache_size)
+        self.execution_mode = execution_mode
+        self.output_cache = LRUCache(output_cache_size)
+        self.timeout = timeout
+        self.execution_thread = None
+        self.profile = profile
+        self.output_listener = None
+        self.datatable_encoding = "json"
+        self.ndarray_encoding = "json"
+        self.array_summary_threshold = ARRAY_SUMMARY_THRESHOLD
+        self.output_limits = OutputLimits()
+        self.output_budget = None
+        self.encoders = self.default_encoders()
+        self.datatable_page_size = datatable_page_size
+        self.datatables = LRUCache(DATATABLE_HANDLE_COUNT)
+        self.datatables_paged = 0
+        self.figure_renderer = figure_renderer or FigureRenderer()
 
     @staticmethod
     def compile_code_chunk(
@@ -325,24 +810,86 @@ class Interpreter:
         raise CapabilityError("compile", node=node)
 
     def execute(
-        self, node: Node, parameter_values: typing.Dict[str, typing.Any] = None
+        self,
+        node: Node,
+        parameter_values: typing.Dict[str, typing.Any] = None,
+        timeout: typing.Optional[float] = None,
     ) -> Node:
         """
         Execute a `CodeChunk` or `CodeExpression`.
+
+        If a `timeout` is given (or the interpreter has one), the code is executed on the `execution_thread` and
+        interrupted if it runs for longer than that number of seconds.
         """
         _locals = self.locals
         if parameter_values is not None:
             _locals.update(parameter_values)
 
+        if timeout is None:
+            timeout = self.timeout
+        if timeout is not None or self.execution_thread is not None:
+            return self.execute_with_timeout(node, _locals, timeout)
+
+        return self.execute_node(node, _locals)
+
+    def execute_node(self, node: Node, _locals: typing.Dict[str, typing.Any]) -> Node:
+        """
+        Execute a `CodeChunk`, `CodeExpression` or `CodeChunkExecution` in the calling thread.
+        """
         if isinstance(node, CodeExpression):
             return self.execute_code_expression(node, _locals)
         if isinstance(node, CodeChunk):
-            cce = simple_code_chunk_parse(node)
-            return self.execute_code_chunk(cce, _locals)
+            return self.execute_compiled_chunk(
+                node, self.compile_chunk_code(node), _locals
+            )
         if isinstance(node, CodeChunkExecution):
             return self.execute_code_chunk(node, _locals)
         raise CapabilityError("execute", node=node)
 
+    def execute_with_timeout(
+        self,
+        node: Node,
+        _locals: typing.Dict[str, typing.Any],
+        timeout: typing.Optional[float],
+    ) -> Node:
+        """
+        Execute a node on the `execution_thread`, interrupting it if it does not finish within `timeout` seconds.
+
+        The code is interrupted by raising an `ExecutionTimeoutError` in the thread, which is recorded as a
+        `CodeError` on the node. Code that does not return to the interpreter (e.g. because it is blocked in a call to
+        a C extension) can not be interrupted, and is waited for, since leaving it running would let it change the
+        namespace, or hold up the thread, while later code runs. To stop such code, execute it in a process that can
+        be terminated (e.g. using `ParallelScheduler`, or the `--timeout` option of `serve`).
+        """
+        code = node.code_chunk if isinstance(node, CodeChunkExecution) else node
+        if not isinstance(code, (CodeChunk, CodeExpression)):
+            raise CapabilityError("execute", node=node)
+
+        if self.execution_thread is None:
+            self.execution_thread = ExecutionThread()
+        future = self.execution_thread.submit(lambda: self.execute_node(node, _locals))
+
+        if not wait([future], timeout).done:
+            self.execution_thread.interrupt(future, ExecutionTimeoutError)
+            if not wait([future], INTERRUPT_GRACE_PERIOD).done:
+                LOGGER.warning(
+                    "Unable to interrupt code, waiting for it to finish: %s",
+                    code.text[:CHUNK_PREVIEW_LENGTH],
+                )
+
+        try:
+            return future.result()
+        except ExecutionTimeoutError:
+            set_code_error(
+                code,
+                exception_to_code_error(
+                    ExecutionTimeoutError(
+                        "Execution timed out after {} seconds".format(timeout)
+                    )
+                ),
+            )
+            return code
+
     @staticmethod
     def is_python_code(code: typing.Union[CodeChunk, CodeExpression]) -> bool:
         """
@@ -367,6 +914,46 @@ class Interpreter:
 
         return expression
 
+    def compile_chunk_code(
+        self,
+        chunk: CodeChunk,
+        parse_result: typing.Optional[CodeChunkParseResult] = None,
+    ) -> typing.Optional[CompiledChunk]:
+        """
+        Get the compiled code for a `CodeChunk`, from the code cache if possible.
+
+        On a cache miss, the chunk is parsed (unless a `parse_result` is supplied) and compiled as required by the
+        `execution_mode`. Returns `None` if the chunk could not be parsed into an AST.
+        """
+        key = content_hash(chunk.text)
+        compiled = self.code_cache.get(key)
+        if compiled is None:
+            if parse_result is None:
+                parse_result = simple_code_chunk_parse(chunk).parse_result
+
+            if parse_result.chunk_ast is None:
+                return None
+
+            compiled = CompiledChunk(parse_result)
+
+        chunk_ast = typing.cast(ast.Module, compiled.parse_result.chunk_ast)
+        if self.execution_mode is ExecutionMode.CHUNK:
+            if compiled.chunk_code is not None:
+                return compiled
+            compiled = compiled._replace(chunk_code=self.compile_chunk_ast(chunk_ast))
+        else:
+            if compiled.statements is not None:
+                return compiled
+            compiled = compiled._replace(
+                statements=tuple(
+                    self.parse_statement_runtime(statement)
+                    for statement in chunk_ast.body
+                )
+            )
+
+        self.code_cache.put(key, compiled)
+        return compiled
+
     def execute_code_chunk(
         self, chunk_execution: CodeChunkExecution, _locals: typing.Dict[str, typing.Any]
     ) -> CodeChunk:
@@ -374,91 +961,392 @@ class Interpreter:
         Execute a `CodeChunk` that has been parsed and stored in a `CodeChunkExecution`.
         """
         chunk, parse_result = chunk_execution
+        return self.execute_compiled_chunk(
+            chunk, self.compile_chunk_code(chunk, parse_result), _locals
+        )
 
-        if parse_result.chunk_ast is None:
+    def execute_compiled_chunk(
+        self,
+        chunk: CodeChunk,
+        compiled: typing.Optional[CompiledChunk],
+        _locals: typing.Dict[str, typing.Any],
+    ) -> CodeChunk:
+        """
+        Execute a `CodeChunk` using its `CompiledChunk` code (see `compile_chunk_code`).
+        """
+        if compiled is None:
             LOGGER.info(
                 "Not executing CodeChunk without AST: %s",
                 chunk.text[:CHUNK_PREVIEW_LENGTH],
             )
             return chunk
 
+        output_key = (
+            self.output_cache_key(chunk, compiled.parse_result, _locals)
+            if self.output_cache.maxsize > 0
+            else None
+        )
+        if output_key is not None and self.restore_outputs(output_key, chunk, _locals):
+            return chunk
+
+        error_count = len(chunk.errors or [])
+        paged_count = self.datatables_paged
         cc_outputs: typing.List[typing.Any] = []
 
-        duration = 0.0
+        timer = CodeTimer()
+
+        profiler = ChunkProfiler() if self.profile else None
+        if profiler:
+            profiler.start()
+
+        # Notifications sent to the listener are recorded so that they can be sent again on a cache hit
+        with self.record_notifications(output_key is not None) as recorder:
+            # Figures created by the chunk are closed once they have been rendered (or if execution is interrupted)
+            with FigureTracker() as figures:
+                stdout = StdoutCapture(self.output_listener)
+                try:
+                    with STDOUT_ROUTER.capture(stdout):
+                        if (
+                            self.execution_mode is ExecutionMode.CHUNK
+                            and compiled.chunk_code
+                        ):
+                            self.execute_chunk_code(
+                                compiled.chunk_code,
+                                chunk,
+                                _locals,
+                                cc_outputs,
+                                timer,
+                                stdout,
+                                profiler,
+                            )
+                        else:
+                            for statement_runtime in compiled.statements or ():
+                                error_occurred = self.execute_statement(
+                                    statement_runtime,
+                                    chunk,
+                                    _locals,
+                                    cc_outputs,
+                                    timer,
+                                    stdout,
+                                    profiler,
+                                )
+
+                                # Stop executing the rest of the statements in the chunk after capturing the outputs
+                                if error_occurred:
+                                    break
+                finally:
+                    # Always stop the profiler, even if execution was interrupted, so that memory tracing is turned off
+                    if profiler:
+                        chunk.meta = dict(chunk.meta or {}, resources=profiler.stop())
+
+                chunk.duration = ns_to_seconds(timer.elapsed_ns)
+
+                if "matplotlib" in sys.modules:
+                    self.collapse_mpl_outputs(cc_outputs, figures.new_figures())
 
-        for statement in parse_result.chunk_ast.body:
-            duration, error_occurred = self.execute_statement(
-                statement, chunk, _locals, cc_outputs, duration
+        chunk.outputs = cc_outputs
+
+        # Outputs are not cached if the chunk failed, or if they have handles to paged `DataFrame`s
+        if (
+            output_key is not None
+            and len(chunk.errors or []) == error_count
+            and self.datatables_paged == paged_count
+        ):
+            self.store_outputs(
+                output_key,
+                chunk,
+                compiled.parse_result,
+                _locals,
+                recorder.notifications if recorder else [],
             )
 
-            if error_occurred:
-                break  # stop executing the rest of the statements in the chunk after capturing the outputs
+        return chunk
 
-        chunk.duration = duration
+    @contextmanager
+    def record_notifications(
+        self, record: bool
+    ) -> typing.Iterator[typing.Optional[RecordingListener]]:
+        """
+        If `record` is true, and there is an `output_listener`, record the notifications sent to it while a chunk is
+        executed (see `RecordingListener`).
+        """
+        listener = self.output_listener
+        if not record or listener is None:
+            yield None
+            return
 
-        if MPL_AVAILABLE:
-            # Because of the way matplotlib might progressively build an image, only keep the last MPL that was
-            # generated for a specific code chunk
-            mpl_output_indexes = [
-                i for i, output in enumerate(cc_outputs) if self.value_is_mpl(output)
-            ]
+        recorder = RecordingListener(listener)
+        self.output_listener = recorder
+        try:
+            yield recorder
+        finally:
+            self.output_listener = listener
 
-            if mpl_output_indexes:
-                for i in reversed(mpl_output_indexes[:-1]):
-                    # remove all but the last mpl
-                    cc_outputs.pop(i)
+    def collapse_mpl_outputs(
+        self,
+        cc_outputs: typing.List[typing.Any],
+        new_figures: typing.List["matplotlib.figure.Figure"],
+    ) -> None:
+        """
+        Replace the matplotlib outputs of a `CodeChunk` with an image of each figure that it drew on.
 
-                new_last_index = mpl_output_indexes[-1] - (
-                    len(mpl_output_indexes) - 1
-                )  # output will have shifted back
+        Because of the way matplotlib might progressively build an image, each figure is rendered once, after the
+        whole chunk has been executed, however many of its artists were output. The figures of the outputs come
+        first, followed by the other figures that the chunk created (and did not close), in the order they were
+        created. The images are put where the last matplotlib output was, or at the end if there were none.
+        """
+        mpl_output_indexes = [
+            i for i, output in enumerate(cc_outputs) if self.value_is_mpl(output)
+        ]
+
+        figures = []
+        for i in mpl_output_indexes:
+            figure = artist_figure(cc_outputs[i])
+            if figure is not None and figure not in figures:
+                figures.append(figure)
+        figures.extend(figure for figure in new_figures if figure not in figures)
+
+        index = len(cc_outputs)
+        if mpl_output_indexes:
+            for i in reversed(mpl_output_indexes):
+                cc_outputs.pop(i)
+            index = mpl_output_indexes[-1] - (len(mpl_output_indexes) - 1)
+
+        cc_outputs[index:index] = [
+            self.figure_renderer.render(figure) for figure in figures
+        ]
+
+    def output_cache_key(
+        self,
+        chunk: CodeChunk,
+        parse_result: CodeChunkParseResult,
+        _locals: typing.Dict[str, typing.Any],
+    ) -> typing.Optional[typing.Hashable]:
+        """
+        Get the key for the results of a `CodeChunk` in the output cache.
+
+        Combines the hash of the chunk's text with fingerprints of the current values of the variables (including
+        parameters) that it reads (see `CodeChunkParseResult.read_names`), and the size and modification time of the
+        files that it reads. The variables include the functions and modules that it calls, so that redefining a
+        function invalidates the outputs of the chunks that call it. The settings that change how outputs are decoded
+        (see `output_settings`) are also part of the key. Returns `None` if any of the values can not be
+        fingerprinted, in which case the results are not cached.
+        """
+        inputs: typing.List[typing.Tuple[str, typing.Any, typing.Any]] = []
 
-                cc_outputs[new_last_index] = self.decode_mpl()
+        for name in sorted(set(parse_result.read_names())):
+            if name in _locals:
+                value_fingerprint = fingerprint(_locals[name])
+            elif name in self.globals:
+                value_fingerprint = fingerprint(self.globals[name])
+            else:
+                value_fingerprint = ""
 
-        chunk.outputs = cc_outputs
+            if value_fingerprint is None:
+                return None
+            inputs.append((name, value_fingerprint, None))
 
-        return chunk
+        for path in parse_result.reads or []:
+            try:
+                stat = os.stat(path)
+                inputs.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                inputs.append((path, None, None))
+
+        # Outputs do not include stdout if it is streamed to a listener (it is in the notifications instead), so are
+        # cached separately
+        return (
+            content_hash(chunk.text),
+            tuple(inputs),
+            self.output_listener is None,
+            self.output_settings(),
+        )
+
+    def output_settings(self) -> typing.Tuple[typing.Any, ...]:
+        """
+        Get the settings of the interpreter that change how the outputs of code are decoded.
+
+        These are the encodings of data tables and arrays, the limits on the size of outputs, the page size of data
+        tables, how figures are rendered, and the encoders (which users can register more of).
+        """
+        renderer = self.figure_renderer
+        return (
+            self.datatable_encoding,
+            self.ndarray_encoding,
+            self.array_summary_threshold,
+            self.output_limits,
+            self.datatable_page_size,
+            (
+                id(renderer),
+                renderer.format,
+                renderer.dpi,
+                renderer.max_width,
+                renderer.max_height,
+                renderer.blob_store and renderer.blob_store.directory,
+            ),
+            (id(self.encoders), self.encoders.total_generation()),
+        )
+
+    def restore_outputs(
+        self,
+        key: typing.Hashable,
+        chunk: CodeChunk,
+        _locals: typing.Dict[str, typing.Any],
+    ) -> bool:
+        """
+        Restore the outputs, duration and variables of a `CodeChunk` from the output cache.
+
+        If there is an `output_listener`, the notifications that were sent to it when the outputs were cached are
+        sent to it again. Returns `False` if there are no results for the `key` in the cache.
+        """
+        cached = self.output_cache.get(key)
+        if cached is None:
+            return False
+
+        chunk.outputs = snapshot(cached.outputs)
+        chunk.duration = cached.duration
+        for name, value in cached.variables.items():
+            _locals[name] = snapshot(value)
+        if self.output_listener is not None:
+            for method, value in cached.notifications:
+                getattr(self.output_listener, method)(snapshot(value))
+        return True
+
+    def store_outputs(
+        self,
+        key: typing.Hashable,
+        chunk: CodeChunk,
+        parse_result: CodeChunkParseResult,
+        _locals: typing.Dict[str, typing.Any],
+        notifications: typing.Sequence[typing.Tuple[str, typing.Any]] = (),
+    ) -> None:
+        """
+        Store copies of the outputs of a `CodeChunk`, of the variables that it set, and of the `notifications` sent
+        to the `output_listener` while it was executing, in the output cache.
 
+        Nothing is stored if any of the values can not be copied.
+        """
+        try:
+            variables = {
+                name: snapshot(_locals[name])
+                for name in parse_result.written_names()
+                if name in _locals
+            }
+            outputs = snapshot(chunk.outputs)
+            recorded = snapshot(tuple(notifications))
+        # pylint: disable=W0703  # copying arbitrary objects can raise almost any exception
+        except Exception:
+            LOGGER.debug(
+                "Not caching outputs of CodeChunk: %s",
+                chunk.text[:CHUNK_PREVIEW_LENGTH],
+            )
+            return
+
+        self.output_cache.put(
+            key, CachedOutputs(outputs, chunk.duration or 0.0, variables, recorded),
+        )
+
+    # pylint: disable=R0913
     def execute_statement(
         self,
-        statement: ast.stmt,
+        statement_runtime: StatementRuntime,
         chunk: CodeChunk,
         _locals: typing.Dict[str, typing.Any],
         cc_outputs: typing.List[str],
-        duration: float,
-    ) -> typing.Tuple[float, bool]:
+        timer: CodeTimer,
+        stdout: StdoutCapture,
+        profiler: typing.Optional[ChunkProfiler] = None,
+    ) -> bool:
         """
-        Execute a single AST statement.
+        Execute a single compiled statement.
+
+        The statement will be executed with `eval` or `exec` depending on its type (see `parse_statement_runtime`),
+        and its duration added to `timer`. Anything written to `stdout` while it runs is then added to `cc_outputs`.
+        If a `profiler` is given, the resources used by the statement are measured with it.
 
-        The statement will be executed with `eval` or `exec` depending on its type (see `parse_statement_runtime`).
+        Returns whether an error occurred.
         """
         error_occurred = False
 
-        capture_result, code_to_run, run_function = self.parse_statement_runtime(
-            statement
-        )
-        stdout = StdoutBuffer(BytesIO(), sys.stdout.encoding)
+        capture_result, code_to_run, run_function = statement_runtime
         result = None
 
-        with redirect_stdout(stdout):
-            try:
-                with CodeTimer() as code_timer:
-                    result = run_function(code_to_run, self.globals, _locals)
-                duration += code_timer.duration_seconds
-            # pylint: disable=W0703  # we really don't know what Exception some exec'd code might raise.
-            except Exception as exc:
-                error_occurred = True
-                set_code_error(chunk, exc)
+        if profiler:
+            profiler.start_statement()
+        try:
+            with timer:
+                result = run_function(code_to_run, self.globals, _locals)
+        # pylint: disable=W0703  # we really don't know what Exception some exec'd code might raise.
+        except Exception as exc:
+            error_occurred = True
+            set_code_error(chunk, exc)
+        finally:
+            if profiler:
+                profiler.end_statement()
 
         if capture_result and result is not None:
             self.add_output(cc_outputs, result)
 
-        stdout.seek(0)
-        std_out_output = stdout.buffer.read()
+        std_out_output = stdout.pop()
         if std_out_output:
-            cc_outputs.append(std_out_output.decode("utf8"))
+            cc_outputs.append(std_out_output)
+
+        return error_occurred
+
+    # pylint: disable=R0913
+    def execute_chunk_code(
+        self,
+        chunk_code: types.CodeType,
+        chunk: CodeChunk,
+        _locals: typing.Dict[str, typing.Any],
+        cc_outputs: typing.List[typing.Any],
+        timer: CodeTimer,
+        stdout: StdoutCapture,
+        profiler: typing.Optional[ChunkProfiler] = None,
+    ) -> None:
+        """
+        Execute the code for a whole chunk (see `compile_chunk_ast`) with a single call to `exec`.
+
+        The end of statement hook adds the value of each bare expression to `cc_outputs`, followed by anything that
+        was written to `stdout` during the statement. If a `profiler` is given, the hook also ends the measurement of
+        each statement and starts that of the next. The duration of the execution is added to `timer`.
+        """
+
+        def end_statement(result: typing.Any = None) -> None:
+            if profiler:
+                profiler.end_statement()
+
+            if result is not None:
+                self.add_output(cc_outputs, result)
 
-        # could save a variable by returning `duration` as `None` if an error occurs but I think that breaks readability
-        return duration, error_occurred
+            std_out_output = stdout.pop()
+            if std_out_output:
+                cc_outputs.append(std_out_output)
+
+            if profiler:
+                profiler.start_statement()
+
+        _locals[STATEMENT_HOOK_NAME] = end_statement
+        error_occurred = False
+        if profiler:
+            profiler.start_statement()
+        try:
+            with timer:
+                # pylint: disable=W0122  # Disable warning that exec is being used.
+                exec(chunk_code, self.globals, _locals)
+        # pylint: disable=W0703  # we really don't know what Exception some exec'd code might raise.
+        except Exception as exc:
+            error_occurred = True
+            set_code_error(chunk, exc)
+        finally:
+            del _locals[STATEMENT_HOOK_NAME]
+
+        # The measurement started by the hook after the last statement only covers a statement if one raised
+        if profiler:
+            profiler.end_statement(keep=error_occurred)
+
+        # Capture anything written by a statement that raised an exception
+        end_statement()
 
     def add_output(
         self, cc_outputs: typing.List[typing.Any], result: typing.Any
@@ -467,11 +1355,14 @@ class Interpreter:
         Add an output to cc_outputs.
 
         Should be inside `execute_statement` as it's only used there, but pylint complains about too many local
-        variables.
+        variables. The `output_listener` is notified of the output, unless it is a matplotlib artist since those are
+        only rendered once the whole chunk has finished.
         """
         decoded = self.decode_output(result)
         if decoded != SKIP_OUTPUT_SEMAPHORE:
             cc_outputs.append(decoded)
+            if self.output_listener and not self.value_is_mpl(decoded):
+                self.output_listener.output(decoded)
 
     @staticmethod
     def parse_statement_runtime(statement: ast.stmt) -> StatementRuntime:
@@ -486,11 +1377,11 @@ class Interpreter:
 
         if isinstance(statement, ast.Expr):
             # An expression is something that we want to capture the result of - this could be something like
-            # `a + 3` or a function call (not an assignment). It must be executed with `eval`. Since `eval` can't
-            # execute compiled code, `astor` is used to convert it back to source code.
+            # `a + 3` or a function call (not an assignment). It is compiled in `eval` mode so that `eval` returns
+            # its value.
             capture_result = True
             run_function = eval
-            code_to_run = astor.to_source(statement)
+            code_to_run = compile(ast.Expression(statement.value), "<ast>", "eval")
         else:
             # We don't care about the result of this call (it could just be an assignment, update or even function
             # definition) so it can be executed with `exec`.
@@ -500,87 +1391,161 @@ class Interpreter:
             code_to_run = compile(mod, "<ast>", "exec")
         return capture_result, code_to_run, run_function
 
+    @staticmethod
+    def compile_chunk_ast(chunk_ast: ast.Module) -> types.CodeType:
+        """
+        Compile all the statements of a chunk into a single code object.
+
+        Each bare expression statement, e.g. `a + 3`, is rewritten into a call to the end of statement hook with the
+        expression's value, and every other statement is followed by a call to the hook without a value. This gives
+        the same outputs, in the same order, as executing each statement separately. The `chunk_ast` itself is not
+        modified because it may be shared with the chunk's `CodeChunkParseResult`.
+        """
+        body: typing.List[ast.stmt] = []
+        for statement in chunk_ast.body:
+            if isinstance(statement, ast.Expr):
+                args = [statement.value]
+            else:
+                body.append(statement)
+                args = []
+            hook_call = ast.Expr(
+                ast.Call(ast.Name(STATEMENT_HOOK_NAME, ast.Load()), args, [])
+            )
+            body.append(ast.copy_location(hook_call, statement))
+
+        mod = ast.fix_missing_locations(AstModule(body, []))
+        return compile(mod, "<ast>", "exec")
+
     @staticmethod
     def value_is_mpl(value: typing.Any) -> bool:
         """
-        Basic type checking to determine if a variable is a matplotlib figure.
+        Basic type checking to determine if a variable is a matplotlib figure (or another artist).
+
+        A value can only be an artist if matplotlib has been imported, so it is not imported here.
         """
-        if not MPL_AVAILABLE:
+        artist = sys.modules.get("matplotlib.artist")
+        if artist is None:
             return False
 
-        return isinstance(value, (MPLFigure, MPLArtist)) or (
+        return isinstance(value, artist.Artist) or (
             isinstance(value, list)
             and len(value) == 1
-            and isinstance(value[0], MPLArtist)
+            and isinstance(value[0], artist.Artist)
         )
 
     @staticmethod
-    def decode_mpl() -> ImageObject:
+    def decode_dataframe(
+        data_frame: "pandas.DataFrame", encoding: str = "json"
+    ) -> Datatable:
+        """
+        Decode a pandas `DataFrame` into a `Datatable` (see `dataframes.decode_dataframe`).
         """
-        Decode a matplotlib `MPLFigure` or `MPLArtist` into an `ImageObject`.
+        return dataframes().decode_dataframe(data_frame, encoding)
 
-        The `matplotlib.pyplot.savefig` function just saves the current MPL figure that's in the context.
+    def page_dataframe(self, data_frame: "pandas.DataFrame") -> Datatable:
         """
-        image = BytesIO()
-        matplotlib.pyplot.savefig(image, format="png")
-        src = "data:image/png;base64," + base64.encodebytes(image.getvalue()).decode()
-        return ImageObject(src)
+        Keep a `DataFrame` so that its rows can be fetched later, and decode its first page of rows.
 
-    @staticmethod
-    def decode_dataframe(data_frame: DataFrame) -> Datatable:
-        """
-        Decode a pandas `DataFrame` into a `Datatable`.
-        """
-        columns = []
-
-        for column_name in data_frame.columns:
-            column = data_frame[column_name]
-            values = column.tolist()
-            if column.dtype in (numpy.bool_, numpy.bool8):
-                validator = BooleanValidator()
-                values = [bool(row) for row in values]
-            elif column.dtype in (numpy.int8, numpy.int16, numpy.int32, numpy.int64):
-                validator = IntegerValidator()
-                values = [int(row) for row in values]
-            elif column.dtype in (numpy.float16, numpy.float32, numpy.float64):
-                validator = NumberValidator()
-                values = [float(row) for row in values]
-            elif column.dtype in (numpy.str_, numpy.unicode_,):
-                validator = StringValidator()
-            else:
-                validator = None
+        If the `DataFrame` has no more than `datatable_page_size` rows, all of them are decoded and it is not kept.
+        The least recently used `DataFrame` is dropped when there are more than `DATATABLE_HANDLE_COUNT`.
+        """
+        if not 0 < self.datatable_page_size < len(data_frame):
+            return self.decode_dataframe(data_frame, self.datatable_encoding)
+
+        handle = uuid.uuid4().hex
+        self.datatables.put(handle, data_frame)
+        self.datatables_paged += 1
+        return dataframes().decode_dataframe_window(
+            data_frame,
+            handle,
+            limit=self.datatable_page_size,
+            encoding=self.datatable_encoding,
+        )
 
-            columns.append(
-                DatatableColumn(
-                    column_name,
-                    values,
-                    validator=ArrayValidator(itemsValidator=validator),
-                )
-            )
+    def fetch(
+        self,
+        handle: str,
+        offset: int = 0,
+        limit: typing.Optional[int] = None,
+        columns: typing.Optional[typing.List[typing.Any]] = None,
+    ) -> Datatable:
+        """
+        Fetch a window of the rows, and optionally only some of the columns, of a `DataFrame` that was paged.
 
-        return Datatable(columns)
+        If no `limit` is given, a page of `datatable_page_size` rows is fetched. Raises a `KeyError` if there is no
+        `DataFrame` with the `handle` (e.g. because it has been dropped) or if any of the `columns` do not exist.
+        """
+        data_frame = self.datatables.get(handle)
+        if data_frame is None:
+            raise KeyError('Unknown datatable handle "{}"'.format(handle))
+
+        return dataframes().decode_dataframe_window(
+            data_frame,
+            handle,
+            offset,
+            limit if limit is not None else self.datatable_page_size or None,
+            columns,
+            self.datatable_encoding,
+        )
 
-    def decode_output(self, output: typing.Any) -> typing.Any:
+    def decode_ndarray(self, array: "numpy.ndarray") -> typing.Any:
         """
-        Check if the output is convertible from a special data type to a Stencila type.
+        Decode a NumPy `ndarray` using the `ndarray_encoding`, or summarize it if it is too large.
 
-        If not, just return the original object."""
+        An array is too large if it has more elements than the `array_summary_threshold`, or if, once encoded, it
+        would not fit in what is left of the `output_budget` (e.g. because other arrays in the same output have
+        used most of it).
+        """
+        binary = self.ndarray_encoding == "base64" and array.dtype.kind in BINARY_KINDS
+        if binary:
+            # A single string with the base64 encoded bytes of the values
+            items, size = 0, array.nbytes * 4 // 3 + OBJECT_SIZE_ESTIMATE
+        else:
+            items, size = array.size, array.size * (NUMBER_SIZE_ESTIMATE + 1)
+        if array.size > self.array_summary_threshold or (
+            self.output_budget is not None and not self.output_budget.fits(items, size)
+        ):
+            return summarize_array(array)
 
-        if MPL_AVAILABLE:
-            if isinstance(output, silent_list):
-                return SKIP_OUTPUT_SEMAPHORE
+        if binary:
+            return encode_array(array)
 
-        if isinstance(output, list):
-            return [self.decode_output(item) for item in output]
+        return array.tolist()
 
-        if isinstance(output, tuple):
-            return tuple(self.decode_output(item) for item in output)
+    def decode_output(self, output: typing.Any) -> typing.Any:
+        """
+        Decode an output, and the values in its lists and tuples, within the `output_limits`.
 
-        if isinstance(output, DataFrame):
-            return self.decode_dataframe(output)
+        Values of special data types are converted to Stencila types, or JSON compatible values, by the `encoders`.
+        Other values are left unchanged. While the output is decoded, what is left of the limits is the
+        `output_budget`.
+        """
+        budget, self.output_budget = (
+            self.output_budget,
+            OutputBudget(self.output_limits),
+        )
+        try:
+            return decode_bounded(
+                output, self.encoders.encode, self.output_limits, self.output_budget
+            )
+        finally:
+            self.output_budget = budget
 
-        if PANDAS_AVAILABLE:
-            if isinstance(output, numpy.ndarray):
-                return output.tolist()
+    def default_encoders(self) -> EncoderRegistry:
+        """
+        Create the registry of encoders for the special data types that the interpreter knows about.
 
-        return output
+        The registry's parent is the registry of encoders shared by all interpreters (see `encoders`). These encoders
+        are registered as defaults so that encoders registered by users, in either registry, for these types or their
+        subclasses take precedence. The types are registered by name so that matplotlib, NumPy and pandas are not
+        imported until they are used.
+        """
+        registry = EncoderRegistry(ENCODERS)
+        registry.register(
+            "matplotlib.cbook.silent_list",
+            lambda output: SKIP_OUTPUT_SEMAPHORE,
+            default=True,
+        )
+        registry.register("pandas.DataFrame", self.page_dataframe, default=True)
+        registry.register("numpy.ndarray", self.decode_ndarray, default=True)
+        return registry
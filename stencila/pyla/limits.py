@@ -0,0 +1,172 @@
+"""
+Limits on the size of outputs, so that very large, deeply nested or self-referencing lists can not stall the
+interpreter (or the client) while they are decoded and sent.
+"""
+
+import typing
+
+# The maximum number of values, in all lists and tuples, decoded for an output
+MAX_OUTPUT_ITEMS = 100_000
+
+# The maximum depth to which lists and tuples are decoded
+MAX_OUTPUT_DEPTH = 100
+
+# The maximum estimated size, in bytes, of an output once encoded as JSON
+MAX_OUTPUT_BYTES = 8_000_000
+
+# The estimated size, in bytes, of a number once encoded as JSON
+NUMBER_SIZE_ESTIMATE = 20
+
+# The estimated size, in bytes, of a value that is not a string, number, boolean, `null` or dictionary, once encoded
+# as JSON
+OBJECT_SIZE_ESTIMATE = 64
+
+# The sentinel returned when there are no more values in a list or tuple
+_END = object()
+
+
+class OutputLimits(typing.NamedTuple):
+    """
+    Limits on the number of values, the nesting depth and the estimated encoded size of an output.
+    """
+
+    max_items: int = MAX_OUTPUT_ITEMS
+    max_depth: int = MAX_OUTPUT_DEPTH
+    max_bytes: int = MAX_OUTPUT_BYTES
+
+
+class OutputBudget:  # pylint: disable=R0903  # a mutable record of what is left of the limits
+    """
+    What is left of the `OutputLimits` on the number of values and estimated size of an output while it is decoded.
+
+    Encoders can use the budget to make what they return fit in it (e.g. by summarizing a large array rather than
+    converting it to a list).
+    """
+
+    items: int
+    bytes: int
+
+    def __init__(self, limits: OutputLimits = OutputLimits()) -> None:
+        self.items = limits.max_items
+        self.bytes = limits.max_bytes
+
+    def fits(self, items: int, size: int) -> bool:
+        """
+        Check whether a number of values, with an estimated size in bytes, fit in the budget.
+        """
+        return items <= self.items and size <= self.bytes
+
+
+def truncation_marker(reason: str, omitted: int) -> typing.Dict[str, typing.Any]:
+    """
+    Create the marker put in place of the values left out of an output, with the `reason` they were left out.
+
+    The `reason` is `items` or `bytes` (the values were over budget and were not decoded), `depth` (a list or tuple
+    was nested too deeply) or `cycle` (a list or tuple contains itself). `omitted` is the number of values left out.
+    """
+    return {"truncated": reason, "omitted": omitted}
+
+
+def estimate_scalar_size(value: typing.Any) -> int:
+    """
+    Estimate the size, in bytes, of a value once encoded as JSON, without looking at the values it contains.
+    """
+    if value is None or isinstance(value, bool):
+        return 5
+    if isinstance(value, (int, float)):
+        return NUMBER_SIZE_ESTIMATE
+    if isinstance(value, str):
+        return len(value) + 2
+    return OBJECT_SIZE_ESTIMATE
+
+
+def estimate_size(value: typing.Any) -> int:
+    """
+    Estimate the size, in bytes, of a value that is not a list or tuple, once encoded as JSON.
+
+    Dictionaries (e.g. arrays encoded by an encoder) are estimated from their keys and values, so that large strings
+    in them count against the budget. Only their top level is looked at.
+    """
+    if isinstance(value, dict):
+        return 2 + sum(
+            estimate_scalar_size(key) + estimate_scalar_size(item) + 2
+            for key, item in value.items()
+        )
+    return estimate_scalar_size(value)
+
+
+class _Container(typing.NamedTuple):
+    """
+    A list or tuple being decoded by `decode_bounded`.
+    """
+
+    source: typing.Sequence[typing.Any]
+    items: typing.Iterator[typing.Any]
+    decoded: typing.List[typing.Any]
+    depth: int
+
+
+def decode_bounded(
+    output: typing.Any,
+    decode: typing.Callable[[typing.Any], typing.Any],
+    limits: OutputLimits = OutputLimits(),
+    budget: typing.Optional[OutputBudget] = None,
+) -> typing.Any:
+    """
+    Decode an output, and all the values in its lists and tuples, within `limits`.
+
+    Each value is decoded with `decode`. If it returns a list or tuple, either the value itself or a new one (e.g. an
+    encoder converting an array to a list), its values are decoded in turn, so that they count against the limits.
+    Lists and tuples are decoded using a stack, rather than by recursion, so that deep nesting can not overflow the
+    Python stack. What is left of the limits is kept in `budget`, which `decode` can look at.
+
+    Values left out, because they are over the `limits` or form a cycle, are replaced by a `truncation_marker`. Once
+    the number of values or the estimated size is over budget, decoding stops and a marker is added to the end of
+    each list or tuple still being decoded.
+    """
+    root: typing.List[typing.Any] = []
+    stack = [_Container((output,), iter((output,)), root, 0)]
+    ancestors: typing.Set[int] = set()
+    budget = budget or OutputBudget(limits)
+    reason = None
+
+    while stack:
+        container = stack[-1]
+        item = next(container.items, _END) if reason is None else _END
+        if item is _END:
+            stack.pop()
+            omitted = len(container.source) - len(container.decoded)
+            if omitted > 0 and reason is not None:
+                container.decoded.append(truncation_marker(reason, omitted))
+            ancestors.discard(id(container.source))
+            if stack and isinstance(container.source, tuple):
+                stack[-1].decoded[-1] = tuple(container.decoded)
+            continue
+
+        budget.items -= 1
+        if budget.items < 0:
+            reason = "items"
+            continue
+
+        value = decode(item)
+        if isinstance(value, (list, tuple)):
+            if id(value) in ancestors:
+                container.decoded.append(truncation_marker("cycle", len(value)))
+            elif container.depth >= limits.max_depth:
+                container.decoded.append(truncation_marker("depth", len(value)))
+            else:
+                decoded: typing.List[typing.Any] = []
+                container.decoded.append(decoded)
+                ancestors.add(id(value))
+                stack.append(
+                    _Container(value, iter(value), decoded, container.depth + 1)
+                )
+            budget.bytes -= 2
+        else:
+            budget.bytes -= estimate_size(value) + 1
+            if budget.bytes < 0:
+                reason = "bytes"
+                continue
+            container.decoded.append(value)
+
+    return root[0]
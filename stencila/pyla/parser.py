@@ -42,6 +42,7 @@ class CodeChunkParseResult:
     _alters: typing.List[str]
     _uses: typing.List[str]
     _reads: typing.List[str]
+    _read_names: typing.Optional[typing.List[str]]
     error: typing.Optional[CodeError]
 
     # pylint: disable=R0913
@@ -64,6 +65,7 @@ class CodeChunkParseResult:
         self.uses = uses or []
         self.reads = reads or []
         self.error = error
+        self._read_names = None
 
     def combined_code_imports(
         self, existing_imports: typing.Optional[ImportsType]
@@ -169,6 +171,79 @@ class CodeChunkParseResult:
     def reads(self, reads: typing.List[str]) -> None:
         self._reads = reads
 
+    def read_names(self) -> typing.List[str]:
+        """
+        Get the names of the variables that the code reads.
+
+        As well as those that it uses or alters, this includes the other names that it loads without assigning them
+        first, such as called functions and modules (e.g. `f` and `math` in `f(math.pi)`).
+        """
+        if self._read_names is None:
+            names = (self.uses or []) + (self.alters or [])
+            written = self.written_names()
+            if self.chunk_ast is not None:
+                for node in ast.walk(self.chunk_ast):
+                    if (
+                        isinstance(node, ast.Name)
+                        and isinstance(node.ctx, ast.Load)
+                        and node.id not in names
+                        and node.id not in written
+                    ):
+                        names.append(node.id)
+            self._read_names = names
+        return self._read_names
+
+    def written_names(self) -> typing.List[str]:
+        """
+        Get the names of the variables that the code sets: those that it assigns, declares, alters or imports.
+        """
+        return (
+            (self.assigns or [])
+            + [declared.name for declared in self.declares or []]
+            + (self.alters or [])
+            + self.imported_names()
+        )
+
+    def imported_names(self) -> typing.List[str]:
+        """
+        Get the names that the code binds with `import` statements (e.g. `np` in `import numpy as np`).
+        """
+        names: typing.List[str] = []
+        if self.chunk_ast is not None:
+            for statement in self.chunk_ast.body:
+                if isinstance(statement, (ast.Import, ast.ImportFrom)):
+                    names += [
+                        alias.asname or alias.name.split(".")[0]
+                        for alias in statement.names
+                    ]
+        return names
+
+    def method_call_names(self) -> typing.List[str]:
+        """
+        Get the names of the variables that the code calls a method of (e.g. `xs` in `xs.append(1)` or
+        `data["a"].sort()`), other than those that it imports.
+
+        The parser does not record these in `alters` since it can not know whether a method changes its object in
+        place, but they may need to be treated as if it does (see `graph.DependencyGraph`).
+        """
+        names: typing.List[str] = []
+        if self.chunk_ast is None:
+            return names
+
+        imported = self.imported_names()
+        for node in ast.walk(self.chunk_ast):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                value = node.func.value
+                while isinstance(value, (ast.Attribute, ast.Subscript)):
+                    value = value.value
+                if (
+                    isinstance(value, ast.Name)
+                    and value.id not in names
+                    and value.id not in imported
+                ):
+                    names.append(value.id)
+        return names
+
     def to_dict(self):
         """
         Return all attributes as a dictionary.
@@ -259,7 +334,7 @@ def parse_open_filename(open_call: ast.Call) -> typing.Optional[str]:
     return filename
 
 
-def exception_to_code_error(exception: Exception) -> CodeError:
+def exception_to_code_error(exception: BaseException) -> CodeError:
     """
     Convert an `Exception` to a `CodeError` entity.
     """
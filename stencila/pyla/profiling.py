@@ -0,0 +1,199 @@
+"""
+Measurement of the time and memory used by each statement of a `CodeChunk`.
+"""
+
+import os
+import time
+import tracemalloc
+import typing
+
+from .timing import clock_ns, ns_to_seconds
+
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 0
+
+# Before Python 3.9 the peak traced memory can not be reset, so the peaks of individual statements can not be measured
+CAN_RESET_PEAK = hasattr(tracemalloc, "reset_peak")
+
+
+def rss_bytes() -> typing.Optional[int]:
+    """
+    Get the resident set size of this process, in bytes.
+
+    Returns `None` if it is not available (currently it is only read from `/proc`, i.e. on Linux).
+    """
+    if not PAGE_SIZE:
+        return None
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class ResourceUsage(typing.NamedTuple):
+    """
+    The resources used while executing a statement, or a whole `CodeChunk`.
+    """
+
+    """
+    Wall-clock and CPU (user and system, summed across threads) time in seconds.
+    """
+    duration: float
+    cpu_time: float
+
+    """
+    The peak size of memory allocated by Python (as traced by `tracemalloc`) above what was allocated at the start,
+    in bytes. `None` if it could not be measured.
+    """
+    peak_memory: typing.Optional[int]
+
+    """
+    The change in the resident set size of the process, in bytes. `None` if it could not be measured.
+    """
+    rss_delta: typing.Optional[int]
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        """
+        Convert to a dictionary suitable for storing in the `meta` property of a node.
+        """
+        return {
+            "duration": self.duration,
+            "cpuTime": self.cpu_time,
+            "peakMemory": self.peak_memory,
+            "rssDelta": self.rss_delta,
+        }
+
+
+class ResourceSample(typing.NamedTuple):
+    """
+    The counters read at the start of a measurement.
+    """
+
+    wall_ns: int
+    cpu_ns: int
+    traced: int
+    rss: typing.Optional[int]
+
+
+class ChunkProfiler:
+    """
+    Measure the resources used by each statement of a `CodeChunk`, and by the chunk as a whole.
+
+    Call `start` before executing the chunk, `start_statement` and `end_statement` around each statement, and then
+    `stop` to get the results. `tracemalloc` is started, if it is not already running, for the lifetime of the
+    profiler. Since tracing allocations slows down code considerably, profiling should only be used when needed.
+    """
+
+    statements: typing.List[ResourceUsage]
+    _chunk: typing.Optional[ResourceSample]
+    _statement: typing.Optional[ResourceSample]
+
+    """
+    The highest traced memory seen by any statement, in bytes.
+    """
+    _peak_traced: int
+    _started_tracing: bool
+
+    def __init__(self) -> None:
+        self.statements = []
+        self._chunk = None
+        self._statement = None
+        self._peak_traced = 0
+        self._started_tracing = False
+
+    @staticmethod
+    def sample() -> ResourceSample:
+        """
+        Read the current value of each counter.
+        """
+        return ResourceSample(
+            clock_ns(),
+            time.process_time_ns(),
+            tracemalloc.get_traced_memory()[0],
+            rss_bytes(),
+        )
+
+    @staticmethod
+    def reset_peak() -> None:
+        """
+        Reset the peak traced memory to the current traced memory, if supported.
+        """
+        if CAN_RESET_PEAK:
+            tracemalloc.reset_peak()
+
+    def start(self) -> None:
+        """
+        Start measuring the resources used by the chunk.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.reset_peak()
+        self._chunk = self.sample()
+        self._peak_traced = self._chunk.traced
+
+    def start_statement(self) -> None:
+        """
+        Start measuring the resources used by a statement.
+        """
+        self._statement = self.sample()
+        self.reset_peak()
+
+    def end_statement(self, keep: bool = True) -> None:
+        """
+        Finish measuring the resources used by the current statement.
+
+        If `keep` is `False` the measurement is discarded (e.g. because no statement was run since it was started).
+        """
+        if self._statement is None:
+            return
+
+        peak = tracemalloc.get_traced_memory()[1]
+        self._peak_traced = max(self._peak_traced, peak)
+        if keep:
+            self.statements.append(
+                self.usage(self._statement, peak if CAN_RESET_PEAK else None)
+            )
+        self._statement = None
+
+    def stop(self) -> typing.Dict[str, typing.Any]:
+        """
+        Finish measuring and get the resources used by the chunk, and by each of its statements.
+
+        Any statement that is still being measured (e.g. because it was interrupted) is not included.
+        """
+        if self._chunk is None:
+            raise RuntimeError("ChunkProfiler has not been started")
+
+        self.end_statement(keep=False)
+        self._peak_traced = max(self._peak_traced, tracemalloc.get_traced_memory()[1])
+        chunk = self.usage(
+            self._chunk,
+            self._peak_traced if CAN_RESET_PEAK or self._started_tracing else None,
+        )
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+        return dict(
+            chunk.to_dict(), statements=[usage.to_dict() for usage in self.statements]
+        )
+
+    @staticmethod
+    def usage(
+        start: ResourceSample, peak_traced: typing.Optional[int]
+    ) -> ResourceUsage:
+        """
+        Get the resources used since the `start` sample was taken.
+        """
+        end = ChunkProfiler.sample()
+        return ResourceUsage(
+            ns_to_seconds(end.wall_ns - start.wall_ns),
+            ns_to_seconds(end.cpu_ns - start.cpu_ns),
+            None if peak_traced is None else max(peak_traced - start.traced, 0),
+            None if start.rss is None or end.rss is None else end.rss - start.rss,
+        )
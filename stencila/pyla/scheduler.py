@@ -0,0 +1,573 @@
+"""
+Parallel execution of the code in a compiled document on a pool of processes.
+"""
+
+import importlib
+import io
+import logging
+import marshal
+import os
+import pickle
+import sys
+import types
+import typing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from stencila.schema.types import CodeChunk, CodeError, CodeExpression
+
+from .errors import ExecutionTimeoutError
+from .graph import DependencyGraph
+from .interpreter import INTERRUPT_GRACE_PERIOD, DocumentCompilationResult, Interpreter
+from .parser import CodeChunkExecution, set_code_error
+from .timing import clock_ns, ns_to_seconds, seconds_to_ns
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
+
+CodeNode = typing.Union[CodeChunk, CodeExpression]
+Namespace = typing.Dict[str, typing.Any]
+
+
+class NamespacePickler(pickle.Pickler):
+    """
+    Pickles variables so that they can be handed off between processes.
+
+    As well as the values that `pickle` supports, this handles modules (which are re-imported when unpickled) and
+    functions that were defined by executed code (which are sent as their compiled code, and so must not be closures).
+    """
+
+    def persistent_id(self, obj: typing.Any) -> typing.Any:
+        """
+        Get the id for a module or a function defined by executed code, or `None` for other values.
+        """
+        if isinstance(obj, types.ModuleType):
+            return ("module", obj.__name__)
+
+        if (
+            isinstance(obj, types.FunctionType)
+            and obj.__closure__ is None
+            and getattr(sys.modules.get(obj.__module__), obj.__qualname__, None)
+            is not obj
+        ):
+            return ("function", marshal.dumps(obj.__code__), obj.__defaults__)
+
+        return None
+
+
+class NamespaceUnpickler(pickle.Unpickler):
+    """
+    Unpickles variables pickled by a `NamespacePickler`.
+
+    Functions are given `function_globals` as their global scope.
+    """
+
+    function_globals: Namespace
+
+    def __init__(self, file: typing.BinaryIO, function_globals: Namespace) -> None:
+        super().__init__(file)
+        self.function_globals = function_globals
+
+    def persistent_load(self, pid: typing.Any) -> typing.Any:
+        """
+        Get the module or function for an id created by `NamespacePickler.persistent_id`.
+        """
+        if pid[0] == "module":
+            return importlib.import_module(pid[1])
+
+        if pid[0] == "function":
+            code = marshal.loads(pid[1])
+            return types.FunctionType(code, self.function_globals, code.co_name, pid[2])
+
+        raise pickle.UnpicklingError("Unsupported persistent id: {}".format(pid[0]))
+
+
+def dump_namespace(namespace: Namespace) -> bytes:
+    """
+    Pickle a namespace using a `NamespacePickler`.
+    """
+    file = io.BytesIO()
+    NamespacePickler(file, pickle.HIGHEST_PROTOCOL).dump(namespace)
+    return file.getvalue()
+
+
+def load_namespace(data: bytes, function_globals: Namespace) -> Namespace:
+    """
+    Unpickle a namespace pickled by `dump_namespace`.
+    """
+    return NamespaceUnpickler(io.BytesIO(data), function_globals).load()
+
+
+def execute_code_node(
+    node: CodeNode,
+    inputs: bytes,
+    written_names: typing.Iterable[str],
+    timeout: typing.Optional[float] = None,
+) -> typing.Tuple[CodeNode, typing.Optional[bytes]]:
+    """
+    Execute a code node in a fresh `Interpreter` whose namespace has the variables in `inputs`.
+
+    This is the function run in worker processes. Returns the executed node and the variables in `written_names`
+    pickled by `dump_namespace`, or `None` if they could not be pickled.
+    """
+    interpreter = Interpreter(timeout=timeout)
+    interpreter.locals.update(load_namespace(inputs, interpreter.globals))
+    interpreter.execute(node)
+
+    written = {
+        name: interpreter.locals[name]
+        for name in written_names
+        if name in interpreter.locals
+    }
+    try:
+        return node, dump_namespace(written)
+    # pylint: disable=W0703  # pickling arbitrary objects can raise almost any exception
+    except Exception:
+        return node, None
+
+
+def reexecution_warning(reason: str) -> CodeError:
+    """
+    Create a `CodeError` warning that code was executed twice, because its results could not be returned from the
+    worker process that executed it first.
+    """
+    return CodeError(
+        errorType=RuntimeWarning.__name__,
+        errorMessage="This code was executed in a worker process, and then again in the main process because {}. "
+        "Any side effects of the code (e.g. writing to files) happened twice.".format(
+            reason
+        ),
+    )
+
+
+def timeout_error(message: str) -> CodeError:
+    """
+    Create a `CodeError` for code that was not executed, or was terminated, because it ran out of time.
+    """
+    return CodeError(errorType=ExecutionTimeoutError.__name__, errorMessage=message)
+
+
+class Task(typing.NamedTuple):
+    """
+    A code node submitted to a worker process.
+    """
+
+    node_index: int
+    inputs: bytes
+    timeout: typing.Optional[float]
+
+    """
+    The time (see `timing.clock_ns`) after which the worker process is terminated if it has not finished.
+    """
+    deadline: typing.Optional[int]
+
+
+# pylint: disable=R0902
+class ScheduledRun:
+    """
+    The state of one execution of a document by a `ParallelScheduler`.
+    """
+
+    scheduler: "ParallelScheduler"
+    graph: DependencyGraph
+    nodes: typing.List[CodeNode]
+    initial: Namespace
+
+    """
+    The values of the variables written by each code node, keyed by the index of the node and the variable name.
+    """
+    values: typing.Dict[typing.Tuple[int, str], typing.Any]
+
+    pending: typing.Set[int]
+    finished: typing.Set[int]
+    running: typing.Dict[Future, Task]
+    pool: ProcessPoolExecutor
+
+    """
+    The time (see `timing.clock_ns`) at which the document's time budget runs out.
+    """
+    deadline: typing.Optional[int]
+
+    def __init__(
+        self,
+        scheduler: "ParallelScheduler",
+        compilation_result: DocumentCompilationResult,
+        initial: Namespace,
+    ) -> None:
+        self.scheduler = scheduler
+        self.graph = DependencyGraph(compilation_result)
+        self.nodes = [
+            code.code_chunk if isinstance(code, CodeChunkExecution) else code
+            for code in compilation_result.code
+        ]
+        self.initial = initial
+        self.values = {}
+        self.pending = set(range(len(self.nodes)))
+        self.finished = set()
+        self.running = {}
+        self.pool = ProcessPoolExecutor(scheduler.workers)
+        self.deadline = (
+            None
+            if scheduler.document_timeout is None
+            else clock_ns() + seconds_to_ns(scheduler.document_timeout)
+        )
+
+    def execute(self) -> Namespace:
+        """
+        Execute all of the code nodes and return the resulting namespace.
+        """
+        try:
+            while self.pending or self.running:
+                if self.deadline is not None and clock_ns() >= self.deadline:
+                    self.abort(
+                        "Document time budget of {} seconds exceeded".format(
+                            self.scheduler.document_timeout
+                        )
+                    )
+                    break
+
+                self.start_ready()
+                if self.running:
+                    self.wait()
+        finally:
+            self.pool.shutdown(wait=False)
+
+        namespace = dict(self.initial)
+        for name, index in self.graph.last_writers.items():
+            if (index, name) in self.values:
+                namespace[name] = self.values[(index, name)]
+        return namespace
+
+    def is_ready(self, index: int) -> bool:
+        """
+        Have all the code nodes that define the variables read by a code node finished?
+        """
+        return all(
+            definition is None or definition in self.finished
+            for name, definition in self.graph.definitions[index].items()
+            if name in self.graph.reads[index]
+        )
+
+    def inputs(self, index: int) -> Namespace:
+        """
+        Get the variables read by a code node, as defined by the code nodes before it.
+        """
+        namespace = {}
+        for name in self.graph.reads[index]:
+            definition = self.graph.definitions[index][name]
+            if definition is None:
+                if name in self.initial:
+                    namespace[name] = self.initial[name]
+            elif (definition, name) in self.values:
+                namespace[name] = self.values[(definition, name)]
+        return namespace
+
+    def timeout(self) -> typing.Optional[float]:
+        """
+        Get the time budget for a code node, given the per-chunk and remaining document time budgets.
+        """
+        timeouts = [
+            timeout
+            for timeout in (
+                self.scheduler.timeout,
+                None
+                if self.deadline is None
+                else ns_to_seconds(self.deadline - clock_ns()),
+            )
+            if timeout is not None
+        ]
+        return max(min(timeouts), 0.0) if timeouts else None
+
+    def start_ready(self) -> None:
+        """
+        Start executing the code nodes that are ready, as long as there are idle workers.
+        """
+        for index in sorted(self.pending):
+            if len(self.running) >= self.scheduler.workers:
+                return
+            if not self.is_ready(index):
+                continue
+
+            self.pending.remove(index)
+            ParallelScheduler.reset_node(self.nodes[index])
+            if self.nodes[index].text in self.scheduler.local_code:
+                self.execute_locally(index)
+                continue
+            try:
+                data = dump_namespace(self.inputs(index))
+            # pylint: disable=W0703  # pickling arbitrary objects can raise almost any exception
+            except Exception:
+                self.execute_locally(index)
+            else:
+                self.submit(index, data, self.timeout())
+
+    def submit(self, index: int, data: bytes, timeout: typing.Optional[float]) -> None:
+        """
+        Submit a code node to the pool of worker processes.
+        """
+        deadline = (
+            None
+            if timeout is None
+            else clock_ns() + seconds_to_ns(timeout + 2 * INTERRUPT_GRACE_PERIOD)
+        )
+        future = self.pool.submit(
+            execute_code_node,
+            self.nodes[index],
+            data,
+            self.graph.writes[index],
+            timeout,
+        )
+        self.running[future] = Task(index, data, timeout, deadline)
+
+    def wait(self) -> None:
+        """
+        Wait for at least one running code node to finish, or for a deadline to pass.
+        """
+        deadlines = [
+            task.deadline for task in self.running.values() if task.deadline is not None
+        ]
+        if self.deadline is not None:
+            deadlines.append(self.deadline)
+        timeout = (
+            max(ns_to_seconds(min(deadlines) - clock_ns()), 0.0) if deadlines else None
+        )
+
+        done, _ = wait(self.running, timeout=timeout, return_when=FIRST_COMPLETED)
+        broken = False
+        for future in done:
+            if isinstance(future.exception(), BrokenProcessPool):
+                broken = True
+                continue
+
+            index = self.running.pop(future).node_index
+            try:
+                node, written_data = future.result()
+            # pylint: disable=W0703  # e.g. the outputs of the code could not be pickled to send them back
+            except Exception as exc:
+                self.reexecute_locally(
+                    index, "its outputs could not be returned ({})".format(exc)
+                )
+                continue
+
+            if written_data is None:
+                self.reexecute_locally(
+                    index, "the variables that it assigns could not be returned"
+                )
+            else:
+                self.finish(index, node, load_namespace(written_data, {}))
+
+        if broken:
+            self.recover_pool()
+            return
+
+        now = clock_ns()
+        expired = [
+            future
+            for future, task in self.running.items()
+            if task.deadline is not None and task.deadline <= now
+        ]
+        if expired:
+            tasks = list(self.running.values())
+            self.restart_pool()
+            for task in tasks:
+                if task.deadline is not None and task.deadline <= now:
+                    LOGGER.warning(
+                        "Terminated worker executing code %s", task.node_index
+                    )
+                    self.fail(
+                        task.node_index,
+                        timeout_error(
+                            "Execution timed out after {} seconds and the worker process was terminated".format(
+                                task.timeout
+                            )
+                        ),
+                    )
+                else:
+                    self.submit(task.node_index, task.inputs, task.timeout)
+
+    def recover_pool(self) -> None:
+        """
+        Replace the pool after a worker process exited unexpectedly (e.g. because code crashed the interpreter).
+
+        It is not known which of the running code nodes caused the crash so, rather than re-executing them (which
+        could crash the pool again, or this process if done locally), an error is recorded on each of them.
+        """
+        tasks = list(self.running.values())
+        self.restart_pool()
+        for task in tasks:
+            LOGGER.warning(
+                "Worker process exited while executing code %s", task.node_index
+            )
+            ParallelScheduler.reset_node(self.nodes[task.node_index])
+            self.fail(
+                task.node_index,
+                CodeError(
+                    errorType=BrokenProcessPool.__name__,
+                    errorMessage="A worker process exited unexpectedly while executing this code, or other code "
+                    "executing at the same time",
+                ),
+            )
+
+    def reexecute_locally(self, index: int, reason: str) -> None:
+        """
+        Execute a code node in this process after its results could not be returned from a worker process.
+
+        So that code which depends on it can still be executed, the code node is executed again, with a warning
+        recorded on it since it has now been executed twice. The code is remembered by the scheduler so that, in
+        later executions of the document, it is executed in this process from the start.
+        """
+        LOGGER.warning("Re-executing code %s locally because %s", index, reason)
+        self.scheduler.local_code.add(self.nodes[index].text)
+        ParallelScheduler.reset_node(self.nodes[index])
+        self.execute_locally(index)
+        set_code_error(self.nodes[index], reexecution_warning(reason))
+
+    def execute_locally(self, index: int) -> None:
+        """
+        Execute a code node in a fresh `Interpreter` in this process.
+        """
+        interpreter = Interpreter(timeout=self.timeout())
+        interpreter.locals.update(self.inputs(index))
+        interpreter.execute(self.nodes[index])
+        self.finish(
+            index,
+            self.nodes[index],
+            {
+                name: interpreter.locals[name]
+                for name in self.graph.writes[index]
+                if name in interpreter.locals
+            },
+        )
+
+    def finish(self, index: int, node: CodeNode, written: Namespace) -> None:
+        """
+        Record the results of executing a code node.
+        """
+        ParallelScheduler.update_node(self.nodes[index], node)
+        for name, value in written.items():
+            self.values[(index, name)] = value
+        self.finished.add(index)
+
+    def fail(self, index: int, error: CodeError) -> None:
+        """
+        Record that a code node was not executed, or did not finish (e.g. because it ran out of time).
+        """
+        set_code_error(self.nodes[index], error)
+        self.finished.add(index)
+
+    def abort(self, message: str) -> None:
+        """
+        Stop executing, recording an error on all code nodes that are running or have not been started.
+        """
+        self.restart_pool()
+        for index in sorted(
+            self.pending | {task.node_index for task in self.running.values()}
+        ):
+            ParallelScheduler.reset_node(self.nodes[index])
+            self.fail(index, timeout_error(message))
+        self.pending.clear()
+        self.running.clear()
+
+    def restart_pool(self) -> None:
+        """
+        Terminate the worker processes and replace the pool with a new one.
+
+        Any running tasks are lost and must be resubmitted.
+        """
+        # pylint: disable=W0212  # there is no public API to terminate the workers of a ProcessPoolExecutor
+        for process in list((self.pool._processes or {}).values()):
+            process.terminate()
+        self.pool.shutdown(wait=False)
+        self.running.clear()
+        self.pool = ProcessPoolExecutor(self.scheduler.workers)
+
+
+class ParallelScheduler:
+    """
+    Execute the code in a `DocumentCompilationResult` on a pool of processes.
+
+    Uses a `DependencyGraph` to start each code node as soon as the code defining the variables that it reads has
+    finished, so code without data dependencies between them runs at the same time. Each code node runs in a fresh
+    namespace and only the variables that it reads are handed to the worker process, and only those that it writes
+    are returned.
+
+    Code whose input variables can not be pickled (e.g. open files, closures or generators) is executed in this
+    process instead. Code whose outputs, or the variables that it assigns, can not be returned from the worker
+    process has already been executed when that is found out. It is executed again in this process, with a
+    `RuntimeWarning` recorded on it, and is executed in this process from the start in later executions. If a worker
+    process exits unexpectedly (e.g. because code crashed it), a `BrokenProcessPool` error is recorded on the code
+    that was running and the pool is replaced.
+
+    Each code node can be given a time budget (`timeout`), as can the whole document (`document_timeout`). Code that
+    runs out of time is interrupted by the worker and, if that fails (e.g. because it is blocked in a C extension),
+    the worker process is terminated. Code that has not started when the document's budget runs out is not executed.
+    In each case, an `ExecutionTimeoutError` is recorded as a `CodeError` on the code node.
+    """
+
+    max_workers: typing.Optional[int]
+    timeout: typing.Optional[float]
+    document_timeout: typing.Optional[float]
+
+    """
+    The text of code whose results could not be returned from a worker process, which is executed in this process.
+    """
+    local_code: typing.Set[str]
+
+    def __init__(
+        self,
+        max_workers: typing.Optional[int] = None,
+        timeout: typing.Optional[float] = None,
+        document_timeout: typing.Optional[float] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.document_timeout = document_timeout
+        self.local_code = set()
+
+    @property
+    def workers(self) -> int:
+        """
+        Get the number of worker processes to use.
+        """
+        return self.max_workers or os.cpu_count() or 1
+
+    def execute(
+        self,
+        compilation_result: DocumentCompilationResult,
+        parameter_values: typing.Optional[Namespace] = None,
+    ) -> Namespace:
+        """
+        Execute all of the code in the document, updating the code nodes with their outputs and errors.
+
+        Returns the namespace as it would be after executing the code in document order.
+        """
+        return ScheduledRun(
+            self, compilation_result, dict(parameter_values or {})
+        ).execute()
+
+    @staticmethod
+    def reset_node(node: CodeNode) -> None:
+        """
+        Clear the results of any previous execution of a code node.
+        """
+        node.errors = None
+        if isinstance(node, CodeChunk):
+            node.outputs = None
+        else:
+            node.output = None
+
+    @staticmethod
+    def update_node(node: CodeNode, executed: CodeNode) -> None:
+        """
+        Copy the results of executing a code node (e.g. in a worker process) onto the original node.
+        """
+        if node is executed:
+            return
+
+        node.errors = executed.errors
+        node.meta = executed.meta
+        if isinstance(node, CodeChunk):
+            node.outputs = executed.outputs
+            node.duration = executed.duration
+        else:
+            node.output = executed.output
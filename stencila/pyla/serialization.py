@@ -0,0 +1,117 @@
+"""
+Serialization of JSON-RPC messages to JSON, using a fast JSON library (orjson or msgspec) if one is installed.
+
+JSON is compact (i.e. without indentation or spaces) unless an `indent` is given. Values that the JSON library does
+not support (e.g. Stencila `Entity` nodes) are converted by a hook, which by default is
+`stencila.schema.json.object_encode`. If the fast library can not serialize a value (e.g. an integer with more than 64
+bits) the standard library's `json` module is used instead.
+
+Non-finite numbers (`NaN` and infinities), which are not valid JSON, are serialized as `null` by all of the backends.
+"""
+
+import importlib
+import json
+import typing
+
+from stencila.schema.json import object_encode
+
+"""
+The JSON libraries that can be used, in order of preference.
+"""
+JSON_BACKENDS = ["orjson", "msgspec", "json"]
+
+Hook = typing.Callable[[typing.Any], typing.Any]
+
+
+def available_backend() -> str:
+    """
+    Get the name of the first of the `JSON_BACKENDS` that is installed.
+    """
+    for backend in JSON_BACKENDS:
+        try:
+            importlib.import_module(backend)
+            return backend
+        except ImportError:
+            pass
+    return "json"
+
+
+class JsonSerializer:
+    """
+    Serializes values to UTF-8 encoded JSON, using one of the `JSON_BACKENDS`.
+
+    If `backend` is `None`, the first of them that is installed is used. With an `indent`, the JSON is indented (by
+    two spaces for the orjson and msgspec backends, which only support that).
+    """
+
+    backend: str
+    indent: typing.Optional[int]
+    hook: Hook
+
+    _encode: typing.Callable[[typing.Any], bytes]
+
+    def __init__(
+        self,
+        backend: typing.Optional[str] = None,
+        indent: typing.Optional[int] = None,
+        hook: Hook = object_encode,
+    ) -> None:
+        if backend is not None and backend not in JSON_BACKENDS:
+            raise ValueError('Unknown JSON backend "{}"'.format(backend))
+
+        self.backend = backend or available_backend()
+        self.indent = indent
+        self.hook = hook
+
+        if self.backend == "orjson":
+            orjson = importlib.import_module("orjson")
+            option = orjson.OPT_NON_STR_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            self._encode = lambda value: orjson.dumps(value, hook, option)
+        elif self.backend == "msgspec":
+            encoder = importlib.import_module("msgspec.json").Encoder(enc_hook=hook)
+            format_json = importlib.import_module("msgspec.json").format
+            if indent:
+                self._encode = lambda value: format_json(
+                    encoder.encode(value), indent=2
+                )
+            else:
+                self._encode = encoder.encode
+        else:
+            self._encode = self.encode_json
+
+    def encode_json(self, value: typing.Any) -> bytes:
+        """
+        Serialize a value using the standard library's `json` module.
+
+        Like orjson and msgspec, non-finite numbers are serialized as `null`, rather than as the `NaN` and `Infinity`
+        that `json` uses by default. Values that have any are serialized, parsed with those numbers replaced, and
+        serialized again, so that other values are not slowed down.
+        """
+        separators = None if self.indent else (",", ":")
+        try:
+            encoded = json.dumps(
+                value,
+                default=self.hook,
+                indent=self.indent,
+                separators=separators,
+                allow_nan=False,
+            )
+        except ValueError:
+            value = json.loads(
+                json.dumps(value, default=self.hook), parse_constant=lambda name: None
+            )
+            encoded = json.dumps(value, indent=self.indent, separators=separators)
+        return encoded.encode("utf8")
+
+    def encode(self, value: typing.Any) -> bytes:
+        """
+        Serialize a value to UTF-8 encoded JSON.
+        """
+        try:
+            return self._encode(value)
+        except (TypeError, ValueError, OverflowError):
+            if self.backend == "json":
+                raise
+            return self.encode_json(value)
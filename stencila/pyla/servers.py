@@ -2,21 +2,61 @@
 Module for server classes.
 """
 
+# pylint: disable=C0302  # too-many-lines
+
+import asyncio
+import concurrent.futures
+import contextlib
 import enum
 import json
 import logging
+import subprocess
 import sys
+import threading
 import typing
 from socket import socket
 
 from stencila.schema.json import dict_decode, object_encode
-from stencila.schema.types import Node
-
-from .errors import CapabilityError
-from .interpreter import Interpreter
+from stencila.schema.types import CodeError, Node
+
+from .errors import CapabilityError, ExecutionTimeoutError
+from .interpreter import (
+    INTERRUPT_GRACE_PERIOD,
+    OUTPUT_ENCODINGS,
+    Interpreter,
+    OutputListener,
+)
+from .parser import set_code_error
+from .serialization import JsonSerializer
+from .timing import CodeTimer
+
+LOGGER = logging.getLogger(__name__)
+LOGGER.addHandler(logging.NullHandler())
 
 StreamType = typing.Union[typing.BinaryIO, socket]
 
+# The minimum number of seconds between the notifications sent while streaming the outputs of a request
+STREAM_INTERVAL = 0.1
+
+# The number of bytes that a `FrameReader` asks for each time it reads from its stream
+READ_BLOCK_SIZE = 64 * 1024
+
+# The maximum number of buffers passed to a single `sendmsg` call (the lowest `IOV_MAX` of common platforms)
+SENDMSG_MAX_BUFFERS = 1024
+
+# The Python types of the JSON Schema types used in the `params` of requests
+JSON_SCHEMA_TYPES: typing.Dict[str, typing.Union[type, typing.Tuple[type, ...]]] = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+# The methods that use, or change, the state of the interpreter, so are handled one at a time by an `AsyncStreamServer`
+SESSION_METHODS = ("execute", "fetch")
+
 
 def rpc_json_object_encode(node: Node) -> typing.Union[dict, str]:
     """
@@ -30,9 +70,9 @@ def rpc_json_object_encode(node: Node) -> typing.Union[dict, str]:
 
 def to_json(node: Node) -> str:
     """
-    Convert a node including `JsonRrpcError`s, to JSON.
+    Convert a node including `JsonRrpcError`s, to compact JSON.
     """
-    return json.dumps(node, default=rpc_json_object_encode, indent=2)
+    return json.dumps(node, default=rpc_json_object_encode, separators=(",", ":"))
 
 
 def data_to_bytes(data: typing.Any) -> bytes:
@@ -46,16 +86,15 @@ def encode_int(number: int) -> bytes:
     """
     Pack `number` into varint bytes.
     """
-    buf = b""
+    buf = bytearray()
     while True:
         to_write = number & 0x7F
         number >>= 7
         if number:
-            buf += data_to_bytes(to_write | 0x80)
+            buf.append(to_write | 0x80)
         else:
-            buf += data_to_bytes(to_write)
-            break
-    return buf
+            buf.append(to_write)
+            return bytes(buf)
 
 
 def read_one(stream: StreamType) -> int:
@@ -110,14 +149,46 @@ def io_write(stream: typing.BinaryIO, message: bytes) -> None:
     stream.flush()
 
 
-def stream_read(stream: StreamType, count: int) -> bytes:
+def stream_readinto(stream: StreamType, buffer: memoryview) -> int:
     """
-    Abstract reading from stream to work with IO (buffered/unbuffered) and sockets.
+    Read bytes from a stream, or socket, into a buffer and return the number read (zero at the end of the stream).
+
+    Returns as soon as some bytes are available, so fewer bytes than fit in the buffer may be read.
     """
     if isinstance(stream, socket):
-        return stream.recv(count)
+        return stream.recv_into(buffer)
+
+    stream = get_stream_buffer(stream)
+    readinto = getattr(stream, "readinto1", None) or stream.readinto  # type: ignore
+    return readinto(buffer)
+
+
+def stream_readinto_all(stream: StreamType, buffer: memoryview) -> int:
+    """
+    Read bytes from a stream, or socket, until a buffer is full and return the number read.
 
-    return io_read(stream, count)
+    Fewer bytes than fit in the buffer are only read if the stream ends.
+    """
+    count = 0
+    while count < len(buffer):
+        read = stream_readinto(stream, buffer[count:])
+        if not read:
+            break
+        count += read
+    return count
+
+
+def stream_read(stream: StreamType, count: int) -> bytearray:
+    """
+    Abstract reading from stream to work with IO (buffered/unbuffered) and sockets.
+
+    Reads `count` bytes (fewer only if the stream ends) into a preallocated buffer, since a single `recv` on a socket
+    can return fewer bytes than were asked for.
+    """
+    buffer = bytearray(count)
+    with memoryview(buffer) as view:
+        read = stream_readinto_all(stream, view)
+    return buffer if read == count else buffer[:read]
 
 
 def stream_write(stream: StreamType, message: bytes) -> None:
@@ -138,13 +209,172 @@ def message_read(stream: StreamType) -> str:
     return stream_read(stream, message_len).decode("utf8")
 
 
+def socket_sendmsg_all(sock: socket, buffers: typing.List[bytes]) -> None:
+    """
+    Send all of the buffers on a socket, in order, using as few gathering writes (`sendmsg`) as possible.
+
+    Falls back to joining the buffers and using `sendall` on platforms without `sendmsg` (e.g. Windows).
+    """
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(buffers))
+        return
+
+    views = [memoryview(buffer) for buffer in buffers]
+    first = 0
+    while first < len(views):
+        sent = sock.sendmsg(views[first : first + SENDMSG_MAX_BUFFERS])
+        # Skip the buffers that were sent in full, and the part of the next one that was sent
+        while first < len(views) and sent >= len(views[first]):
+            sent -= len(views[first])
+            first += 1
+        if sent:
+            views[first] = views[first][sent:]
+
+
+def frames_write(stream: StreamType, messages: typing.Sequence[bytes]) -> None:
+    """
+    Write length-prefixed messages to a stream, or socket, with a single write.
+
+    On a socket, the length prefixes and messages are sent together with `sendmsg`, without copying them into one
+    buffer. Otherwise, they are joined, written to the stream and flushed once.
+    """
+    buffers = []
+    for message in messages:
+        buffers.append(encode_int(len(message)))
+        buffers.append(message)
+
+    if isinstance(stream, socket):
+        socket_sendmsg_all(stream, buffers)
+    else:
+        io_write(stream, b"".join(buffers))
+
+
 def message_write(stream: StreamType, message: str) -> None:
     """
     Write a length-prefixed message to the stream.
     """
-    bites = message.encode("utf8")
-    stream_write(stream, encode_int(len(bites)))
-    stream_write(stream, bites)
+    frames_write(stream, [message.encode("utf8")])
+
+
+class FrameReader:
+    """
+    Reads length-prefixed frames from a stream, or socket, a block of bytes at a time.
+
+    Rather than reading each byte of a length prefix with its own call (i.e. a system call for each byte on a socket),
+    as many bytes as are available, up to the free space in the buffer, are read into a reusable `bytearray` using
+    `recv_into` (for sockets), or `readinto1` (for buffered streams). Length prefixes and frames are then parsed from
+    the buffer. Frames too large for the buffer are read into a `bytearray` of their own.
+    """
+
+    stream: StreamType
+
+    """
+    The bytes read from the stream; those from `start` up to `end` have not yet been parsed.
+    """
+    buffer: bytearray
+    view: memoryview
+    start: int
+    end: int
+
+    def __init__(self, stream: StreamType, block_size: int = READ_BLOCK_SIZE) -> None:
+        self.stream = (
+            stream if isinstance(stream, socket) else get_stream_buffer(stream)
+        )
+        self.buffer = bytearray(block_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def fill(self, count: int) -> None:
+        """
+        Read from the stream until at least `count` bytes (no more than the size of the buffer) are waiting to be
+        parsed.
+
+        Raises EOFError if the stream ends first.
+        """
+        if self.start + count > len(self.buffer):
+            # Move the bytes that have not been parsed to the start of the buffer, to make room after them
+            unparsed = self.end - self.start
+            self.buffer[:unparsed] = self.buffer[self.start : self.end]
+            self.start, self.end = 0, unparsed
+
+        while self.end - self.start < count:
+            read = stream_readinto(self.stream, self.view[self.end :])
+            if not read:
+                raise EOFError("Unexpected EOF while reading bytes")
+            self.end += read
+
+    def read_length_prefix(self) -> int:
+        """
+        Read a varint from the stream.
+        """
+        shift = 0
+        result = 0
+        while True:
+            if self.start == self.end:
+                self.start = self.end = 0
+                self.fill(1)
+            i = self.buffer[self.start]
+            self.start += 1
+            result |= (i & 0x7F) << shift
+            shift += 7
+            if not i & 0x80:
+                return result
+
+    def read_frame(self) -> memoryview:
+        """
+        Read a length-prefixed frame from the stream.
+
+        Frames that fit in the buffer are a view of it, so they are only valid until the next frame is read; copy
+        them (e.g. decode them to a `str`) to keep them.
+        """
+        start = self.start
+        if start < self.end:
+            # Fast path for a frame shorter than 128 bytes (i.e. with a one byte length prefix) that is all buffered
+            length = self.buffer[start]
+            end = start + 1 + length
+            if length < 0x80 and end <= self.end:
+                self.start = end
+                return self.view[start + 1 : end]
+
+        length = self.read_length_prefix()
+        if length > len(self.buffer):
+            return self.read_large_frame(length)
+
+        if self.end - self.start < length:
+            self.fill(length)
+        frame = self.view[self.start : self.start + length]
+        self.start += length
+        return frame
+
+    def read_large_frame(self, length: int) -> memoryview:
+        """
+        Read a frame that is too large for the buffer into a `bytearray` of its own.
+
+        The bytes of the frame that are already in the buffer are copied, and the rest are read straight into the
+        frame's `bytearray`.
+        """
+        frame = bytearray(length)
+        view = memoryview(frame)
+        buffered = min(self.end - self.start, length)
+        view[:buffered] = self.view[self.start : self.start + buffered]
+        self.start += buffered
+
+        if buffered + stream_readinto_all(self.stream, view[buffered:]) < length:
+            raise EOFError("Unexpected EOF while reading bytes")
+        return view
+
+    def read_bytes(self) -> typing.Union[bytes, bytearray]:
+        """
+        Read a length-prefixed frame from the stream, as bytes that can be kept (e.g. to pass to `json.loads`).
+
+        Frames that were too large for the buffer are returned as the `bytearray` they were read into, without
+        copying them again.
+        """
+        frame = self.read_frame()
+        if frame.obj is not self.buffer:
+            return typing.cast(bytearray, frame.obj)
+        return bytes(frame)
 
 
 class JsonRpcErrorCode(enum.Enum):
@@ -210,6 +440,313 @@ class JsonRpcError(Exception):
         self.data = data
 
 
+def json_type_matches(value: typing.Any, type_name: str) -> bool:
+    """
+    Check whether a value is of a JSON Schema `type` (one of those in `JSON_SCHEMA_TYPES`).
+    """
+    if isinstance(value, bool):
+        return type_name == "boolean"
+    return isinstance(value, JSON_SCHEMA_TYPES[type_name])
+
+
+def validate_params(
+    params: typing.Dict[str, typing.Any], schema: typing.Dict[str, typing.Any]
+) -> None:
+    """
+    Check the `params` of a request against the JSON Schema of a capability (e.g. `Interpreter.FETCH_CAPABILITIES`).
+
+    Only the parts of JSON Schema that the capabilities use are supported: `required` properties, and the `type`,
+    `minimum` and `items` of properties. Properties that are `null` are treated as missing. Raises an `InvalidParams`
+    error for the first property that does not match.
+    """
+    for name in schema.get("required", []):
+        if params.get(name) is None:
+            raise JsonRpcError(
+                JsonRpcErrorCode.InvalidParams,
+                'Invalid params: "{}" is missing'.format(name),
+            )
+
+    for name, prop in schema.get("properties", {}).items():
+        value = params.get(name)
+        if value is None:
+            continue
+
+        if not json_type_matches(value, prop["type"]):
+            valid = False
+        elif "minimum" in prop and value < prop["minimum"]:
+            valid = False
+        elif "items" in prop:
+            valid = all(
+                json_type_matches(item, prop["items"]["type"]) for item in value
+            )
+        else:
+            valid = True
+
+        if not valid:
+            raise JsonRpcError(
+                JsonRpcErrorCode.InvalidParams,
+                'Invalid params: "{}" must match {}'.format(
+                    name, json.dumps(prop, separators=(",", ":"))
+                ),
+            )
+
+
+# pylint: disable=R0902
+class OutputNotifier(OutputListener):
+    """
+    Sends the outputs of code, while it is being executed, as JSON-RPC notifications.
+
+    Outputs are batched and sent at most once every `interval` seconds, as an `output` notification with the `id` of
+    the request that is being executed, any text written to `stdout` (joined into a single string) and any `outputs`.
+    """
+
+    server: "StreamServer"
+    request_id: typing.Any
+    interval: float
+    _stdout: typing.List[str]
+    _outputs: typing.List[typing.Any]
+    _timer: typing.Optional[threading.Timer]
+    _closed: bool
+
+    """
+    Held while batching and sending outputs so that batches are sent in order, and before the response.
+    """
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        server: "StreamServer",
+        request_id: typing.Any,
+        interval: float = STREAM_INTERVAL,
+    ) -> None:
+        self.server = server
+        self.request_id = request_id
+        self.interval = interval
+        self._stdout = []
+        self._outputs = []
+        self._timer = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def stdout(self, text: str) -> None:
+        """
+        Add text written to stdout to the next notification.
+        """
+        with self._lock:
+            if not self._closed:
+                self._stdout.append(text)
+                self.schedule()
+
+    def output(self, value: typing.Any) -> None:
+        """
+        Add an output to the next notification.
+        """
+        with self._lock:
+            if not self._closed:
+                self._outputs.append(value)
+                self.schedule()
+
+    def schedule(self) -> None:
+        """
+        Send the next notification after `interval` seconds, unless it is already scheduled.
+
+        Must be called while holding the lock.
+        """
+        if self._timer is None:
+            self._timer = threading.Timer(self.interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Send any outputs that have not been sent yet.
+        """
+        with self._lock:
+            self.send()
+
+    def close(self) -> None:
+        """
+        Send any outputs that have not been sent yet and ignore any that are added later.
+        """
+        with self._lock:
+            self.send()
+            self._closed = True
+
+    def send(self) -> None:
+        """
+        Send a notification with the outputs that have not been sent yet.
+
+        Must be called while holding the lock.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._stdout and not self._outputs:
+            return
+
+        params: typing.Dict[str, typing.Any] = {"id": self.request_id}
+        if self._stdout:
+            params["stdout"] = "".join(self._stdout)
+        if self._outputs:
+            params["outputs"] = self._outputs
+        self._stdout = []
+        self._outputs = []
+
+        self.server.write_message(
+            self.server.serializer.encode(
+                {"jsonrpc": "2.0", "method": "output", "params": params}
+            )
+        )
+
+
+class WorkerProcess:
+    """
+    A `serve` process that a server forwards requests to, so that code which can not be interrupted when it runs out
+    of time (e.g. because it is blocked in a call to a C extension) can be stopped by terminating the process.
+
+    The process is started with the command line `args` of `serve`, including a `--timeout` so that it interrupts
+    code itself when it can. Responses are matched to requests by their `id`, and other messages (e.g. `output`
+    notifications) are passed to `notify`. If there is no response to an `execute` request within twice the
+    `INTERRUPT_GRACE_PERIOD` after the `timeout`, the process is terminated and another is started for the next
+    request. The variables defined by the code executed in the terminated process are lost.
+    """
+
+    args: typing.List[str]
+    timeout: typing.Optional[float]
+    notify: typing.Callable[[bytes], None]
+    process: typing.Optional[subprocess.Popen]
+
+    """
+    The futures of the responses to the requests that have been sent to the process, keyed by request `id`.
+    """
+    waiting: typing.Dict[typing.Any, "concurrent.futures.Future[bytes]"]
+
+    """
+    Held while starting the process, sending requests to it, and terminating it.
+    """
+    lock: threading.Lock
+
+    def __init__(
+        self,
+        args: typing.List[str],
+        timeout: typing.Optional[float],
+        notify: typing.Callable[[bytes], None] = lambda message: None,
+    ) -> None:
+        self.args = args
+        self.timeout = timeout
+        self.notify = notify
+        self.process = None
+        self.waiting = {}
+        self.lock = threading.Lock()
+
+    def start(self) -> subprocess.Popen:
+        """
+        Start the process, unless it is already running, and a thread to read its messages.
+
+        Must be called while holding the lock.
+        """
+        if self.process is not None and self.process.poll() is None:
+            return self.process
+
+        # pylint: disable=R1732  # the process outlives this method, and is waited for by its reader thread
+        process = subprocess.Popen(
+            [sys.executable, "-m", "stencila.pyla", "serve"] + self.args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        # Each process has its own futures, so that those of a terminated process can not be resolved by another
+        self.waiting = {}
+        threading.Thread(
+            target=self.read,
+            args=(process, self.waiting),
+            name="pyla-worker-reader",
+            daemon=True,
+        ).start()
+        self.process = process
+        return process
+
+    def read(
+        self,
+        process: subprocess.Popen,
+        waiting: typing.Dict[typing.Any, "concurrent.futures.Future[bytes]"],
+    ) -> None:
+        """
+        Read the messages sent by a process until it exits, then fail the requests it did not respond to.
+        """
+        reader = FrameReader(typing.cast(typing.BinaryIO, process.stdout))
+        while True:
+            try:
+                message = bytes(reader.read_bytes())
+            except EOFError:
+                break
+
+            parsed = json.loads(message)
+            future = None if "method" in parsed else waiting.pop(parsed.get("id"), None)
+            if future is None:
+                self.notify(message)
+            else:
+                future.set_result(message)
+
+        process.wait()
+        with self.lock:
+            futures = list(waiting.values())
+            waiting.clear()
+        for future in futures:
+            future.set_exception(
+                JsonRpcError(
+                    JsonRpcErrorCode.ServerError,
+                    "Worker process exited with code {}".format(process.returncode),
+                )
+            )
+
+    def request(
+        self, message: bytes, request_id: typing.Any, method: typing.Optional[str],
+    ) -> typing.Optional[bytes]:
+        """
+        Send a request to the process, starting it if necessary, and wait for its response.
+
+        Returns `None` if the request was an `execute` request and the process was terminated because its code ran
+        out of time.
+        """
+        future: "concurrent.futures.Future[bytes]" = concurrent.futures.Future()
+        with self.lock:
+            process = self.start()
+            self.waiting[request_id] = future
+            waiting = self.waiting
+            frames_write(typing.cast(typing.BinaryIO, process.stdin), [message])
+
+        timeout = (
+            self.timeout + 2 * INTERRUPT_GRACE_PERIOD
+            if method == "execute" and self.timeout is not None
+            else None
+        )
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            with self.lock:
+                if waiting.pop(request_id, None) is None:
+                    # The response arrived after all
+                    return future.result()
+                LOGGER.warning(
+                    "Terminating worker process executing request %s", request_id
+                )
+                process.kill()
+                if self.process is process:
+                    self.process = None
+            return None
+
+    def close(self) -> None:
+        """
+        Close the process's input, so that it exits once it has handled the requests already sent to it.
+        """
+        with self.lock:
+            process, self.process = self.process, None
+        if process is not None:
+            typing.cast(typing.BinaryIO, process.stdin).close()
+            process.wait()
+
+
 class StreamServer:
     """
     A server that communicates using length-prefixed JSON-RPC messages over streams or sockets.
@@ -222,45 +759,122 @@ class StreamServer:
     input_stream: StreamType
     output_stream: StreamType
 
+    """
+    Reads the frames of messages from the input stream.
+    """
+    reader: FrameReader
+
+    """
+    Held while queuing messages to write, since notifications may be written from other threads.
+    """
+    write_lock: threading.Lock
+
+    """
+    Messages waiting to be written, and whether a thread is currently writing messages.
+    """
+    pending: typing.List[bytes]
+    writing: bool
+
+    """
+    Serializes responses and notifications to JSON.
+    """
+    serializer: JsonSerializer
+
+    """
+    If set, requests are forwarded to this process, rather than handled by the `interpreter`, and the notifications
+    that it sends are written to the output stream.
+    """
+    worker: typing.Optional["WorkerProcess"]
+
+    # pylint: disable=R0913
     def __init__(
         self,
         interpreter: Interpreter,
         input_stream: StreamType,
         output_stream: StreamType,
+        serializer: typing.Optional[JsonSerializer] = None,
+        worker: typing.Optional["WorkerProcess"] = None,
     ) -> None:
         self.interpreter = interpreter
         self.input_stream = input_stream
         self.output_stream = output_stream
+        self.reader = FrameReader(input_stream)
+        self.write_lock = threading.Lock()
+        self.pending = []
+        self.writing = False
+        self.serializer = serializer or JsonSerializer(hook=rpc_json_object_encode)
+        self.worker = worker
+        if worker is not None:
+            worker.notify = self.write_message
 
     def read_message(self) -> typing.Iterable[str]:
         """
         Read a length-prefixed message from the input stream then repeat.
         """
         while True:
-            yield message_read(self.input_stream)
+            yield str(self.reader.read_frame(), "utf8")
 
-    def write_message(self, message: str) -> None:
+    def write_message(self, message: typing.Union[str, bytes]) -> None:
         """
-        Write a length-prefixed message to the output stream.
+        Write a length-prefixed message (either a `str` or its UTF-8 bytes) to the output stream.
+
+        Messages written by other threads while a thread is writing (e.g. notifications sent while the response to a
+        request is being written) are queued. The writing thread then writes all of the queued messages, in order,
+        together (see `frames_write`) before returning.
         """
-        message_write(self.output_stream, message)
+        encoded = message.encode("utf8") if isinstance(message, str) else message
+        with self.write_lock:
+            self.pending.append(encoded)
+            if self.writing:
+                return
+            self.writing = True
 
-    def receive_message(self, message: str) -> str:
+        try:
+            while True:
+                with self.write_lock:
+                    messages, self.pending = self.pending, []
+                    if not messages:
+                        self.writing = False
+                        return
+                frames_write(self.output_stream, messages)
+        except BaseException:
+            with self.write_lock:
+                self.writing = False
+            raise
+
+    def receive_message(
+        self, message: typing.Union[str, bytes, bytearray, typing.Dict[str, typing.Any]]
+    ) -> bytes:
         """
-        Receive a JSON-RPC request and send back a JSON-RPC response.
+        Receive a JSON-RPC request and send back a JSON-RPC response, as UTF-8 encoded JSON (see `serializer`).
+
+        The response may have a JSON-RPC `error` if the request was bad. The request may be given as the UTF-8 bytes
+        of the message, which are parsed without first being decoded to a `str`, or as a `dict` if it has already
+        been parsed.
 
-        The response may have a JSON-RPC `error` if the request was bad.
+        If the `params` of an `execute` request has `stream` set to `true`, the outputs of the code are sent as
+        `output` notifications while it is executing (see `OutputNotifier`). The `outputs` in the response then do not
+        include anything written to stdout, since that has already been sent.
+
+        A `fetch` request gets more rows of a `Datatable` output that was paged (see `Interpreter.datatable_page_size`).
+
+        The `encodings` of outputs can be chosen from those listed in the `Interpreter.MANIFEST`, e.g. with
+        `"encodings": {"datatable": "base64"}` in the `params` of an `execute` request.
 
         Python implementation of Executa's
         [Server.receive](https://github.com/stencila/executa/blob/v1.0.1/src/base/Server.ts#L61).
         """
         request_id = None
+        method = None
         result = None
         error = None
+        timer = CodeTimer()
 
         try:
             try:
-                request = json.loads(message)
+                request: typing.Any = (
+                    message if isinstance(message, dict) else json.loads(message)
+                )
             except Exception as exc:
                 raise JsonRpcError(
                     JsonRpcErrorCode.ParseError, "Parse error: {}".format(exc)
@@ -270,6 +884,9 @@ class StreamServer:
             method = request.get("method")
             params = request.get("params")
 
+            if self.worker is not None:
+                return self.forward(message, request)
+
             if method == "manifest":
                 result = Interpreter.MANIFEST
             elif method in ("compile", "execute"):
@@ -280,11 +897,14 @@ class StreamServer:
                         'Invalid params: "node" is missing',
                     )
                 node = dict_decode(node)
-                result = (
-                    self.interpreter.compile(node)
-                    if method == "compile"
-                    else self.interpreter.execute(node)
-                )
+                with timer:
+                    result = (
+                        self.interpreter.compile(node)
+                        if method == "compile"
+                        else self.execute(node, params, request_id)
+                    )
+            elif method == "fetch":
+                result = self.fetch(params or {})
             else:
                 raise JsonRpcError(
                     JsonRpcErrorCode.MethodNotFound,
@@ -302,6 +922,14 @@ class StreamServer:
                 JsonRpcErrorCode.ServerError, "Internal error: {}".format(exc)
             )
 
+        if timer.elapsed_ns:
+            LOGGER.debug(
+                "Handled %s request %s in %.3f ms",
+                method,
+                request_id,
+                timer.elapsed_ns / 1e6,
+            )
+
         response: typing.Dict[str, typing.Any] = {
             "jsonrpc": "2.0",
             "id": request_id,
@@ -309,17 +937,217 @@ class StreamServer:
             "error": error,
         }
 
-        return to_json(response)
+        return self.serializer.encode(response)
+
+    def forward(
+        self,
+        message: typing.Union[str, bytes, bytearray, typing.Dict[str, typing.Any]],
+        request: typing.Dict[str, typing.Any],
+    ) -> bytes:
+        """
+        Forward a request to the `worker` process and get its response.
+
+        If the worker process had to be terminated because the code of an `execute` request ran out of time, the
+        response has the request's node with an `ExecutionTimeoutError` recorded as a `CodeError`.
+        """
+        assert self.worker is not None
+        if isinstance(message, dict):
+            data = bytes(self.serializer.encode(message))
+        elif isinstance(message, str):
+            data = message.encode("utf8")
+        else:
+            data = bytes(message)
+
+        response = self.worker.request(data, request.get("id"), request.get("method"))
+        if response is not None:
+            return response
+
+        node = dict_decode((request.get("params") or {}).get("node"))
+        set_code_error(
+            node,
+            CodeError(
+                errorType=ExecutionTimeoutError.__name__,
+                errorMessage="Execution timed out after {} seconds and the worker process was terminated, so "
+                "variables defined by earlier code are no longer available".format(
+                    self.worker.timeout
+                ),
+            ),
+        )
+        return self.serializer.encode(
+            {"jsonrpc": "2.0", "id": request.get("id"), "result": node, "error": None}
+        )
+
+    def execute(
+        self, node: Node, params: typing.Dict[str, typing.Any], request_id: typing.Any
+    ) -> Node:
+        """
+        Execute a node using the options in the `params` of the request.
+
+        If requested, outputs are sent as notifications while the node is executing.
+        """
+        with self.output_encodings(params):
+            notifier = (
+                OutputNotifier(self, request_id) if params.get("stream") else None
+            )
+            self.interpreter.output_listener = notifier
+            try:
+                return self.interpreter.execute(node)
+            finally:
+                self.interpreter.output_listener = None
+                if notifier:
+                    notifier.close()
+
+    def fetch(self, params: typing.Dict[str, typing.Any]) -> Node:
+        """
+        Fetch a window of the rows of a paged `Datatable` output (see `Interpreter.fetch`).
+
+        The `params` are checked against the `Interpreter.FETCH_CAPABILITIES` first.
+        """
+        validate_params(params, Interpreter.FETCH_CAPABILITIES)
+
+        with self.output_encodings(params):
+            try:
+                return self.interpreter.fetch(
+                    params["handle"],
+                    params.get("offset", 0),
+                    params.get("limit"),
+                    params.get("columns"),
+                )
+            except KeyError as exc:
+                raise JsonRpcError(
+                    JsonRpcErrorCode.InvalidParams,
+                    "Invalid params: {}".format(exc.args[0]),
+                ) from exc
+
+    @contextlib.contextmanager
+    def output_encodings(
+        self, params: typing.Dict[str, typing.Any]
+    ) -> typing.Iterator[None]:
+        """
+        Use the encodings of outputs requested in the `params` of a request, while handling the request.
+        """
+        requested = params.get("encodings") or {}
+        encodings = {}
+        for output_type, supported in OUTPUT_ENCODINGS.items():
+            encoding = requested.get(output_type, "json")
+            if encoding not in supported:
+                raise JsonRpcError(
+                    JsonRpcErrorCode.InvalidParams,
+                    'Invalid params: unknown {} encoding "{}"'.format(
+                        output_type, encoding
+                    ),
+                )
+            encodings[output_type] = encoding
+
+        self.interpreter.datatable_encoding = encodings["datatable"]
+        self.interpreter.ndarray_encoding = encodings["ndarray"]
+        try:
+            yield
+        finally:
+            self.interpreter.datatable_encoding = "json"
+            self.interpreter.ndarray_encoding = "json"
 
     def start(self) -> None:
         """
         Run the server in a loop forever.
 
-        This will run forever because the `read_message` generator never finishes.
+        Each message is passed to `receive_message` as the bytes that were read, since `json.loads` can decode them
+        itself, without decoding them to a `str` first. Runs until the input stream ends (when `EOFError` is raised).
         """
-        for message in self.read_message():
-            response = self.receive_message(message)
-            self.write_message(response)
+        try:
+            while True:
+                response = self.receive_message(self.reader.read_bytes())
+                self.write_message(response)
+        finally:
+            if self.worker is not None:
+                self.worker.close()
+
+
+class AsyncStreamServer(StreamServer):
+    """
+    A `StreamServer` that handles requests concurrently, using `asyncio`.
+
+    Messages are read continuously, on a thread of their own, and each request is handled on an executor as soon as
+    it has been read. Requests for the `SESSION_METHODS` (i.e. `execute` and `fetch`) are handled one at a time, in
+    the order they were received, on the `session_executor`. Others (e.g. `manifest` and `compile`) are handled on
+    the loop's default executor, so that they are not held up by a long running `execute`. Each response is written
+    as soon as it is ready, so responses may be in a different order to the requests and are matched to them by `id`.
+    """
+
+    """
+    Handles the requests that use the state of the interpreter (the session), one at a time.
+    """
+    session_executor: concurrent.futures.ThreadPoolExecutor
+
+    # pylint: disable=R0913
+    def __init__(
+        self,
+        interpreter: Interpreter,
+        input_stream: StreamType,
+        output_stream: StreamType,
+        serializer: typing.Optional[JsonSerializer] = None,
+        worker: typing.Optional["WorkerProcess"] = None,
+    ) -> None:
+        super().__init__(interpreter, input_stream, output_stream, serializer, worker)
+        self.session_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pyla-session"
+        )
+
+    def handle(
+        self, message: typing.Union[bytes, bytearray, typing.Dict[str, typing.Any]]
+    ) -> None:
+        """
+        Handle a request and write its response.
+
+        Errors while writing the response (e.g. because the client has gone) are logged, since there is no one
+        waiting for the result of this call to raise them to.
+        """
+        try:
+            self.write_message(self.receive_message(message))
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Error while writing response")
+
+    async def serve(self) -> None:
+        """
+        Read and handle requests until the input stream ends, then wait for those still being handled.
+
+        Each message is parsed once, to choose the executor to handle it on, and passed to `receive_message` as the
+        parsed request. Messages that can not be parsed are passed as they are, so that a parse error is sent back.
+        """
+        loop = asyncio.get_running_loop()
+        handling: typing.Set["asyncio.Future[None]"] = set()
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pyla-reader"
+        ) as reader:
+            while True:
+                try:
+                    message = await loop.run_in_executor(reader, self.reader.read_bytes)
+                except EOFError:
+                    break
+
+                try:
+                    request = json.loads(message)
+                except ValueError:
+                    request = message
+                method = request.get("method") if isinstance(request, dict) else None
+                executor = self.session_executor if method in SESSION_METHODS else None
+
+                future = loop.run_in_executor(executor, self.handle, request)
+                handling.add(future)
+                future.add_done_callback(handling.discard)
+
+        if handling:
+            await asyncio.wait(handling)
+
+    def start(self) -> None:
+        """
+        Run the server until the input stream ends.
+        """
+        try:
+            asyncio.run(self.serve())
+        finally:
+            if self.worker is not None:
+                self.worker.close()
 
 
 class StdioServer(StreamServer):
@@ -330,5 +1158,28 @@ class StdioServer(StreamServer):
     [StdioServer](https://github.com/stencila/executa/blob/v1.0.0/src/stdio/StdioServer.ts#L12)
     """
 
-    def __init__(self, interpreter: Interpreter):
-        super().__init__(interpreter, sys.stdin.buffer, sys.stdout.buffer)
+    def __init__(
+        self,
+        interpreter: Interpreter,
+        serializer: typing.Optional[JsonSerializer] = None,
+        worker: typing.Optional["WorkerProcess"] = None,
+    ):
+        super().__init__(
+            interpreter, sys.stdin.buffer, sys.stdout.buffer, serializer, worker
+        )
+
+
+class AsyncStdioServer(AsyncStreamServer):
+    """
+    An `AsyncStreamServer` that uses `stdio` as the transport.
+    """
+
+    def __init__(
+        self,
+        interpreter: Interpreter,
+        serializer: typing.Optional[JsonSerializer] = None,
+        worker: typing.Optional["WorkerProcess"] = None,
+    ):
+        super().__init__(
+            interpreter, sys.stdin.buffer, sys.stdout.buffer, serializer, worker
+        )
@@ -0,0 +1,61 @@
+"""
+Timing of code execution, and of requests, using a monotonic high-resolution clock.
+"""
+
+import time
+import typing
+
+NANOSECONDS_PER_SECOND = 1_000_000_000
+
+# The clock used for all timings: monotonic (unaffected by changes to the system clock) and with nanosecond resolution
+clock_ns = time.perf_counter_ns
+
+
+def ns_to_seconds(nanoseconds: int) -> float:
+    """
+    Convert a number of nanoseconds to seconds.
+    """
+    return nanoseconds / NANOSECONDS_PER_SECOND
+
+
+def seconds_to_ns(seconds: float) -> int:
+    """
+    Convert a number of seconds to nanoseconds (e.g. to get the time on the `clock_ns` after a timeout).
+    """
+    return int(seconds * NANOSECONDS_PER_SECOND)
+
+
+class CodeTimer:
+    """
+    Context handler for timing code, use inside a `with` statement.
+
+    The time of each use is added to `elapsed_ns`, so the same timer can be used to time all the statements of a
+    `CodeChunk`. Durations are kept as integer nanoseconds so that summing many short durations does not lose
+    precision.
+    """
+
+    __slots__ = ("_start_ns", "elapsed_ns")
+
+    _start_ns: typing.Optional[int]
+    elapsed_ns: int
+
+    def __init__(self) -> None:
+        self._start_ns = None
+        self.elapsed_ns = 0
+
+    def __enter__(self) -> "CodeTimer":
+        self._start_ns = clock_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.elapsed_ns += clock_ns() - typing.cast(int, self._start_ns)
+
+    @property
+    def duration_seconds(self) -> float:
+        """
+        Get the total time spent inside `with` statements using this timer, in seconds.
+        """
+        if self._start_ns is None:
+            raise RuntimeError("CodeTimer has not yet been run")
+
+        return ns_to_seconds(self.elapsed_ns)
@@ -0,0 +1,20 @@
+from stencila.pyla.blobs import BlobStore
+
+
+def test_blob_store(tmp_path):
+    """
+    Blobs should be stored once, in files named by the hash of their content.
+    """
+    store = BlobStore(tmp_path)
+    path = store.put(b"image", ".png")
+    assert path.read_bytes() == b"image"
+    assert path.name.endswith(".png")
+    assert path.parent.parent == tmp_path.resolve()
+
+    mtime = path.stat().st_mtime_ns
+    assert store.put(b"image", ".png") == path
+    assert path.stat().st_mtime_ns == mtime
+
+    assert store.put(b"other", ".png") != path
+    assert store.url(b"image", ".png") == path.as_uri()
+    assert not list(tmp_path.glob("*/*.tmp"))
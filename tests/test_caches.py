@@ -0,0 +1,39 @@
+from stencila.pyla.caches import LRUCache, content_hash
+
+
+def test_lru_eviction():
+    """
+    The least recently used item should be evicted when the cache is full.
+    """
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_counters():
+    """
+    Hits and misses should be counted, and reset on `clear`.
+    """
+    cache = LRUCache()
+    assert cache.get("missing") is None
+    cache.put("key", "value")
+    cache.get("key")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.clear()
+    assert (cache.hits, cache.misses, len(cache)) == (0, 0, 0)
+
+
+def test_content_hash():
+    """
+    Text and its UTF-8 encoding should have the same hash.
+    """
+    assert content_hash("a = 1") == content_hash(b"a = 1")
+    assert content_hash("a = 1") != content_hash("a = 2")
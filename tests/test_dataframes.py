@@ -0,0 +1,95 @@
+import numpy
+import pandas
+
+from stencila.pyla.dataframes import decode_dataframe
+from stencila.pyla.encoding import decode_array, decode_nulls
+
+
+def column_of(datatable, name):
+    return next(column for column in datatable.columns if column.name == name)
+
+
+def test_decode_dataframe():
+    """
+    Columns of each pandas dtype should be decoded to JSON compatible values, with missing values as `None`.
+    """
+    data_frame = pandas.DataFrame(
+        {
+            "bool": [True, False, True],
+            "int": numpy.array([1, 2, 3], dtype=numpy.int32),
+            "nullable_int": pandas.array([1, None, 3], dtype="Int64"),
+            "float": [1.5, numpy.nan, 3.0],
+            "string": ["a", None, "c"],
+            "datetime": pandas.to_datetime(
+                ["2020-01-01", None, "2020-01-02T03:04:05"], format="ISO8601"
+            ),
+            "datetime_tz": pandas.to_datetime(
+                ["2020-01-01", "2020-01-02", None]
+            ).tz_localize("Europe/Berlin"),
+            "timedelta": pandas.to_timedelta([1.5, None, 3], unit="s"),
+            "category": pandas.Categorical(["x", None, "y"]),
+            "mixed": [1, "a", None],
+        }
+    )
+    datatable = decode_dataframe(data_frame)
+
+    expected = {
+        "bool": ([True, False, True], "BooleanValidator"),
+        "int": ([1, 2, 3], "IntegerValidator"),
+        "nullable_int": ([1, None, 3], "IntegerValidator"),
+        "float": ([1.5, None, 3.0], "NumberValidator"),
+        "string": (["a", None, "c"], "StringValidator"),
+        "datetime": (["2020-01-01", None, "2020-01-02T03:04:05"], "StringValidator"),
+        "timedelta": ([1.5, None, 3.0], "NumberValidator"),
+        "category": (["x", None, "y"], "EnumValidator"),
+        "mixed": ([1, "a", None], None),
+    }
+    for name, (values, validator) in expected.items():
+        column = column_of(datatable, name)
+        assert column.values == values, name
+        items_validator = column.validator.itemsValidator
+        assert (
+            type(items_validator).__name__ if items_validator else None
+        ) == validator, name
+        for value in column.values:
+            assert value is None or type(value) in (bool, int, float, str), name
+
+    # Timezone aware values are in UTC, with the precision of the column (which depends on the pandas version)
+    first, second, third = column_of(datatable, "datetime_tz").values
+    assert first.startswith("2019-12-31T23:00:00.000") and first.endswith("Z")
+    assert second.startswith("2020-01-01T23:00:00.000") and second.endswith("Z")
+    assert third is None
+
+    assert column_of(datatable, "category").validator.itemsValidator.values == [
+        "x",
+        "y",
+    ]
+
+
+def test_decode_dataframe_base64():
+    """
+    With the `base64` encoding, boolean and numeric columns should be encoded as binary and other columns as JSON.
+    """
+    data_frame = pandas.DataFrame(
+        {
+            "float": [1.5, numpy.nan, 3.0],
+            "nullable_int": pandas.array([1, None, 3], dtype="Int64"),
+            "string": ["a", "b", "c"],
+        }
+    )
+    datatable = decode_dataframe(data_frame, "base64")
+
+    column = column_of(datatable, "float")
+    assert column.values == []
+    assert type(column.validator.itemsValidator).__name__ == "NumberValidator"
+    values = decode_array(column.meta["encoding"])
+    assert values[0] == 1.5 and numpy.isnan(values[1])
+
+    column = column_of(datatable, "nullable_int")
+    assert type(column.validator.itemsValidator).__name__ == "IntegerValidator"
+    assert decode_nulls(column.meta["encoding"]).tolist() == [False, True, False]
+    assert decode_array(column.meta["encoding"])[[0, 2]].tolist() == [1, 3]
+
+    column = column_of(datatable, "string")
+    assert column.values == ["a", "b", "c"]
+    assert column.meta is None
@@ -0,0 +1,103 @@
+from unittest import mock
+
+import numpy
+import pandas
+from stencila.schema.types import Datatable
+
+from stencila.pyla.encoders import EncoderRegistry, register_encoder, type_names
+from stencila.pyla.interpreter import Interpreter
+
+
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class Point3D(Point):
+    pass
+
+
+class MyFrame(pandas.DataFrame):
+    pass
+
+
+def test_type_names():
+    """
+    Types should be named by their full name and by their name in their top level package.
+    """
+    assert type_names(numpy.ndarray) == ("numpy.ndarray", "numpy.ndarray")
+    assert type_names(EncoderRegistry) == (
+        "stencila.pyla.encoders.EncoderRegistry",
+        "stencila.EncoderRegistry",
+    )
+
+
+def test_encoder_registry():
+    """
+    Encoders should be found for subclasses and by type name, and lookups should be cached until an encoder is added.
+    """
+    registry = EncoderRegistry()
+    assert registry.encode(1) == 1
+
+    registry.register(Point, lambda point: [point.x, point.y])
+    assert registry.encode(Point3D(1, 2)) == [1, 2]
+    assert Point3D in registry.cache
+
+    registry.register(Point3D.__module__ + ".Point3D", lambda point: "3D")
+    assert Point3D not in registry.cache
+    assert registry.encode(Point3D(1, 2)) == "3D"
+    assert registry.encode(Point(1, 2)) == [1, 2]
+
+
+def test_parent_registry():
+    """
+    Encoders registered in a parent registry should be used when a registry has none of its own, even after
+    lookups have been cached.
+    """
+    parent = EncoderRegistry()
+    registry = EncoderRegistry(parent)
+    assert registry.encode(Point(1, 2)).x == 1
+
+    parent.register(Point, lambda point: point.x)
+    assert registry.encode(Point(1, 2)) == 1
+
+    registry.register(Point, lambda point: point.y)
+    assert registry.encode(Point(1, 2)) == 2
+
+
+def test_interpreter_encoders():
+    """
+    Interpreters should use their own encoders, and those shared by all interpreters, for nested outputs.
+    """
+    interpreter = Interpreter()
+    interpreter.encoders.register(Point, lambda point: {"x": point.x})
+    assert interpreter.decode_output([Point(1, 2), numpy.array([3])]) == [
+        {"x": 1},
+        [3],
+    ]
+
+
+def test_user_encoders_override_defaults():
+    """
+    Encoders registered by users, for a type or a subclass of it, should take precedence over the interpreter's own
+    encoder for the type, even if they are registered in the registry shared by all interpreters.
+    """
+    shared = EncoderRegistry()
+    with mock.patch("stencila.pyla.encoders.ENCODERS", shared), mock.patch(
+        "stencila.pyla.interpreter.ENCODERS", shared
+    ):
+        interpreter = Interpreter()
+        frame = pandas.DataFrame({"a": [1]})
+        assert isinstance(interpreter.decode_output(frame), Datatable)
+
+        register_encoder(MyFrame.__module__ + ".MyFrame", lambda value: "mine")
+        assert interpreter.decode_output(MyFrame({"a": [1]})) == "mine"
+        assert isinstance(interpreter.decode_output(frame), Datatable)
+
+        register_encoder(pandas.DataFrame, lambda value: "user")
+        assert interpreter.decode_output(frame) == "user"
+        assert interpreter.decode_output(MyFrame({"a": [1]})) == "mine"
+
+        interpreter.encoders.register(MyFrame, lambda value: "interpreter")
+        assert interpreter.decode_output(MyFrame({"a": [1]})) == "interpreter"
@@ -0,0 +1,69 @@
+import numpy
+
+from stencila.pyla.encoding import (
+    decode_array,
+    decode_nulls,
+    encode_array,
+    summarize_array,
+)
+from stencila.pyla.interpreter import Interpreter
+from stencila.pyla.limits import OutputLimits
+
+
+def test_encode_array():
+    """
+    Arrays should round trip through their binary encoding, with little-endian values and a bitmap of nulls.
+    """
+    values = numpy.array([1, 2, 3], dtype=">i4")
+    encoded = encode_array(values)
+    assert encoded["dtype"] == "<i4"
+    assert "nulls" not in encoded
+    assert decode_array(encoded).tolist() == [1, 2, 3]
+
+    nulls = numpy.array([False] * 8 + [True, False])
+    encoded = encode_array(numpy.arange(10, dtype=numpy.uint8), nulls)
+    assert decode_nulls(encoded).tolist() == nulls.tolist()
+
+    encoded = encode_array(numpy.array([True, False]))
+    assert encoded["dtype"] == "|b1"
+    assert decode_array(encoded).tolist() == [True, False]
+
+
+def test_encode_ndarray():
+    """
+    Multi-dimensional arrays should round trip with their shape, and large arrays, or those that would not fit in
+    what is left of the output limits, should be summarized.
+    """
+    interpreter = Interpreter()
+    array = numpy.arange(6, dtype=numpy.float32).reshape(2, 3)
+    assert interpreter.decode_output(array) == [[0, 1, 2], [3, 4, 5]]
+
+    interpreter.ndarray_encoding = "base64"
+    encoded = interpreter.decode_output(array)
+    assert encoded["shape"] == [2, 3]
+    assert decode_array(encoded).tolist() == array.tolist()
+    assert interpreter.decode_output(numpy.array(["a"])) == ["a"]
+
+    interpreter.array_summary_threshold = 10
+    summary = interpreter.decode_output(numpy.arange(100).reshape(10, 10))
+    assert summary["encoding"] == "summary"
+    assert summary["shape"] == [10, 10]
+    assert summary["length"] == 100
+    assert summary["head"] == [0, 1, 2, 3, 4]
+    assert summary["tail"] == [95, 96, 97, 98, 99]
+    assert (summary["minimum"], summary["maximum"], summary["mean"]) == (0, 99, 49.5)
+
+    interpreter = Interpreter()
+    decoded = interpreter.decode_output([numpy.zeros(40_000)] * 5)
+    assert [len(value) for value in decoded[:2]] == [40_000, 40_000]
+    assert [value["encoding"] for value in decoded[2:]] == ["summary"] * 3
+
+    interpreter.ndarray_encoding = "base64"
+    interpreter.output_limits = OutputLimits(max_bytes=1_000_000)
+    decoded = interpreter.decode_output([numpy.zeros(30_000)] * 4)
+    assert [value["encoding"] for value in decoded] == ["base64"] * 3 + ["summary"]
+
+    summary = summarize_array(numpy.array(["a", "b", "c"]), 2)
+    assert summary["head"] == ["a", "b"]
+    assert summary["tail"] == ["c"]
+    assert "mean" not in summary
@@ -0,0 +1,101 @@
+import base64
+
+import matplotlib
+
+matplotlib.use("agg")
+
+# pylint: disable=C0413
+import matplotlib.pyplot as pyplot
+from stencila.schema.types import CodeChunk, ImageObject
+
+from stencila.pyla.blobs import BlobStore
+from stencila.pyla.figures import FigureRenderer, FigureTracker, figure_fingerprint
+from stencila.pyla.interpreter import Interpreter
+
+
+def plot(title):
+    figure = pyplot.figure(figsize=(4, 3))
+    pyplot.plot([1, 2, 3], [4, 5, 6])
+    pyplot.title(title)
+    return figure
+
+
+def test_figure_fingerprint():
+    """
+    Figures created by the same code should have the same fingerprint, and different figures different ones.
+    """
+    assert figure_fingerprint(plot("a")) == figure_fingerprint(plot("a"))
+    assert figure_fingerprint(plot("a")) != figure_fingerprint(plot("b"))
+    pyplot.close("all")
+
+
+def test_figure_renderer():
+    """
+    Figures should be rendered in the configured format and size, and unchanged figures should not be re-rendered.
+    """
+    renderer = FigureRenderer("png", dpi=100, max_width=200)
+    image = renderer.render(plot("a"))
+    assert image.contentUrl.startswith("data:image/png;base64,")
+    assert "\n" not in image.contentUrl
+
+    png = base64.b64decode(image.contentUrl.split(",")[1])
+    width = int.from_bytes(png[16:20], "big")
+    assert width == 200
+
+    assert renderer.render(plot("a")).contentUrl == image.contentUrl
+    assert renderer.cache.hits == 1
+
+    svg = FigureRenderer("svg").render(plot("a"))
+    assert svg.contentUrl.startswith("data:image/svg+xml;base64,")
+    pyplot.close("all")
+
+
+def test_figure_renderer_blob_store(tmp_path):
+    """
+    With a blob store, figures should be rendered to files and referenced by URL.
+    """
+    renderer = FigureRenderer(blob_store=BlobStore(tmp_path))
+    image = renderer.render(plot("a"))
+    assert image.contentUrl.startswith("file://")
+    assert image.format == "image/png"
+    assert len(list(tmp_path.glob("*/*.png"))) == 1
+    pyplot.close("all")
+
+
+def test_figure_tracker():
+    """
+    Figures created inside the `with` statement should be tracked and closed, and other figures left open.
+    """
+    existing = plot("existing")
+    with FigureTracker() as figures:
+        created = plot("created")
+        assert figures.new_figures() == [created]
+    assert pyplot.get_fignums() == [existing.number]
+    pyplot.close("all")
+
+
+def test_chunk_figures():
+    """
+    Each figure drawn on by a chunk should be rendered once, in place of its matplotlib outputs, and then closed.
+    """
+    interpreter = Interpreter(figure_renderer=FigureRenderer(cache_size=0))
+    chunk = CodeChunk(
+        "import matplotlib.pyplot as plt\n"
+        "plt.figure()\n"
+        "plt.plot([1, 2])\n"
+        "plt.title('first')\n"
+        "'between'\n"
+        "plt.figure()\n"
+        "plt.plot([2, 1])"
+    )
+    for _ in range(3):
+        interpreter.execute(chunk)
+    assert chunk.outputs[0] == "between"
+    assert [type(output) for output in chunk.outputs[1:]] == [ImageObject] * 2
+    assert chunk.outputs[1].contentUrl != chunk.outputs[2].contentUrl
+    assert pyplot.get_fignums() == []
+
+    chunk = CodeChunk("fig, ax = plt.subplots()\n_ = ax.plot([1, 2])")
+    interpreter.execute(chunk)
+    assert [type(output) for output in chunk.outputs] == [ImageObject]
+    assert pyplot.get_fignums() == []
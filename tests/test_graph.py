@@ -0,0 +1,110 @@
+from stencila.schema.types import Article, CodeChunk, CodeExpression
+
+from stencila.pyla.graph import DependencyGraph, ReactiveExecutor
+from stencila.pyla.interpreter import DocumentCompiler, Interpreter
+
+
+def compile_article(*code):
+    article = Article(content=list(code))
+    return DocumentCompiler().compile(article)
+
+
+def python_chunk(text):
+    return CodeChunk(text, programmingLanguage="python")
+
+
+def test_dependency_graph():
+    """
+    Code should depend on the code that defines the variables it reads, and on earlier code that writes the same
+    variables.
+    """
+    dcr = compile_article(
+        python_chunk("a = 1"),
+        python_chunk("b = a + p"),
+        python_chunk("c = 3"),
+        CodeExpression("b + c", programmingLanguage="python"),
+        python_chunk("a = 4"),
+    )
+    graph = DependencyGraph(dcr)
+
+    assert graph.definitions[1] == {"a": 0, "p": None}
+    assert graph.dependents == [{1, 4}, {3}, {3}, set(), set()]
+    assert graph.readers(["p"]) == {1}
+    assert graph.downstream([2]) == [2, 3]
+    # Re-executing chunk 1 requires chunk 0 because "a" has since been overwritten by chunk 4
+    assert graph.downstream([1]) == [0, 1, 3, 4]
+
+
+def test_reactive_executor():
+    """
+    Only the code affected by a change to a parameter or code should be re-executed.
+    """
+    chunks = [
+        python_chunk("a = p * 2"),
+        python_chunk("b = 10"),
+        python_chunk("c = a + b\nc"),
+        python_chunk("d = b + 1\nd"),
+    ]
+    dcr = compile_article(*chunks)
+    interpreter = Interpreter()
+    executor = ReactiveExecutor(interpreter, dcr)
+
+    assert executor.execute({"p": 1}) == [0, 1, 2, 3]
+    assert chunks[2].outputs == [12]
+
+    assert executor.update_parameters({"p": 1}) == []
+    assert executor.update_parameters({"p": 2}) == [0, 2]
+    assert chunks[2].outputs == [14]
+
+    assert executor.update_code(1, "b = 20") == [1, 2, 3]
+    assert chunks[2].outputs == [24]
+    assert chunks[3].outputs == [21]
+
+    assert executor.update_code(1, "e = 1") == [1, 2, 3]
+    assert "b" not in interpreter.locals
+    assert chunks[3].errors[0].errorType == "NameError"
+
+
+def test_reactive_executor_document_timeout():
+    """
+    Code still running when the document's time budget runs out should be interrupted and later code not executed.
+    """
+    chunks = [
+        python_chunk("a = 1"),
+        python_chunk("while True: pass"),
+        python_chunk("b = a + 1"),
+    ]
+    dcr = DocumentCompiler().compile(Article(content=chunks))
+    executor = ReactiveExecutor(Interpreter(), dcr, document_timeout=0.2)
+
+    assert executor.execute() == [0, 1]
+    assert chunks[1].errors[0].errorType == "ExecutionTimeoutError"
+    assert chunks[2].errors[0].errorMessage.startswith("Document time budget")
+    assert "b" not in executor.interpreter.locals
+
+
+def test_reactive_executor_method_calls():
+    """
+    Calling a method of a variable defined by earlier code should be treated as changing it in place, so that
+    re-executing the call re-executes the code that defines the variable first. Calling a method of a module should
+    not.
+    """
+    chunks = [
+        python_chunk("import math"),
+        python_chunk("xs = []"),
+        python_chunk("xs.append(math.floor(p))"),
+        python_chunk("n = len(xs)"),
+        python_chunk("m = math.ceil(1.5)"),
+    ]
+    dcr = compile_article(*chunks)
+    graph = DependencyGraph(dcr)
+    assert graph.writes[2] == {"xs"}
+    assert graph.writes[4] == {"m"}
+
+    interpreter = Interpreter()
+    executor = ReactiveExecutor(interpreter, dcr)
+    assert executor.execute({"p": 1.5}) == [0, 1, 2, 3, 4]
+
+    assert executor.update_parameters({"p": 2.5}) == [1, 2, 3]
+    assert interpreter.locals["xs"] == [2]
+    assert interpreter.locals["n"] == 1
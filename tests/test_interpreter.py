@@ -1,3 +1,6 @@
+import io
+import subprocess
+import sys
 import unittest.mock
 
 from stencila.schema.types import Article, CodeChunk, CodeExpression
@@ -5,7 +8,9 @@ from stencila.schema.types import Article, CodeChunk, CodeExpression
 from stencila.pyla.interpreter import (
     SKIP_OUTPUT_SEMAPHORE,
     DocumentCompilationResult,
+    ExecutionMode,
     Interpreter,
+    OutputListener,
 )
 from stencila.pyla.parser import CodeChunkExecution, CodeChunkParser
 
@@ -112,3 +117,315 @@ def test_sempahore_skipping():
     i.add_output(outputs, [1, 2, 3])
 
     assert outputs == ["abc123", [1, 2, 3]]
+
+
+def test_code_cache():
+    """
+    Re-executing a `CodeChunk` with the same text should reuse its compiled code rather than re-parsing it.
+    """
+    interpreter = Interpreter()
+    cc1 = CodeChunk("a = 2\na * 3")
+    interpreter.execute(cc1)
+    assert cc1.outputs == [6]
+    assert interpreter.code_cache.misses == 1
+
+    with unittest.mock.patch(
+        "stencila.pyla.interpreter.simple_code_chunk_parse"
+    ) as mock_parse:
+        cc2 = CodeChunk("a = 2\na * 3")
+        interpreter.execute(cc2)
+        assert mock_parse.called is False
+
+    assert cc2.outputs == [6]
+    assert interpreter.code_cache.hits == 1
+
+
+def test_chunk_execution_mode():
+    """
+    Executing a whole chunk as one code object should give the same outputs, errors and namespace as executing it
+    statement by statement.
+    """
+    text = (
+        "a = 5\n"
+        "a + 2\n"
+        "print('Hello')\n"
+        "for i in range(2):\n    print(i)\n"
+        "None\n"
+        "def f():\n    print('in f')\n    return 'f'\n"
+        "f()\n"
+        "badref += 1\n"
+        "print('After exception!')"
+    )
+
+    results = []
+    for mode in ExecutionMode:
+        interpreter = Interpreter(execution_mode=mode)
+        cc = CodeChunk(text)
+        interpreter.execute(cc)
+        results.append((cc, interpreter.locals))
+
+    (statements_cc, statements_locals), (chunk_cc, chunk_locals) = results
+    assert chunk_cc.outputs == statements_cc.outputs
+    assert chunk_cc.outputs == [7, "Hello\n", "0\n1\n", "f", "in f\n"]
+    assert chunk_cc.errors[0].errorType == "NameError"
+    assert chunk_locals.keys() == statements_locals.keys()
+    assert chunk_cc.duration > 0
+
+
+def test_stdout_capture():
+    """
+    Output from all the statements in a chunk should be captured separately, including bytes written to the
+    underlying buffer, even if a character is split across writes.
+    """
+    cc = execute_code_chunk(
+        "import sys\n"
+        "for i in range(3):\n    print(i, end=' ')\n"
+        "sys.stdout.buffer.write('é'.encode('utf8'))\n"
+        "print('done')"
+    )
+    assert cc.outputs == ["0 1 2 ", 2, "é", "done\n"]
+
+    cc = execute_code_chunk(
+        "import sys\n"
+        "data = 'é'.encode('utf8')\n"
+        "for byte in data:\n    sys.stdout.buffer.write(bytes([byte]))"
+    )
+    assert cc.outputs == ["é"]
+
+
+def test_output_cache():
+    """
+    If output caching is on, a chunk should only be re-executed if its text, or the values of the variables it uses,
+    change. On a cache hit the variables it assigns should be restored.
+    """
+    interpreter = Interpreter(output_cache_size=8)
+    text = "import math\nb = a * 2\nprint(b)\nmath.floor(b)"
+
+    def execute(a):
+        cc = CodeChunk(text)
+        interpreter.execute(cc, {"a": a})
+        return cc
+
+    first = execute(1.5)
+    interpreter.locals.pop("b")
+    interpreter.locals.pop("math")
+    second = execute(1.5)
+    assert second.outputs == first.outputs == ["3.0\n", 3]
+    assert second.duration == first.duration
+    assert interpreter.locals["b"] == 3.0
+    assert interpreter.locals["math"].floor(1.5) == 1
+    assert interpreter.output_cache.hits == 1
+
+    third = execute(2.5)
+    assert third.outputs == ["5.0\n", 5]
+    assert interpreter.output_cache.hits == 1
+
+
+def test_output_cache_redefined_function():
+    """
+    Redefining a function should invalidate the cached outputs of chunks that call it.
+    """
+    interpreter = Interpreter(output_cache_size=8)
+
+    def execute(text):
+        cc = CodeChunk(text)
+        interpreter.execute(cc)
+        return cc.outputs
+
+    execute("def f(x): return x + 1")
+    assert execute("f(3)") == [4]
+    assert execute("f(3)") == [4]
+    assert interpreter.output_cache.hits == 1
+
+    execute("def f(x): return x * 100")
+    assert execute("f(3)") == [300]
+
+
+def test_output_cache_encodings():
+    """
+    Changing how outputs are encoded should invalidate the cached outputs of chunks.
+    """
+    interpreter = Interpreter(output_cache_size=8)
+
+    def execute():
+        cc = CodeChunk("import numpy\nnumpy.arange(3)")
+        interpreter.execute(cc)
+        return cc.outputs[0]
+
+    assert execute() == [0, 1, 2]
+    assert execute() == [0, 1, 2]
+    assert interpreter.output_cache.hits == 1
+
+    interpreter.ndarray_encoding = "base64"
+    assert execute()["encoding"] == "base64"
+
+    interpreter.ndarray_encoding = "json"
+    interpreter.array_summary_threshold = 2
+    assert execute()["encoding"] == "summary"
+    assert interpreter.output_cache.hits == 1
+
+
+def test_output_cache_paged_datatable():
+    """
+    Outputs with handles to paged data tables should not be cached, since the data tables may have been dropped by
+    the time the outputs would be restored.
+    """
+    interpreter = Interpreter(output_cache_size=8, datatable_page_size=2)
+    text = "import pandas\npandas.DataFrame({'a': range(5)})"
+
+    interpreter.execute(CodeChunk(text))
+    interpreter.datatables.clear()
+
+    cc = CodeChunk(text)
+    interpreter.execute(cc)
+    handle = cc.outputs[0].meta["handle"]
+    assert interpreter.fetch(handle, offset=2).meta["offset"] == 2
+    assert interpreter.output_cache.hits == 0
+
+
+def test_output_cache_streaming():
+    """
+    On a cache hit, the stdout and outputs of a chunk should be sent to the output listener again.
+    """
+
+    class Listener(OutputListener):
+        def __init__(self):
+            self.notifications = []
+
+        def stdout(self, text):
+            self.notifications.append(("stdout", text))
+
+        def output(self, value):
+            self.notifications.append(("output", value))
+
+    interpreter = Interpreter(output_cache_size=8)
+    runs = []
+    for _ in range(2):
+        interpreter.output_listener = listener = Listener()
+        cc = CodeChunk("print('hello')\n1 + 1")
+        interpreter.execute(cc)
+        runs.append((listener.notifications, cc.outputs))
+
+    assert interpreter.output_cache.hits == 1
+    assert runs[0] == runs[1]
+    assert runs[1] == ([("stdout", "hello"), ("stdout", "\n"), ("output", 2)], [2])
+
+
+def test_timeout():
+    """
+    Code that runs for longer than the timeout should be interrupted and get an `ExecutionTimeoutError`, leaving the
+    interpreter able to execute more code.
+    """
+    interpreter = Interpreter(timeout=0.2)
+    cc = CodeChunk("a = 1\nwhile True: pass")
+    interpreter.execute(cc)
+    assert cc.errors[0].errorType == "ExecutionTimeoutError"
+    assert interpreter.locals["a"] == 1
+
+    cc = CodeChunk("a + 1")
+    interpreter.execute(cc)
+    assert cc.outputs == [2]
+    assert cc.errors is None
+
+
+def test_timeout_uninterruptible():
+    """
+    Code that can not be interrupted when it times out should be waited for, rather than left running while later
+    code executes, and capturing its output should not affect where other output goes.
+    """
+    stdout = sys.stdout
+    interpreter = Interpreter(timeout=0.2)
+    cc = CodeChunk("import time\ntime.sleep(1.5)\na = 1")
+    interpreter.execute(cc)
+    assert cc.errors[0].errorType == "ExecutionTimeoutError"
+    assert "a" not in interpreter.locals
+
+    cc = CodeChunk("print('next')")
+    interpreter.execute(cc)
+    assert cc.outputs == ["next\n"]
+    assert sys.stdout is stdout
+
+
+def test_timeout_same_thread():
+    """
+    Code with a time limit should always be executed on the same thread, so that objects tied to the thread that
+    created them can be used by later code.
+    """
+    interpreter = Interpreter(timeout=5)
+    interpreter.execute(CodeChunk("import sqlite3\ncon = sqlite3.connect(':memory:')"))
+    cc = CodeChunk("con.execute('select 1').fetchone()[0]")
+    interpreter.execute(cc)
+    assert cc.errors is None
+    assert cc.outputs == [1]
+
+
+def test_stdout_background_thread():
+    """
+    Output from threads started by the code should be captured, in both execution modes and with a time limit,
+    rather than written to the real stdout (which may be the stream used to send responses).
+    """
+    text = (
+        "import threading\n"
+        "thread = threading.Thread(target=lambda: print('from thread'))\n"
+        "thread.start()\n"
+        "thread.join()\n"
+        "print('main')"
+    )
+    stdout = sys.stdout
+    for interpreter in [
+        Interpreter(),
+        Interpreter(execution_mode=ExecutionMode.CHUNK),
+        Interpreter(timeout=5),
+    ]:
+        with unittest.mock.patch.object(sys, "stdout", io.StringIO()) as real:
+            cc = CodeChunk(text)
+            interpreter.execute(cc)
+        assert real.getvalue() == ""
+        assert "".join(cc.outputs) == "from thread\nmain\n"
+    assert sys.stdout is stdout
+
+
+def test_profile():
+    """
+    If profiling is on, the time and memory used by a chunk, and each of its statements, should be recorded in the
+    chunk's `meta`, in both execution modes.
+    """
+    text = "a = list(range(100000))\nb = 1\nlen(a)"
+    for mode in ExecutionMode:
+        cc = CodeChunk(text, meta={"other": True})
+        Interpreter(execution_mode=mode, profile=True).execute(cc)
+        assert cc.outputs == [100000]
+        assert cc.meta["other"]
+
+        resources = cc.meta["resources"]
+        assert len(resources["statements"]) == 3
+        assert resources["cpuTime"] >= 0
+        assert resources["peakMemory"] >= resources["statements"][0]["peakMemory"]
+        assert resources["statements"][0]["peakMemory"] > 100000 * 8
+        assert resources["statements"][1]["peakMemory"] < 100000
+
+    cc = CodeChunk("b = 1\nundefined")
+    Interpreter(execution_mode=ExecutionMode.CHUNK, profile=True).execute(cc)
+    assert len(cc.meta["resources"]["statements"]) == 2
+
+    cc = CodeChunk(text)
+    Interpreter().execute(cc)
+    assert cc.meta is None
+
+
+def test_lazy_imports():
+    """
+    Importing the server, and executing code that does not use them, should not import matplotlib, NumPy or pandas.
+    """
+    code = (
+        "import sys\n"
+        "from stencila.schema.types import CodeChunk\n"
+        "from stencila.pyla.servers import StdioServer\n"
+        "from stencila.pyla.interpreter import Interpreter\n"
+        "Interpreter().execute(CodeChunk('[1, (2, 3)]'))\n"
+        "print([name for name in ('matplotlib', 'numpy', 'pandas') if name in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
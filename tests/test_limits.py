@@ -0,0 +1,91 @@
+from stencila.pyla.interpreter import Interpreter
+from stencila.pyla.limits import OutputLimits, decode_bounded
+
+
+def identity(value):
+    return value
+
+
+def test_decode_bounded():
+    """
+    Outputs should be decoded within the limits, with markers in place of the values left out.
+    """
+    assert decode_bounded([1, (2, [3])], identity) == [1, (2, [3])]
+
+    assert decode_bounded(list(range(10)), identity, OutputLimits(max_items=3)) == [
+        0,
+        1,
+        {"truncated": "items", "omitted": 8},
+    ]
+    assert decode_bounded([[[1]], 2], identity, OutputLimits(max_depth=2)) == [
+        [{"truncated": "depth", "omitted": 1}],
+        2,
+    ]
+    assert decode_bounded(["abc"] * 4, identity, OutputLimits(max_bytes=14)) == [
+        "abc",
+        "abc",
+        {"truncated": "bytes", "omitted": 2},
+    ]
+
+
+def test_decode_bounded_cycles_and_nesting():
+    """
+    Self-referencing lists should not be followed, and deeply nested lists should not overflow the stack.
+    """
+    cyclic = [1]
+    cyclic.append(cyclic)
+    assert decode_bounded(cyclic, identity) == [
+        1,
+        {"truncated": "cycle", "omitted": 2},
+    ]
+
+    shared = [1]
+    assert decode_bounded([shared, shared], identity) == [[1], [1]]
+
+    nested: list = []
+    inner = nested
+    for _ in range(10_000):
+        inner.append([])
+        inner = inner[0]
+    decoded = decode_bounded(nested, identity, OutputLimits(max_depth=20_000))
+    assert len(decoded) == 1
+
+
+def test_decode_bounded_encoded_values():
+    """
+    Lists, and dictionaries, returned by `decode` in place of other values should count against the limits.
+    """
+
+    class Large:
+        pass
+
+    def to_list(value):
+        return [0] * 1000 if isinstance(value, Large) else value
+
+    decoded = decode_bounded([Large()] * 5, to_list, OutputLimits(max_items=2500))
+    assert decoded == [
+        [0] * 1000,
+        [0] * 1000,
+        [0] * 496 + [{"truncated": "items", "omitted": 504}],
+        {"truncated": "items", "omitted": 2},
+    ]
+
+    def to_dict(value):
+        return {"data": "x" * 100} if isinstance(value, Large) else value
+
+    decoded = decode_bounded([Large()] * 5, to_dict, OutputLimits(max_bytes=250))
+    assert decoded == [
+        {"data": "x" * 100},
+        {"data": "x" * 100},
+        {"truncated": "bytes", "omitted": 3},
+    ]
+
+
+def test_interpreter_output_limits():
+    """
+    The interpreter should apply its `output_limits` to the outputs of expressions and chunks.
+    """
+    interpreter = Interpreter()
+    interpreter.output_limits = OutputLimits(max_items=5)
+    decoded = interpreter.decode_output(list(range(1_000_000)))
+    assert decoded[-1] == {"truncated": "items", "omitted": 999_996}
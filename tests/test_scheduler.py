@@ -0,0 +1,102 @@
+from stencila.schema.types import Article, CodeChunk, CodeExpression
+
+from stencila.pyla.interpreter import DocumentCompiler
+from stencila.pyla.scheduler import ParallelScheduler, dump_namespace, load_namespace
+
+
+def python_chunk(text):
+    return CodeChunk(text, programmingLanguage="python")
+
+
+def test_namespace_pickling():
+    """
+    Modules and functions defined by executed code should be able to be handed off between processes.
+    """
+    import math
+
+    function_globals = {}
+    exec("def add(x, y=1):\n    return x + y", function_globals)
+    namespace = load_namespace(
+        dump_namespace({"math": math, "add": function_globals["add"], "a": [1]}), {}
+    )
+    assert namespace["math"] is math
+    assert namespace["add"](1) == 2
+    assert namespace["a"] == [1]
+
+
+def test_parallel_execution():
+    """
+    Code should be executed on a pool of processes, with the same outputs and namespace as executing in order.
+    """
+    chunks = [
+        python_chunk("import math\na = p * 2"),
+        python_chunk("b = math.sqrt(16)"),
+        python_chunk("def f(x):\n    return x + 1"),
+        python_chunk("c = f(a) + b\nprint(c)"),
+        python_chunk("import threading\nlock = threading.Lock()"),
+        python_chunk("with lock:\n    d = c * 2\nd"),
+        python_chunk("e = undefined"),
+    ]
+    expression = CodeExpression("c + d", programmingLanguage="python")
+    dcr = DocumentCompiler().compile(Article(content=chunks + [expression]))
+
+    namespace = ParallelScheduler(max_workers=2).execute(dcr, {"p": 1})
+
+    assert chunks[3].outputs == ["7.0\n"]
+    assert chunks[5].outputs == [14.0]
+    assert chunks[6].errors[0].errorType == "NameError"
+    assert expression.output == 21.0
+    assert namespace["d"] == 14.0
+    assert namespace["p"] == 1
+
+
+def test_parallel_execution_timeout():
+    """
+    Workers stuck in code that can not be interrupted should be terminated, without affecting other code.
+    """
+    chunks = [
+        python_chunk("import time\ntime.sleep(60)"),
+        python_chunk("a = 1"),
+        python_chunk("b = a + 1\nb"),
+    ]
+    dcr = DocumentCompiler().compile(Article(content=chunks))
+
+    ParallelScheduler(max_workers=2, timeout=0.2).execute(dcr)
+
+    assert chunks[0].errors[0].errorType == "ExecutionTimeoutError"
+    assert chunks[2].outputs == [2]
+
+
+def test_parallel_execution_unpicklable_outputs(tmp_path):
+    """
+    Code whose outputs can not be sent back from a worker process should be executed again locally, with a warning,
+    and locally from the start after that. A worker process that exits should be recorded as an error on its code,
+    without aborting the execution of the document.
+    """
+    path = tmp_path / "log.txt"
+    chunks = [
+        python_chunk(
+            "a = 1\nopen({}, 'a').write('x')\n(x for x in range(3))".format(
+                repr(str(path))
+            )
+        ),
+        python_chunk("b = a + 1\nb"),
+        python_chunk("import os\nos._exit(1)"),
+    ]
+    dcr = DocumentCompiler().compile(Article(content=chunks))
+    scheduler = ParallelScheduler(max_workers=1)
+
+    namespace = scheduler.execute(dcr)
+
+    assert chunks[0].errors[0].errorType == "RuntimeWarning"
+    assert list(chunks[0].outputs[-1]) == [0, 1, 2]
+    assert chunks[1].outputs == [2]
+    assert chunks[2].errors[0].errorType == "BrokenProcessPool"
+    assert namespace["b"] == 2
+    assert path.read_text() == "xx"
+
+    scheduler.execute(dcr)
+
+    assert chunks[0].errors is None
+    assert list(chunks[0].outputs[-1]) == [0, 1, 2]
+    assert path.read_text() == "xxx"
@@ -0,0 +1,64 @@
+import importlib.util
+import json
+
+import pytest
+from stencila.schema.types import CodeChunk, ImageObject
+
+from stencila.pyla.serialization import JSON_BACKENDS, JsonSerializer
+
+BACKENDS = [name for name in JSON_BACKENDS if importlib.util.find_spec(name)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_serializer(backend):
+    """
+    Each installed backend should serialize entities to the same compact JSON, or indented JSON if asked to, with
+    `NaN` and infinities as `null`.
+    """
+    value = {
+        "result": CodeChunk(
+            "plot()",
+            outputs=[1, "two", ImageObject("a.png"), float("nan"), float("-inf")],
+        ),
+        "data": [float("inf")],
+        "error": None,
+    }
+    expected = {
+        "result": {
+            "type": "CodeChunk",
+            "text": "plot()",
+            "outputs": [
+                1,
+                "two",
+                {"type": "ImageObject", "contentUrl": "a.png"},
+                None,
+                None,
+            ],
+        },
+        "data": [None],
+        "error": None,
+    }
+
+    compact = JsonSerializer(backend).encode(value)
+    assert json.loads(compact) == expected
+    assert b" " not in compact.replace(b"plot()", b"")
+
+    indented = JsonSerializer(backend, indent=2).encode(value)
+    assert json.loads(indented) == expected
+    assert b"\n  " in indented
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_serializer_fallback(backend):
+    """
+    Values that a fast backend can not serialize should be serialized by the standard library.
+    """
+    assert JsonSerializer(backend).encode([2 ** 70]) == b"[1180591620717411303424]"
+
+
+def test_serializer_unknown_backend():
+    """
+    An unknown backend should be rejected.
+    """
+    with pytest.raises(ValueError):
+        JsonSerializer("simdjson")
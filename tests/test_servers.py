@@ -1,4 +1,6 @@
 import json
+import socket
+import threading
 from io import BytesIO
 from unittest import mock
 
@@ -7,9 +9,13 @@ from stencila.schema.types import CodeChunk, CodeExpression
 
 from stencila.pyla.interpreter import Interpreter
 from stencila.pyla.servers import (
+    AsyncStreamServer,
+    FrameReader,
     JsonRpcErrorCode,
     StreamServer,
+    WorkerProcess,
     encode_int,
+    frames_write,
     message_read,
     message_write,
     read_one,
@@ -244,3 +250,284 @@ def test_execute_code_expr(dict_decode):
         json.dumps({"id": 13, "method": "execute", "params": {"node": "ce"}})
     )
     interpreter.execute.assert_called_with(ce)
+
+
+def test_receive_message_execute_streaming():
+    """
+    Test that, if requested, outputs are sent as notifications while code is executing and that stdout is not
+    included in the response.
+    """
+    output_str = BytesIO()
+    server = StreamServer(Interpreter(), BytesIO(), output_str)
+    chunk = {
+        "type": "CodeChunk",
+        "programmingLanguage": "python",
+        "text": "import time\nprint('a')\ntime.sleep(0.3)\nprint('b')\n1 + 1",
+    }
+    response = server.receive_message(
+        json.dumps(
+            {"id": 12, "method": "execute", "params": {"node": chunk, "stream": True}}
+        )
+    )
+
+    output_str.seek(0)
+    notifications = []
+    while output_str.tell() < len(output_str.getvalue()):
+        notifications.append(json.loads(message_read(output_str)))
+
+    assert [notification["params"] for notification in notifications] == [
+        {"id": 12, "stdout": "a\n"},
+        {"id": 12, "stdout": "b\n", "outputs": [2]},
+    ]
+    assert notifications[0]["method"] == "output"
+    assert json.loads(response)["result"]["outputs"] == [2]
+
+
+def test_receive_message_fetch():
+    """
+    Test that large `DataFrame` outputs are paged and that other rows can be fetched by their handle.
+    """
+    server = StreamServer(Interpreter(datatable_page_size=2), BytesIO(), BytesIO())
+    chunk = {
+        "type": "CodeChunk",
+        "programmingLanguage": "python",
+        "text": "import pandas\npandas.DataFrame({'a': range(5), 'b': list('vwxyz')})",
+    }
+    response = server.receive_message(
+        json.dumps({"id": 13, "method": "execute", "params": {"node": chunk}})
+    )
+    datatable = json.loads(response)["result"]["outputs"][0]
+    assert [column["values"] for column in datatable["columns"]] == [
+        [0, 1],
+        ["v", "w"],
+    ]
+    assert datatable["meta"]["rows"] == 5
+
+    def fetch(params):
+        params = {"handle": datatable["meta"]["handle"], **params}
+        return json.loads(
+            server.receive_message(
+                json.dumps({"id": 14, "method": "fetch", "params": params})
+            )
+        )
+
+    page = fetch({"offset": 3, "limit": 5, "columns": ["b"]})["result"]
+    assert [column["values"] for column in page["columns"]] == [["y", "z"]]
+    assert page["meta"]["offset"] == 3
+
+    error = fetch({"handle": "unknown"})["error"]
+    assert error["code"] == JsonRpcErrorCode.InvalidParams.value
+
+    for params in (
+        {"offset": -1},
+        {"offset": 1.5},
+        {"offset": True},
+        {"limit": -2},
+        {"limit": "5"},
+        {"columns": "b"},
+        {"columns": [0]},
+        {"handle": None},
+    ):
+        error = fetch(params)["error"]
+        assert error["code"] == JsonRpcErrorCode.InvalidParams.value, params
+
+
+def test_frame_reader():
+    """
+    Frames should be read whole however the bytes arrive, including frames larger than the reader's buffer.
+    """
+    messages = [b"a", b"", "été".encode("utf8"), b"x" * 1000, b"bc"]
+    data = b"".join(encode_int(len(message)) + message for message in messages)
+
+    left, right = socket.socketpair()
+    with left, right:
+        reader = FrameReader(right, block_size=16)
+
+        def send():
+            for i in range(0, len(data), 7):
+                left.sendall(data[i : i + 7])
+            left.close()
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        assert [bytes(reader.read_frame()) for _ in messages] == messages
+        sender.join()
+
+        with pytest.raises(EOFError):
+            reader.read_frame()
+
+    reader = FrameReader(BytesIO(data), block_size=16)
+    assert [bytes(reader.read_frame()) for _ in messages] == messages
+
+
+def test_large_message():
+    """
+    Messages larger than a single `recv` returns should be read whole, and parsed from their bytes.
+    """
+    request = json.dumps(
+        {"id": 1, "method": "manifest", "params": {"padding": "x" * 5_000_000}}
+    )
+    left, right = socket.socketpair()
+    with left, right:
+        sender = threading.Thread(target=message_write, args=(left, request))
+        sender.start()
+        assert message_read(right) == request
+        sender.join()
+
+        server = StreamServer(Interpreter(), right, BytesIO())
+        sender = threading.Thread(target=message_write, args=(left, request))
+        sender.start()
+        message = server.reader.read_bytes()
+        sender.join()
+        assert isinstance(message, bytearray) and len(message) == len(request)
+        assert json.loads(server.receive_message(message))["id"] == 1
+
+
+def test_frames_write():
+    """
+    Several messages should be written together and read back in order, from sockets and other streams.
+    """
+    messages = [b"first", b"x" * 3_000_000, b"", b"last"]
+
+    left, right = socket.socketpair()
+    with left, right:
+        reader = FrameReader(right)
+        sender = threading.Thread(target=frames_write, args=(left, messages))
+        sender.start()
+        assert [bytes(reader.read_frame()) for _ in messages] == messages
+        sender.join()
+
+    stream = BytesIO()
+    frames_write(stream, messages)
+    stream.seek(0)
+    assert [message_read(stream).encode() for _ in messages] == messages
+
+
+def test_write_message_queue():
+    """
+    Messages written while another thread is writing should be queued, then written together in order.
+    """
+    output = BytesIO()
+    server = StreamServer(Interpreter(), BytesIO(), output)
+    with mock.patch("stencila.pyla.servers.frames_write", wraps=frames_write) as writes:
+        server.writing = True  # as if another thread is writing
+        server.write_message("one")
+        server.write_message("two")
+        assert writes.call_count == 0
+
+        server.writing = False
+        server.write_message("three")
+        writes.assert_called_once_with(output, [b"one", b"two", b"three"])
+
+    output.seek(0)
+    assert [message_read(output) for _ in range(3)] == ["one", "two", "three"]
+
+    def write(thread):
+        for index in range(100):
+            server.write_message("{} {}".format(thread, index))
+
+    output.seek(0)
+    output.truncate()
+    threads = [threading.Thread(target=write, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    output.seek(0)
+    messages = [message_read(output).split() for _ in range(400)]
+    for thread in range(4):
+        indexes = [int(index) for name, index in messages if name == str(thread)]
+        assert indexes == list(range(100))
+
+
+def test_async_stream_server():
+    """
+    Requests should be handled concurrently, with `execute` requests handled one at a time in the order received,
+    and each response written as soon as it is ready, with the `id` of its request.
+    """
+
+    def chunk(text):
+        return {"type": "CodeChunk", "programmingLanguage": "python", "text": text}
+
+    requests = [
+        {
+            "id": 1,
+            "method": "execute",
+            "params": {"node": chunk("import time\ntime.sleep(0.5)\nx = 1")},
+        },
+        {"id": 2, "method": "execute", "params": {"node": chunk("x + 1")}},
+        {"id": 3, "method": "manifest"},
+        {"id": 4, "method": "compile", "params": {"node": chunk("y = 2")}},
+    ]
+
+    left, right = socket.socketpair()
+    with left, right:
+        server = AsyncStreamServer(Interpreter(), right, right)
+        thread = threading.Thread(target=server.start)
+        thread.start()
+
+        frames_write(
+            left, [json.dumps(request).encode("utf8") for request in requests] + [b"{"]
+        )
+        reader = FrameReader(left)
+        responses = [json.loads(reader.read_bytes()) for _ in range(len(requests) + 1)]
+
+        left.shutdown(socket.SHUT_WR)
+        thread.join(5)
+        assert not thread.is_alive()
+
+    ids = [response["id"] for response in responses]
+    assert ids[-2:] == [1, 2]
+    assert sorted(ids[:-2], key=str) == [3, 4, None]
+
+    by_id = {response["id"]: response for response in responses}
+    assert by_id[None]["error"]["code"] == JsonRpcErrorCode.ParseError.value
+    assert by_id[2]["result"]["outputs"] == [2]
+    assert by_id[3]["result"] == Interpreter.MANIFEST
+    assert by_id[4]["result"]["assigns"] == ["y"]
+
+
+def test_worker_process_timeout():
+    """
+    Code that can not be interrupted when it runs out of time should be stopped by terminating the worker process,
+    with the next request handled by a new worker.
+    """
+
+    def execute(request_id, text):
+        node = {"type": "CodeChunk", "programmingLanguage": "python", "text": text}
+        return {"id": request_id, "method": "execute", "params": {"node": node}}
+
+    left, right = socket.socketpair()
+    with left, right:
+        server = StreamServer(
+            Interpreter(),
+            right,
+            right,
+            worker=WorkerProcess(["--timeout=0.2", "--worker"], 0.2),
+        )
+
+        def serve():
+            # `start` returns by raising `EOFError` when the input ends
+            with pytest.raises(EOFError):
+                server.start()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        reader = FrameReader(left)
+
+        frames_write(
+            left, [json.dumps(execute(1, "import time\ntime.sleep(30)")).encode("utf8")]
+        )
+        timed_out = json.loads(reader.read_bytes())
+        frames_write(left, [json.dumps(execute(2, "1 + 1")).encode("utf8")])
+        response = json.loads(reader.read_bytes())
+
+        left.shutdown(socket.SHUT_WR)
+        thread.join(10)
+        assert not thread.is_alive()
+
+    assert timed_out["id"] == 1
+    assert timed_out["result"]["errors"][0]["errorType"] == "ExecutionTimeoutError"
+    assert response["id"] == 2
+    assert response["result"]["outputs"] == [2]
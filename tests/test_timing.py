@@ -0,0 +1,30 @@
+import pytest
+
+from stencila.pyla.timing import CodeTimer, ns_to_seconds, seconds_to_ns
+
+
+def test_code_timer():
+    """
+    A `CodeTimer` should accumulate the time of each use, with enough resolution to time very short code.
+    """
+    timer = CodeTimer()
+    with pytest.raises(RuntimeError):
+        timer.duration_seconds  # pylint: disable=W0104
+
+    with timer:
+        pass
+    first = timer.elapsed_ns
+    assert 0 < first < 1_000_000
+
+    with timer:
+        sum(range(1000))
+    assert timer.elapsed_ns > first
+    assert timer.duration_seconds == timer.elapsed_ns / 1e9
+
+
+def test_seconds_to_ns():
+    """
+    Timeouts in seconds should convert to nanoseconds on the clock, and back.
+    """
+    assert seconds_to_ns(1.5) == 1_500_000_000
+    assert ns_to_seconds(seconds_to_ns(0.25)) == 0.25